@@ -0,0 +1,91 @@
+"""
+Пиковая память и время приема callback провайдера с verbose_json многочасовой записи.
+
+buffered  — как раньше: тело целиком в памяти, json.loads (как FastAPI для `result: dict`),
+            перевод таймкодов и упаковка готового dict.
+streaming — тело в SpooledTemporaryFile, потоковый разбор ijson с упаковкой по сегменту.
+
+Каждый режим запускается в отдельном процессе; пик считается tracemalloc (Python-аллокации)
+и по росту ru_maxrss (весь процесс).
+
+Запуск из корня репозитория:
+    python -m benchmarks.callback_memory --hours 4 --words
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+
+import orjson
+
+from benchmarks.transcript_storage import make_transcript
+from src.service.audio_preprocessing import remap_timestamps, timestamp_remapper
+from src.service.file_service import FileService
+from src.service.transcript_ingest import encode_transcription_stream
+
+OFFSET_MAP = [[0.0, 0.0], [600.0, 615.0], [1800.0, 1830.0]]
+READ_BLOCK = 64 * 1024
+SPOOL_BYTES = 1024 * 1024
+
+
+def run_buffered(path: str) -> int:
+    with open(path, "rb") as f:
+        body = f.read()
+    result = remap_timestamps(json.loads(body), OFFSET_MAP)
+    FileService.json_to_plain_text(result)
+    return len(FileService.encode_transcript(result))
+
+
+def run_streaming(path: str) -> int:
+    with open(path, "rb") as source, tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as body:
+        while block := source.read(READ_BLOCK):
+            body.write(block)
+        body.seek(0)
+        streamed = encode_transcription_stream(body, timestamp_remapper(OFFSET_MAP), 4 * 3600)
+    return len(streamed.transcription_compact)
+
+
+def measure(mode: str, path: str, queue: multiprocessing.Queue) -> None:
+    func = run_buffered if mode == "buffered" else run_streaming
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    size = func(path)
+    elapsed = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Второй прогон под tracemalloc: он замедляет выполнение, поэтому время берется из первого
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    queue.put((mode, peak, (rss_after - rss_before) * 1024, elapsed, size))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=4)
+    parser.add_argument("--words", action="store_true", help="С таймкодами слов")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "callback.json")
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(make_transcript(args.hours, args.words)))
+        print(f"callback body: {os.path.getsize(path) / 1024 / 1024:.1f} MB ({args.hours:g}h, words={args.words})")
+        print(f"{'mode':<12}{'tracemalloc peak, MB':>22}{'RSS growth, MB':>16}{'time, s':>10}{'compact, KB':>13}")
+
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        for mode in ("buffered", "streaming"):
+            process = context.Process(target=measure, args=(mode, path, queue))
+            process.start()
+            mode, peak, rss, elapsed, size = queue.get()
+            process.join()
+            print(f"{mode:<12}{peak / 1024 / 1024:>22.1f}{rss / 1024 / 1024:>16.1f}{elapsed:>10.2f}{size / 1024:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
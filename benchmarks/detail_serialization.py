@@ -0,0 +1,95 @@
+"""
+Время сборки ответа /user-files/{id}/detail для JSONB-транскрипции разного размера.
+
+stdlib      — как раньше: JSONB разбирается в dict (json.loads, как драйвер), UserFileDetail.model_validate,
+              проверка по response_model, dump в JSON-совместимые объекты и json.dumps (JSONResponse).
+orjson      — тот же путь, но ответ сериализует ORJSONResponse.
+passthrough — transcription::text из Postgres вставляется в ответ как есть,
+              pydantic сериализует только остальные поля.
+
+Запуск из корня репозитория:
+    python -m benchmarks.detail_serialization --sizes-kb 10 100 1000 10000
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+import orjson
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from benchmarks.transcript_storage import make_transcript
+from src.api.user_files import _user_file_detail_json
+from src.models import UserFile
+from src.schemas.file import UserFileDetail
+
+DETAIL_ADAPTER = TypeAdapter(UserFileDetail)
+
+
+def make_transcript_json(size_bytes: int) -> str:
+    """verbose_json с таймкодами слов примерно нужного размера, как его отдает transcription::text"""
+    per_hour = len(json.dumps(make_transcript(0.1, True))) * 10
+    transcription = make_transcript(max(size_bytes / per_hour, 0.001), True)
+    return json.dumps(transcription, ensure_ascii=False)
+
+
+def make_user_file() -> UserFile:
+    return UserFile(
+        id=1, user_id=1, file_url="1/file.mp3", status="completed", display_name="file.mp3",
+        created_at=datetime(2026, 1, 1), transcription_status="completed", duration=3600,
+        transcription_compact=None, transcription_edits=None,
+    )
+
+
+def run_stdlib(user_file: UserFile, transcription_json: str, response_class=JSONResponse) -> bytes:
+    detail = UserFileDetail.model_validate(user_file)
+    detail.transcription = json.loads(transcription_json)
+    # serialize_response FastAPI: проверка по response_model и dump в JSON-совместимые объекты
+    content = DETAIL_ADAPTER.dump_python(DETAIL_ADAPTER.validate_python(detail), mode="json")
+    return response_class(content).body
+
+
+def run_orjson(user_file: UserFile, transcription_json: str) -> bytes:
+    return run_stdlib(user_file, transcription_json, ORJSONResponse)
+
+
+def run_passthrough(user_file: UserFile, transcription_json: str) -> bytes:
+    return _user_file_detail_json(user_file, transcription_json)
+
+
+def measure(func, user_file: UserFile, transcription_json: str, repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = len(func(user_file, transcription_json))
+        best = min(best, time.perf_counter() - started)
+    return best, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-kb", nargs="+", type=int, default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    user_file = make_user_file()
+    print(f"{'transcript':>12} {'stdlib, ms':>12} {'orjson, ms':>12} {'passthrough, ms':>16} {'speedup':>8}")
+    for size_kb in args.sizes_kb:
+        transcription_json = make_transcript_json(size_kb * 1024)
+        # Все режимы дают одинаковый JSON (с точностью до порядка полей)
+        assert orjson.loads(run_passthrough(user_file, transcription_json)) == orjson.loads(
+            run_stdlib(user_file, transcription_json)
+        )
+        stdlib, _ = measure(run_stdlib, user_file, transcription_json, args.repeat)
+        fast, _ = measure(run_orjson, user_file, transcription_json, args.repeat)
+        passthrough, _ = measure(run_passthrough, user_file, transcription_json, args.repeat)
+        print(
+            f"{len(transcription_json) / 1024:>10.0f}KB {stdlib * 1000:>12.2f} {fast * 1000:>12.2f} "
+            f"{passthrough * 1000:>16.3f} {stdlib / passthrough:>7.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Real-time factor локальной расшифровки на CPU для разных размеров модели.
+
+RTF = время расшифровки / длительность аудио, меньше 1 — быстрее реального времени.
+
+Запуск из корня репозитория (в образе воркера, где стоит faster-whisper):
+    python -m benchmarks.local_whisper_rtf path/to/audio.mp3 --models tiny base small medium
+"""
+import argparse
+import time
+
+import ffmpeg
+
+from src.client.local_whisper_client import LocalWhisperClient, _load_model
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio_path")
+    parser.add_argument("--models", nargs="+", default=["tiny", "base", "small", "medium"])
+    parser.add_argument("--compute-type", default="int8")
+    parser.add_argument("--cpu-threads", type=int, default=4)
+    parser.add_argument("--beam-size", type=int, default=1)
+    parser.add_argument("--language", default=None)
+    parser.add_argument("--download-root", default="src/ai_models/whisper")
+    args = parser.parse_args()
+
+    audio_duration = float(ffmpeg.probe(args.audio_path)["format"]["duration"])
+    print(f"audio: {args.audio_path}, {audio_duration:.1f}s, compute_type={args.compute_type}, threads={args.cpu_threads}")
+    print(f"{'model':<10}{'load, s':>10}{'transcribe, s':>16}{'RTF':>8}{'segments':>10}")
+
+    for model_size in args.models:
+        client = LocalWhisperClient(
+            model_size=model_size,
+            compute_type=args.compute_type,
+            cpu_threads=args.cpu_threads,
+            beam_size=args.beam_size,
+            download_root=args.download_root,
+        )
+        started = time.perf_counter()
+        _load_model(client.model_size, client.compute_type, client.cpu_threads, client.download_root)
+        load_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        result = client.transcribe(args.audio_path, args.language)
+        transcribe_seconds = time.perf_counter() - started
+
+        print(
+            f"{model_size:<10}{load_seconds:>10.1f}{transcribe_seconds:>16.1f}"
+            f"{transcribe_seconds / audio_duration:>8.3f}{len(result['segments']):>10}"
+        )
+        _load_model.cache_clear()
+
+
+if __name__ == "__main__":
+    main()
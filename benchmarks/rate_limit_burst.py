@@ -0,0 +1,88 @@
+"""
+Всплеск запросов к RateLimiter: каждый пользователь одновременно шлет --burst запросов.
+
+Проверяется, что пропущено не больше емкости ведра (плюс пополнение за время прогона),
+а при очереди глубже порога запросы отклоняются как перегрузка и токены не тратятся.
+Меряется задержка acquire — один вызов Lua-скрипта в Redis на запрос.
+Ключи создаются под временным префиксом группы и удаляются в конце.
+
+Запуск из корня репозитория:
+    python -m benchmarks.rate_limit_burst --redis-url redis://localhost:6379/15 --users 50 --burst 40
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from uuid import uuid4
+
+from redis.asyncio import Redis
+
+from src.service.rate_limiter import RATE_LIMIT_KEY, RateLimiter
+
+CAPACITY = 10
+PER_MINUTE = 60
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", required=True, help="тестовая база Redis")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--burst", type=int, default=40, help="одновременных запросов на пользователя")
+    parser.add_argument("--max-queue-depth", type=int, default=100)
+    args = parser.parse_args()
+
+    redis = Redis.from_url(args.redis_url)
+    group = f"bench-{uuid4().hex[:8]}"
+    queue = f"{group}-queue"
+    limiter = RateLimiter(
+        redis=redis,
+        limits={group: {"default": [CAPACITY, PER_MINUTE]}},
+        queues={group: queue},
+        max_queue_depth=args.max_queue_depth,
+        shed_retry_seconds=30,
+    )
+    latencies: list[float] = []
+
+    async def request(user_id: int):
+        started = time.perf_counter()
+        result = await limiter.acquire(group, user_id, "default")
+        latencies.append(time.perf_counter() - started)
+        return result
+
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(request(user_id) for user_id in range(args.users) for _ in range(args.burst))
+        )
+        elapsed = time.perf_counter() - started
+        allowed = sum(result.allowed for result in results)
+        refill = int(elapsed * PER_MINUTE / 60) + 1
+        limited = [result for result in results if not result.allowed]
+
+        # Перегрузка: очередь глубже порога, токены не тратятся
+        await redis.rpush(queue, *(b"job" for _ in range(args.max_queue_depth)))
+        shed = [await limiter.acquire(group, args.users, "default") for _ in range(CAPACITY * 2)]
+        await redis.delete(queue)
+        after_shed = [await limiter.acquire(group, args.users, "default") for _ in range(CAPACITY)]
+    finally:
+        keys = [key async for key in redis.scan_iter(f"{RATE_LIMIT_KEY}:{group}:*")]
+        if keys:
+            await redis.delete(*keys)
+        await redis.delete(queue)
+        await redis.aclose()
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{len(results)} requests from {args.users} users in {elapsed:.2f}s: allowed {allowed}, "
+        f"limited {len(limited)}, acquire p50 {statistics.median(latencies) * 1000:.2f} ms, p99 {p99 * 1000:.2f} ms"
+    )
+    assert allowed <= args.users * (CAPACITY + refill), "more requests passed than the buckets hold"
+    assert allowed >= args.users * min(CAPACITY, args.burst), "each user must get the full burst capacity"
+    assert all(result.retry_after >= 1 for result in limited), "limited responses need Retry-After"
+    assert all(result.shed and not result.allowed for result in shed), "requests must be shed while the queue is too deep"
+    assert all(result.allowed for result in after_shed), "shed requests must not consume tokens"
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
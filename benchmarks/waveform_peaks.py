@@ -0,0 +1,89 @@
+"""
+Время и пиковая память расчета пиков волны (src.service.waveform_peaks) для длинной записи.
+
+full      — весь PCM файла в одном массиве, min/max по reshape (как при чтении файла целиком).
+streaming — PeaksBuilder по блокам 10 секунд, как в воркере при чтении из ffmpeg.
+
+PCM генерируется синтетически блоками (ffmpeg не нужен), каждый режим — в отдельном процессе.
+
+Запуск из корня репозитория:
+    python -m benchmarks.waveform_peaks --hours 1 4
+"""
+import argparse
+import multiprocessing
+import time
+import tracemalloc
+
+import numpy as np
+
+from src.service.audio_preprocessing import READ_BLOCK_BYTES, SAMPLE_RATE
+from src.service.waveform_peaks import PeaksBuilder, downsample_peaks, encode_peaks
+
+SAMPLES_PER_PEAK = 256
+LEVELS = 4
+FACTOR = 4
+BLOCK_SAMPLES = READ_BLOCK_BYTES // 2
+
+
+def pcm_blocks(hours: float):
+    rng = np.random.default_rng(0)
+    remaining = int(hours * 3600 * SAMPLE_RATE)
+    while remaining:
+        size = min(BLOCK_SAMPLES, remaining)
+        yield rng.integers(-20000, 20000, size, dtype=np.int16)
+        remaining -= size
+
+
+def encode_levels(mins: np.ndarray, maxs: np.ndarray) -> int:
+    size = 0
+    for level in range(LEVELS):
+        if level:
+            mins, maxs = downsample_peaks(mins, maxs, FACTOR)
+        size += len(encode_peaks(mins, maxs, SAMPLES_PER_PEAK * FACTOR ** level, 8))
+    return size
+
+
+def run_full(hours: float) -> int:
+    samples = np.concatenate(list(pcm_blocks(hours)))
+    usable = len(samples) - len(samples) % SAMPLES_PER_PEAK
+    frames = samples[:usable].reshape(-1, SAMPLES_PER_PEAK)
+    return encode_levels(frames.min(axis=1), frames.max(axis=1))
+
+
+def run_streaming(hours: float) -> int:
+    builder = PeaksBuilder(SAMPLES_PER_PEAK)
+    for block in pcm_blocks(hours):
+        builder.add_block(block)
+    return encode_levels(*builder.finish())
+
+
+def measure(mode: str, hours: float, queue: multiprocessing.Queue) -> None:
+    func = run_full if mode == "full" else run_streaming
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = func(hours)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    queue.put((peak, elapsed, size))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", nargs="+", type=float, default=[1, 4])
+    args = parser.parse_args()
+
+    print(f"{'hours':>6}  {'mode':<10}{'peak memory, MB':>17}{'time, s':>10}{'peaks, KB':>11}")
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    for hours in args.hours:
+        for mode in ("full", "streaming"):
+            process = context.Process(target=measure, args=(mode, hours, queue))
+            process.start()
+            peak, elapsed, size = queue.get()
+            process.join()
+            print(f"{hours:>6g}  {mode:<10}{peak / 1024 / 1024:>17.1f}{elapsed:>10.2f}{size / 1024:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+WhisperAIClient против локальной заглушки провайдера: сеть и Whisper AI не нужны.
+
+Заглушка (http.server в отдельном потоке) отвечает по сценарию: коды ответа, Retry-After, задержка.
+Проверяется, что:
+- 5xx и 429 повторяются, Retry-After соблюдается, после них возвращается ответ 200;
+- 4xx кроме 429 не повторяются;
+- таймаут чтения не повторяется: провайдер мог уже принять задачу;
+- подряд идущие 5xx открывают circuit breaker: запросы отклоняются без обращения к провайдеру,
+  а после паузы пробный запрос снова закрывает цепь;
+- одновременных запросов одного пользователя не больше max_concurrency_per_user,
+  а семафоры пользователей удаляются после их запросов.
+
+Запуск из корня репозитория:
+    python -m benchmarks.whisper_client_stub --users 20 --requests-per-user 5
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from src.client.whisper_ai_client import WhisperAIClient
+from src.exceptions import WhisperAIUnavailableExceptions, WhisperAIRequestUnconfirmedExceptions
+
+RETRY_AFTER_SECONDS = 0.3
+CIRCUIT_RESET_SECONDS = 0.5
+
+
+class StubProvider(ThreadingHTTPServer):
+    """Отвечает ответами из script по порядку, когда он кончается — default"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.lock = threading.Lock()
+        self.script: list[tuple[int, dict, float]] = []
+        self.default: tuple[int, dict, float] = (200, {}, 0.0)
+        self.requests = 0
+        self.request_times: list[float] = []
+        self.in_flight: dict[str, int] = defaultdict(int)
+        self.max_in_flight: dict[str, int] = defaultdict(int)
+
+    def reset(self, script: list[tuple[int, dict, float]], default: tuple[int, dict, float] = (200, {}, 0.0)):
+        with self.lock:
+            self.script = list(script)
+            self.default = default
+            self.requests = 0
+            self.request_times = []
+
+    def handle_error(self, request, client_address):
+        # Клиент, не дождавшийся ответа, закрывает соединение — это ожидаемо
+        pass
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/transcribe"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: StubProvider
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        # Файл вида user-<id>/...: по нему считаются одновременные запросы пользователя
+        user = body["file"].split("/", 1)[0]
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.request_times.append(time.monotonic())
+            status, headers, delay = self.server.script.pop(0) if self.server.script else self.server.default
+            self.server.in_flight[user] += 1
+            self.server.max_in_flight[user] = max(self.server.max_in_flight[user], self.server.in_flight[user])
+        try:
+            time.sleep(delay)
+            payload = json.dumps({"status": "queued", "file": body["file"]}).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        finally:
+            with self.server.lock:
+                self.server.in_flight[user] -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_client(stub: StubProvider, **overrides) -> WhisperAIClient:
+    options = dict(
+        base_url=stub.url,
+        auth_token="stub",
+        max_concurrency=16,
+        max_concurrency_per_user=2,
+        rate_limit_per_second=0,
+        max_retries=5,
+        backoff_base_seconds=0.01,
+        backoff_max_seconds=0.05,
+        circuit_failure_threshold=3,
+        circuit_reset_seconds=CIRCUIT_RESET_SECONDS,
+    )
+    options.update(overrides)
+    return WhisperAIClient(**options)
+
+
+async def check_retries(stub: StubProvider) -> None:
+    stub.reset([(503, {}, 0.0), (429, {"Retry-After": str(RETRY_AFTER_SECONDS)}, 0.0), (502, {}, 0.0)])
+    client = make_client(stub)
+    try:
+        result = await client.convert_audio_to_text("user-0/retry.mp3", "json")
+    finally:
+        await client.aclose()
+    assert result["file"] == "user-0/retry.mp3", "the successful response must be returned"
+    assert stub.requests == 4, f"expected 3 retries and a success, provider got {stub.requests} requests"
+    waited = stub.request_times[2] - stub.request_times[1]
+    assert waited >= RETRY_AFTER_SECONDS * 0.9, f"Retry-After {RETRY_AFTER_SECONDS}s is not respected: {waited:.2f}s"
+    print(f"retries: 503, 429 (Retry-After waited {waited:.2f}s), 502, then 200 — ok")
+
+    stub.reset([], default=(400, {}, 0.0))
+    client = make_client(stub)
+    try:
+        await client.convert_audio_to_text("user-0/bad.mp3", "json")
+        raise AssertionError("400 must be raised")
+    except httpx.HTTPStatusError as e:
+        assert e.response.status_code == 400
+    finally:
+        await client.aclose()
+    assert stub.requests == 1, f"400 must not be retried, provider got {stub.requests} requests"
+    print("client errors: 400 is raised without retries — ok")
+
+    stub.reset([], default=(200, {}, 0.5))
+    client = make_client(stub, read_timeout=0.1)
+    try:
+        await client.convert_audio_to_text("user-0/slow.mp3", "json")
+        raise AssertionError("read timeout must be raised")
+    except WhisperAIRequestUnconfirmedExceptions:
+        pass
+    finally:
+        await client.aclose()
+    assert stub.requests == 1, f"read timeout must not be retried, provider got {stub.requests} requests"
+    print("read timeout: raised as unconfirmed without resending — ok")
+
+
+async def check_circuit_breaker(stub: StubProvider) -> None:
+    stub.reset([], default=(503, {}, 0.0))
+    client = make_client(stub, max_retries=10)
+    try:
+        try:
+            await client.convert_audio_to_text("user-0/down.mp3", "json")
+            raise AssertionError("the circuit must open")
+        except WhisperAIUnavailableExceptions:
+            pass
+        assert stub.requests == client.circuit_failure_threshold, (
+            f"the circuit must open after {client.circuit_failure_threshold} failures, "
+            f"provider got {stub.requests} requests"
+        )
+
+        try:
+            await client.convert_audio_to_text("user-0/down.mp3", "json")
+            raise AssertionError("requests must be rejected while the circuit is open")
+        except WhisperAIUnavailableExceptions:
+            pass
+        assert stub.requests == client.circuit_failure_threshold, "open circuit must not reach the provider"
+
+        # Half-open: после паузы одна неудача снова открывает цепь
+        await asyncio.sleep(CIRCUIT_RESET_SECONDS)
+        try:
+            await client.convert_audio_to_text("user-0/down.mp3", "json")
+            raise AssertionError("a failed probe must open the circuit again")
+        except WhisperAIUnavailableExceptions:
+            pass
+        assert stub.requests == client.circuit_failure_threshold + 1, "half-open circuit must send a single probe"
+
+        await asyncio.sleep(CIRCUIT_RESET_SECONDS)
+        stub.reset([], default=(200, {}, 0.0))
+        result = await client.convert_audio_to_text("user-0/up.mp3", "json")
+        assert result["file"] == "user-0/up.mp3"
+        await client.convert_audio_to_text("user-0/up.mp3", "json")
+        assert stub.requests == 2, "a successful probe must close the circuit"
+    finally:
+        await client.aclose()
+    print(f"circuit breaker: opens after {client.circuit_failure_threshold} failures, probe closes it — ok")
+
+
+async def check_user_limits(stub: StubProvider, users: int, requests_per_user: int) -> None:
+    stub.reset([], default=(200, {}, 0.05))
+    stub.max_in_flight.clear()
+    client = make_client(stub)
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            client.convert_audio_to_text(f"user-{user_id}/{n}.mp3", "json", user_id=user_id)
+            for user_id in range(users)
+            for n in range(requests_per_user)
+        ))
+        elapsed = time.perf_counter() - started
+    finally:
+        await client.aclose()
+    busiest = max(stub.max_in_flight.values())
+    assert busiest <= client.max_concurrency_per_user, (
+        f"user had {busiest} concurrent requests, limit {client.max_concurrency_per_user}"
+    )
+    assert not client._user_semaphores and not client._user_requests, "user semaphores must be evicted"
+    print(
+        f"user limits: {users * requests_per_user} requests from {users} users in {elapsed:.2f}s, "
+        f"max {busiest} concurrent per user, semaphores left {len(client._user_semaphores)} — ok"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--requests-per-user", type=int, default=5)
+    args = parser.parse_args()
+
+    stub = StubProvider()
+    thread = threading.Thread(target=stub.serve_forever, daemon=True)
+    thread.start()
+    try:
+        await check_retries(stub)
+        await check_circuit_breaker(stub)
+        await check_user_limits(stub, args.users, args.requests_per_user)
+    finally:
+        stub.shutdown()
+        stub.server_close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
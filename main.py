@@ -1,8 +1,16 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 import logging
 from starlette.middleware.cors import CORSMiddleware
 
 from src.api import routers
+from src.dependency import whisper_ai_client, redis_client
+from src.service.product_catalog_cache import listen_catalog_changes
+from src.service.user_plan_cache import listen_plan_changes
+from src.settings import settings
 import sentry_sdk
 
 # Configure logging
@@ -21,7 +29,19 @@ sentry_sdk.init(
     send_default_pii=True,
 )
 
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    catalog_listener = asyncio.create_task(listen_catalog_changes(redis_client))
+    plan_listener = asyncio.create_task(listen_plan_changes(redis_client, settings.USER_PLAN_LOCAL_CACHE_SIZE))
+    yield
+    catalog_listener.cancel()
+    plan_listener.cancel()
+    await whisper_ai_client.aclose()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import tempfile
 from pathlib import Path
@@ -11,13 +12,12 @@ from typing import Annotated
 from fastapi import (
     APIRouter,
     Depends,
-    File,
     HTTPException,
-    UploadFile,
+    Request,
     status,
-    BackgroundTasks, Query,
+    Query,
 )
-from fastapi.responses import FileResponse, Response, JSONResponse
+from fastapi.responses import FileResponse, Response, ORJSONResponse
 
 from src.dependency import (
     get_audio_convert_service,
@@ -25,48 +25,136 @@ from src.dependency import (
     get_user_file_service,
     get_user_products_service,
     get_current_user_id,
+    rate_limit,
 )
-from src.models.enums import FileProcessingStatus, FileTranscriptionStatus, FileImproveAudioStatus
+from src.models.enums import FileProcessingStatus, FileImproveAudioStatus, AudioSource, UsageEventType
 from src.schemas.file import FileTranscriptionRequest
 from src.service.audio_convert_service import AudioConvertService
-from src.settings import settings
 
 from src.service.file_service import FileService
+from src.service.upload_stream import receive_upload, UploadStreamError
 from src.service.user_file_service import UserFileService
 from src.service.user_products_service import UserProductsService
-from src.celery.tasks import process_audio, enhance_audio_task
+from src.settings import settings
+from src.celery.celery_app import TRANSCRIPTION_QUEUE
+from src.celery.tasks import process_audio, enhance_audio_task, submit_transcription, schedule_audio_derivatives
 
 router = APIRouter(prefix="/audio/convert/file", tags=["audio-convert"])
 
 ALLOWED_AUDIO_EXTENSIONS = {".mp3", ".wav", ".ogg", ".flac", ".m4a", ".aac"}
 ALLOWED_VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".webm"}
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
+# Тело разбирается вручную (receive_upload), поэтому схема multipart описывается явно
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
+
+
+def _probe_duration(path: str) -> float | None:
+    try:
+        return float(ffmpeg.probe(path)["format"]["duration"])
+    except (ffmpeg.Error, KeyError, ValueError):
+        return None
+
+
+def _not_enough_minutes(duration_seconds: float, remaining_seconds: float) -> HTTPException:
+    if remaining_seconds <= 0:
+        detail = "No minutes left"
+    else:
+        detail = (
+            f"Not enough minutes: file is at least {duration_seconds / 60:.1f} min, "
+            f"{remaining_seconds / 60:.1f} min left"
+        )
+    return HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail=detail)
+
+
+def _admit_content_length(content_length: str | None, remaining_seconds: float) -> None:
+    """
+    Отказ до приема тела: с Expect: 100-continue клиент тогда не отправит файл вовсе.
+    По размеру известна только нижняя граница длительности — при максимальном битрейте
+    """
+    if remaining_seconds <= 0:
+        raise _not_enough_minutes(0, remaining_seconds)
+    if not content_length or not content_length.isdigit():
+        return
+    min_duration = int(content_length) / (settings.UPLOAD_ADMISSION_MAX_BITRATE_KBPS * 125)
+    if min_duration > remaining_seconds:
+        raise _not_enough_minutes(min_duration, remaining_seconds)
+
+
+@router.post("/", status_code=status.HTTP_201_CREATED, openapi_extra=UPLOAD_OPENAPI)
 async def upload_file(
+    request: Request,
     current_user_id: Annotated[int, Depends(get_current_user_id)],
     file_service: Annotated[FileService, Depends(get_file_service)],
     user_file_service: Annotated[UserFileService, Depends(get_user_file_service)],
     user_product_service: Annotated[UserProductsService, Depends(get_user_products_service)],
-    file: UploadFile = File(...),
 ):
-    # Validate file extension
-    extension = Path(file.filename).suffix.lower() if file.filename else ""
-    if (
-        extension not in ALLOWED_AUDIO_EXTENSIONS
-        and extension not in ALLOWED_VIDEO_EXTENSIONS
-    ):
+    # Допуск проверяется до чтения тела: uvicorn отвечает 100 Continue только при первом чтении.
+    # Это проверка, а не резерв минут: параллельные загрузки одного пользователя могут вместе уйти
+    # в минус на длительность последних файлов. Перерасход допускается сознательно — он списывается
+    # с продукта (deduct_minutes), и следующая загрузка уже не пройдет допуск
+    remaining_seconds = float("inf")
+    if settings.UPLOAD_ADMISSION_ENABLED:
+        remaining_seconds = await user_product_service.get_remaining_upload_seconds(current_user_id)
+        _admit_content_length(request.headers.get("content-length"), remaining_seconds)
+
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Unsupported file format. Allowed formats: {', '.join(ALLOWED_AUDIO_EXTENSIONS.union(ALLOWED_VIDEO_EXTENSIONS))}",
+            detail="Expected multipart/form-data with a file field",
         )
 
     # Create a temporary directory to process files
     with tempfile.TemporaryDirectory() as tmp_dir:
+        def on_filename(filename: str) -> str:
+            # Validate file extension
+            extension = Path(filename).suffix.lower()
+            if (
+                extension not in ALLOWED_AUDIO_EXTENSIONS
+                and extension not in ALLOWED_VIDEO_EXTENSIONS
+            ):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Unsupported file format. Allowed formats: {', '.join(ALLOWED_AUDIO_EXTENSIONS.union(ALLOWED_VIDEO_EXTENSIONS))}",
+                )
+            return os.path.join(tmp_dir, f"original_{uuid.uuid4()}{extension}")
+
+        async def on_head(path: str) -> None:
+            # Длительность по первым мегабайтам: заголовок WAV, Xing/VBRI MP3, moov в начале MP4.
+            # Если по началу файла она не определяется, решение принимается после приема
+            if remaining_seconds == float("inf"):
+                return
+            head_duration = await asyncio.to_thread(_probe_duration, path)
+            if head_duration and head_duration > remaining_seconds:
+                raise _not_enough_minutes(head_duration, remaining_seconds)
+
         # Save the original file
-        temp_file_path = os.path.join(tmp_dir, f"original_{uuid.uuid4()}{extension}")
-        with open(temp_file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        try:
+            upload = await receive_upload(
+                content_type,
+                request.stream(),
+                "file",
+                on_filename,
+                on_head,
+                settings.UPLOAD_ADMISSION_PROBE_BYTES,
+            )
+        except UploadStreamError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        temp_file_path = upload.path
+        extension = Path(temp_file_path).suffix
 
         # Process file based on its type
         final_file_path = temp_file_path
@@ -93,15 +181,17 @@ async def upload_file(
             # If duration detection fails, log but continue
             logging.warning(f"Error detecting file duration: {str(e)}")
             raise e
+        if duration_seconds > remaining_seconds:
+            raise _not_enough_minutes(duration_seconds, remaining_seconds)
 
         # Upload file to S3
         # try:
         # Get original filename without extension for display
-        original_name = Path(file.filename).stem if file.filename else "file"
+        original_name = Path(upload.filename).stem or "file"
         display_filename = (
             f"{original_name}.wav"
             if extension in ALLOWED_VIDEO_EXTENSIONS
-            else file.filename
+            else upload.filename
         )
 
         # Upload to S3 and save record in database
@@ -118,14 +208,21 @@ async def upload_file(
             display_filename=display_filename,
         )
 
+        schedule_audio_derivatives(file_record.id, AudioSource.ORIGINAL)
+
         # Update the file duration if detected
         if duration_seconds > 0:
             await user_file_service.update_file_duration(
                 file_record.id, duration_seconds
             )
-            await user_product_service.deduct_minutes(user_id=current_user_id, seconds_used=duration_seconds)
+            await user_product_service.deduct_minutes(
+                user_id=current_user_id,
+                seconds_used=duration_seconds,
+                event_type=UsageEventType.UPLOAD,
+                user_file_id=file_record.id,
+            )
 
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_201_CREATED,
             content={
                 "file_id": file_record.id,
@@ -137,41 +234,32 @@ async def upload_file(
         )
 
 
-@router.post("/transcription", status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/transcription",
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limit("transcription"))],
+)
 async def launch_transcription(
-    background_tasks: BackgroundTasks,
     current_user_id: Annotated[int, Depends(get_current_user_id)],
     user_file_service: Annotated[UserFileService, Depends(get_user_file_service)],
-    audio_convert_service: Annotated[
-        AudioConvertService, Depends(get_audio_convert_service)
-    ],
     body: FileTranscriptionRequest,
 ):
     user_files = await user_file_service.get_user_file(current_user_id, body.file_ids)
     if not user_files:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-    # Update files status to PROCESSING before starting transcription
-    await user_file_service.update_files_status(
-        body.file_ids, FileProcessingStatus.PROCESSING
-    )
-    await user_file_service.update_files_transcription_status(
-        body.file_ids, FileTranscriptionStatus.PROCESSING
+    # Файлы, которые уже расшифровываются, повторно не отправляются
+    file_ids = await user_file_service.request_transcription(
+        [user_file.id for user_file in user_files]
     )
 
-    # Add transcription tasks to background tasks
-    for user_file in user_files:
-        audio_file_url = f"{settings.BASE_URL}/audio/convert/file/download/public-file/{user_file.file_url}"
-        callback_url = f"{settings.whisper_ai_callback_url}/{user_file.file_url}"
-
-        background_tasks.add_task(
-            audio_convert_service.convert_audio_to_text,
-            file_id=user_file.id,
-            audio_file_url=audio_file_url,
-            response_format="verbose_json",
-            language=None,  # Auto-detect language
-            callback_url=callback_url,
-        )
+    # Отправка провайдеру идет в воркере, ответ API не ждет провайдера
+    for file_id in file_ids:
+        try:
+            submit_transcription.apply_async(args=[file_id], queue=TRANSCRIPTION_QUEUE)
+        except Exception as e:
+            # Файл останется в PROCESSING и будет отправлен reconcile-задачей
+            logging.error(f"Failed to queue transcription for file {file_id}: {str(e)}")
 
     return Response(status_code=status.HTTP_200_OK)
 
@@ -207,9 +295,12 @@ async def download_file(
 async def callback_whishper(
     user_id: str,
     file_name: str,
-    result: dict | str,
+    request: Request,
     user_file_service: Annotated[UserFileService, Depends(get_user_file_service)],
-    file_service: Annotated[FileService, Depends(get_file_service)],
+    audio_convert_service: Annotated[
+        AudioConvertService, Depends(get_audio_convert_service)
+    ],
+    chunk: int | None = Query(None),
 ) -> Response:
     file_url = f"{user_id}/{file_name}"
 
@@ -219,40 +310,18 @@ async def callback_whishper(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="File not found"
         )
-    
-    # Generate formatted transcriptions if result is a dictionary
-    transcription_text = None
-    transcription_vtt = None
-    transcription_srt = None
-    
-    if isinstance(result, dict):
-        # Generate plain text from JSON
-        transcription_text = file_service.json_to_plain_text(result)
-        
-        # Generate WebVTT format
-        transcription_vtt = file_service.json_to_vtt(result)
-        
-        # Generate SRT format
-        transcription_srt = file_service.json_to_srt(result)
-
-    # Save transcription result and formatted outputs
-    await user_file_service.make_user_file_completed(
-        file_url=file_url, 
-        transcription_result=result,
-        transcription_text=transcription_text,
-        transcription_vtt=transcription_vtt,
-        transcription_srt=transcription_srt
-    )
-    await user_file_service.update_files_transcription_status(
-        file_ids=[user_file.id],
-        status=FileTranscriptionStatus.COMPLETED
-    )
-    # Delete the audio file from S3
-    try:
-        await file_service.delete_file_from_s3(user_id, file_name)
-    except Exception as e:
-        # Log the error but don't fail the request since we already have the transcription
-        logging.error(f"Error deleting file from S3: {str(e)}")
+
+    # Тело не разбирается FastAPI целиком: verbose_json многочасовой записи с таймкодами слов
+    # занимает десятки мегабайт, поэтому оно копится в буфере (на диске, если большое)
+    # и разбирается потоково. Длинные записи приходят кусками, файл завершается после последнего
+    with tempfile.SpooledTemporaryFile(max_size=settings.TRANSCRIPTION_CALLBACK_SPOOL_BYTES) as body:
+        async for block in request.stream():
+            body.write(block)
+        body.seek(0)
+        try:
+            await audio_convert_service.ingest_transcription_callback(user_file, body, chunk)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     return Response(status_code=status.HTTP_202_ACCEPTED)
 
@@ -286,7 +355,11 @@ async def delete_file(
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
-@router.post("/remove-noise/{file_id}", status_code=status.HTTP_202_ACCEPTED)
+@router.post(
+    "/remove-noise/{file_id}",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(rate_limit("separation"))],
+)
 async def remove_noise_from_audio(
     file_id: int,
     current_user_id: Annotated[int, Depends(get_current_user_id)],
@@ -333,7 +406,7 @@ async def remove_noise_from_audio(
             detail="Failed to start audio processing",
         )
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_202_ACCEPTED,
         content={
             "message": "Audio processing started",
@@ -343,7 +416,11 @@ async def remove_noise_from_audio(
     )
 
 
-@router.post("/remove-melody/{file_id}", status_code=status.HTTP_202_ACCEPTED)
+@router.post(
+    "/remove-melody/{file_id}",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(rate_limit("separation"))],
+)
 async def remove_melody_from_audio(
     file_id: int,
     current_user_id: Annotated[int, Depends(get_current_user_id)],
@@ -390,7 +467,7 @@ async def remove_melody_from_audio(
             detail="Failed to start audio processing",
         )
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_202_ACCEPTED,
         content={
             "message": "Melody removal started (extracting vocals)",
@@ -400,7 +477,11 @@ async def remove_melody_from_audio(
     )
 
 
-@router.post("/remove-vocals/{file_id}", status_code=status.HTTP_202_ACCEPTED)
+@router.post(
+    "/remove-vocals/{file_id}",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(rate_limit("separation"))],
+)
 async def remove_vocals_from_audio(
     file_id: int,
     current_user_id: Annotated[int, Depends(get_current_user_id)],
@@ -447,7 +528,7 @@ async def remove_vocals_from_audio(
             detail="Failed to start audio processing",
         )
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_202_ACCEPTED,
         content={
             "message": "Vocals removal started (extracting instrumental)",
@@ -457,7 +538,11 @@ async def remove_vocals_from_audio(
     )
 
 
-@router.post("/enhance-audio/{file_id}", status_code=status.HTTP_202_ACCEPTED)
+@router.post(
+    "/enhance-audio/{file_id}",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(rate_limit("enhance"))],
+)
 async def enhance_audio(
     file_id: int,
     current_user_id: Annotated[int, Depends(get_current_user_id)],
@@ -503,7 +588,7 @@ async def enhance_audio(
             detail="Failed to start audio processing",
         )
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_202_ACCEPTED,
         content={
             "message": "Enhance audio started)",
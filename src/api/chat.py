@@ -3,7 +3,7 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, Path
 from starlette import status
 
-from src.dependency import get_chat_service, get_current_user_id
+from src.dependency import get_chat_service, get_current_user_id, rate_limit
 from src.schemas.chat import ChatMessageCreate, ChatResponse, ChatSessionResponse
 from src.service.chat_service import ChatService
 
@@ -56,10 +56,12 @@ async def get_chat_history(
             )
 
         # Get chat session with messages
-        chat_session = await chat_service.get_chat_history(file_id)
+        chat_session = await chat_service.get_chat_history(user_file)
 
         return chat_session
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -71,6 +73,7 @@ async def get_chat_history(
     "/{file_id}",
     response_model=ChatResponse,
     status_code=status.HTTP_200_OK,
+    dependencies=[Depends(rate_limit("chat"))],
 )
 async def send_chat_message(
     file_id: Annotated[int, Path(..., title="The ID of the file to chat about")],
@@ -94,16 +97,16 @@ async def send_chat_message(
         HTTPException: If the file is not found or if there's an error processing the message
     """
     try:
-        # Get user file and verify it exists and belongs to the user
-        user_file = await chat_service.get_user_file(file_id)
-        if not user_file:
+        # Get file, session, limits and recent messages in one query
+        chat_context = await chat_service.get_chat_context(file_id)
+        if not chat_context:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"File with id {file_id} not found",
             )
 
         # Verify the file belongs to the current user
-        if user_file.user_id != current_user_id:
+        if chat_context.user_id != current_user_id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="File does not belong to the current user",
@@ -111,7 +114,7 @@ async def send_chat_message(
 
         # Process the message and get a response
         response = await chat_service.process_message(
-            file_id=file_id, message_content=message.message, user_id=current_user_id, model_type=message.model
+            context=chat_context, message_content=message.message, model_type=message.model
         )
 
         # Если превышен лимит, возвращаем сообщение об ошибке, но с кодом 200
@@ -122,6 +125,8 @@ async def send_chat_message(
             limit_exceeded=response.get("limit_exceeded", False),
         )
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -1,20 +1,17 @@
+import logging
 from typing import Annotated
-from uuid import UUID
-from datetime import datetime
 
-from dateutil.relativedelta import relativedelta
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from pydantic import BaseModel
+from pydantic import ValidationError
 import orjson as json
+from src.celery.tasks import process_payment_webhook
 from src.dependency import (
-    get_products_service,
+    get_payment_webhook_service,
     get_user_payment_service,
-    get_user_products_service,
 )
-from src.schemas.payment import CloudPaymentsRecurrentCallback
+from src.schemas.payment import CloudPaymentsCallback, CloudPaymentsRecurrentCallback
+from src.service.payment.payment_webhook_service import PaymentWebhookService
 from src.service.payment.user_payment import UserPaymentService
-from src.service.products_service import ProductsService
-from src.service.user_products_service import UserProductsService
 
 router = APIRouter(
     tags=["payments"],
@@ -22,104 +19,42 @@ router = APIRouter(
 )
 
 
-class CloudPaymentsCallback(BaseModel):
-    TransactionId: int
-    Amount: float
-    Status: str
-    Data: dict | None = None # Содержит productId, userId, minuteCount из виджета
-    SubscriptionId: str | None = None
-    AccountId: int
-
-
 @router.post("/cloudpayments/callback", status_code=status.HTTP_200_OK)
 async def handle_cloudpayments_callback(
     request: Request,
-    products_service: Annotated[ProductsService, Depends(get_products_service)],
-    user_products_service: Annotated[
-        UserProductsService, Depends(get_user_products_service)
-    ],
-    user_payment_service: Annotated[
-        UserPaymentService, Depends(get_user_payment_service)
+    payment_webhook_service: Annotated[
+        PaymentWebhookService, Depends(get_payment_webhook_service)
     ],
 ) -> dict:
     """
-    Обработка callback'а от CloudPayments для Pay уведомлений
+    Обработка callback'а от CloudPayments для Pay уведомлений.
+    Уведомление сохраняется в inbox и сразу подтверждается, зачисление делает воркер;
+    повтор того же уведомления подтверждается без повторного зачисления
     """
 
     form_data = await request.form()
     data_dict = dict(form_data)
-    callback = CloudPaymentsCallback(**data_dict)
-
-    exist_transaction = await user_payment_service.get_transaction_by_ext_id(external_id=str(callback.TransactionId))
-    if exist_transaction:
-        return {"code": 0}
-
-    # Преобразуем поле Data из JSON-строки в словарь
     try:
-        callback.Data = json.loads(data_dict["Data"])
-    except (KeyError, json.JSONDecodeError) as e:
+        # Преобразуем поле Data из JSON-строки в словарь
+        data_dict["Data"] = json.loads(data_dict["Data"])
+        callback = CloudPaymentsCallback(**data_dict)
+    except (KeyError, json.JSONDecodeError, ValidationError) as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Неверный формат поля Data: {str(e)}",
+            detail=f"Неверный формат уведомления: {str(e)}",
         )
 
     # Проверяем статус транзакции
     if callback.Status != "Completed":
         return {"code": 0}
 
-    product_id = UUID(callback.Data["productId"])
-    user_id = callback.AccountId
-    minute_count = float(callback.Data["minuteCount"])
-
-    # Проверяем существование продукта
-    product = await products_service.get_by_id(product_id)
-    if not product:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
-        )
-    elif product.is_subs:
-        subs_amount = int(callback.Data["CloudPayments"]["recurrent"]["amount"])
-        interval = callback.Data["CloudPayments"]["recurrent"]["interval"]
-        if interval == "Month":
-            expires_at = datetime.now() + relativedelta(months=1)
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Не корректный интервал {interval}",
-            )
-
-        user_products = await user_products_service.create_subscription(
-            user_id=user_id,
-            product_id=product.uuid,
-            subscription_id=callback.SubscriptionId,
-            amount=subs_amount or callback.Amount,
-            expires_at=expires_at,
-            interval=interval,
-            minute_count=product.minute_count,
-        )
-    else:
-        # 1. Создаем запись о покупке
-        user_products = await user_products_service.create_user_product(
-            user_id=user_id,
-            minute_count=product.minute_count,
-            amount=callback.Amount,
-            product_id=product_id,
-        )
-
-    # 2. Создаем запись о транзакции
-    await user_payment_service.create_transaction(
-        product_id=product_id,
-        user_id=user_id,
-        price=callback.Amount,
-        user_product_id=user_products.uuid,
-        external_transaction_id=str(callback.TransactionId),
-        status=callback.Status,
-        metainfo={
-            "transaction_id": callback.TransactionId,
-            "minute_count": minute_count,
-            "payment_status": callback.Status,
-        },
-    )
+    inbox_id = await payment_webhook_service.accept_cloudpayments(callback)
+    if inbox_id is not None:
+        try:
+            process_payment_webhook.delay(inbox_id)
+        except Exception as e:
+            # Уведомление уже сохранено, его поставит в очередь сверка reconcile_payment_webhooks
+            logging.error(f"Failed to enqueue payment webhook {inbox_id}: {str(e)}")
     return {"code": 0}  # Успешная обработка
 
 
@@ -1,9 +1,9 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, Response, status
 
 from src.dependency import get_products_service, get_current_user_id, get_user_products_service
-from src.schemas.products import ProductResponse, UserProductPlanResponse
+from src.schemas.products import ProductResponse, UserProductPlanResponse, UsageDayResponse
 from src.service.products_service import ProductsService
 from src.service.user_products_service import UserProductsService
 
@@ -30,7 +30,7 @@ router = APIRouter(
 )
 async def get_all_products(
     products_service: ProductsService = Depends(get_products_service),
-) -> list[ProductResponse]:
+) -> Response:
     """
     Get all active products with their current prices and discounts.
 
@@ -38,9 +38,9 @@ async def get_all_products(
         products_service: Service for product operations
 
     Returns:
-        List[ProductResponse]: List of available products
+        List[ProductResponse]: List of available products, serialized once per catalog change
     """
-    return await products_service.get_all()
+    return Response(content=await products_service.get_all_json(), media_type="application/json")
 
 
 @router.get(
@@ -52,5 +52,23 @@ async def get_all_products(
 async def get_user_product_plan(
     current_user_id: Annotated[int, Depends(get_current_user_id)],
     user_product_service: Annotated[UserProductsService, Depends(get_user_products_service)]
+) -> Response:
+    return Response(
+        content=await user_product_service.get_user_product_plan_json(user_id=current_user_id),
+        media_type="application/json",
+    )
+
+
+@router.get(
+    "/usage",
+    response_model=list[UsageDayResponse],
+    status_code=status.HTTP_200_OK,
+    summary="Списания минут пользователя по дням",
+    description="Дневные суммы журнала списаний; текущий день обновляется периодической задачей",
+)
+async def get_user_usage(
+    current_user_id: Annotated[int, Depends(get_current_user_id)],
+    user_product_service: Annotated[UserProductsService, Depends(get_user_products_service)],
+    days: int = Query(30, ge=1, le=366),
 ):
-    return await user_product_service.get_user_product_plan(user_id=current_user_id)
+    return await user_product_service.get_usage_by_day(user_id=current_user_id, days=days)
@@ -1,17 +1,34 @@
+import asyncio
 import re
 from typing import Annotated
 from fastapi import APIRouter, Depends, Query, HTTPException, status, Response, Body, Request
 from fastapi.responses import StreamingResponse
+import orjson
+from sqlalchemy.orm.attributes import set_committed_value
 import os
 import json
+import uuid
+from email.utils import formatdate
 from urllib.parse import urlparse
 
-from src.dependency import get_user_file_service, get_current_user_id, get_file_service
-from src.models.enums import FileProcessingStatus
+from src.dependency import get_user_file_service, get_current_user_id, get_file_service, \
+    get_chat_answer_cache_service, get_transcript_render_service, get_transcript_index_service, \
+    get_waveform_service, get_hls_service
+from src.models import UserFile
+from src.models.enums import FileProcessingStatus, TranscriptFormat, AudioSource
+from src.celery.tasks import apply_transcription_edits
+from src.exceptions import TranscriptVersionConflictExceptions
 from src.schemas.file import UserFileListResponse, UserFileListDetailResponse, TranscriptionUpdateRequest, \
-    UserFileDetail
+    UserFileDetail, UserFileDetailFields, TranscriptSearchResponse, TranscriptSeekResponse, TranscriptFindResponse, \
+    TranscriptSegmentsPatchRequest, TranscriptSegmentsPatchResponse
+from src.settings import settings
+from src.service.chat_answer_cache_service import ChatAnswerCacheService
 from src.service.file_service import FileService
+from src.service.hls_service import HlsService, HLS_MEDIA_TYPES
+from src.service.transcript_index_service import TranscriptIndexService
+from src.service.transcript_render_service import TranscriptRenderService
 from src.service.user_file_service import UserFileService
+from src.service.waveform_service import WaveformService
 
 router = APIRouter(
     tags=["user-files"],
@@ -41,12 +58,45 @@ async def get_user_files(
 async def get_user_files_detail(
     current_user_id: Annotated[int, Depends(get_current_user_id)],
     user_file_service: Annotated[UserFileService, Depends(get_user_file_service)],
+    transcript_render_service: Annotated[
+        TranscriptRenderService, Depends(get_transcript_render_service)
+    ],
     status: FileProcessingStatus | None = Query(
         None, description="Filter files by status"
     ),
 ):
-    files = await user_file_service.get_user_files(current_user_id, status=status)
-    return UserFileListDetailResponse(items=files)
+    files = await user_file_service.get_user_files_with_transcription_json(current_user_id, status=status)
+    details = await asyncio.gather(
+        *(
+            _render_detail_fields(file, transcription_json, transcript_render_service)
+            for file, transcription_json in files
+        )
+    )
+    items = [
+        _user_file_detail_json(file, transcription_json, detail)
+        for (file, transcription_json), detail in zip(files, details)
+    ]
+    return Response(content=b'{"items":[' + b",".join(items) + b"]}", media_type="application/json")
+
+
+@router.get(
+    "/search",
+    response_model=TranscriptSearchResponse,
+)
+async def search_user_files(
+    current_user_id: Annotated[int, Depends(get_current_user_id)],
+    user_file_service: Annotated[UserFileService, Depends(get_user_file_service)],
+    q: str = Query(..., min_length=1, max_length=200, description="Поисковый запрос"),
+    limit: int = Query(20, ge=1, le=50),
+    cursor: str | None = Query(None, description="next_cursor из предыдущей страницы"),
+):
+    try:
+        items, next_cursor = await user_file_service.search_transcriptions(
+            current_user_id, q, limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return TranscriptSearchResponse(items=items, next_cursor=next_cursor)
 
 
 @router.get(
@@ -56,12 +106,280 @@ async def get_user_files_detail(
 async def get_user_file_by_id_detail(
     current_user_id: Annotated[int, Depends(get_current_user_id)],
     user_file_service: Annotated[UserFileService, Depends(get_user_file_service)],
+    transcript_render_service: Annotated[
+        TranscriptRenderService, Depends(get_transcript_render_service)
+    ],
     file_id: int,
 ):
-    file = await user_file_service.get_user_file(user_id=current_user_id, file_ids=[file_id])
-    return file[0]
+    files = await user_file_service.get_user_files_with_transcription_json(current_user_id, [file_id])
+    if not files:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found or you don't have access to it",
+        )
+    file, transcription_json = files[0]
+    detail = await _render_detail_fields(file, transcription_json, transcript_render_service)
+    return Response(content=_user_file_detail_json(file, transcription_json, detail), media_type="application/json")
+
+
+async def _render_detail_fields(
+    file: UserFile, transcription_json: str | None, transcript_render_service: TranscriptRenderService
+) -> UserFileDetailFields:
+    """
+    Поля UserFileDetail без транскрипции. SRT и VTT больше не хранятся в строке файла,
+    они берутся из кэша рендеринга — и для одного файла, и для списка. Пока правки сегментов
+    не применены к сохраненному тексту, текст тоже строится заново: транскрипция в ответе
+    уже с правками, и текст должен ей соответствовать
+    """
+    # Рендеру при промахе кэша нужна сама транскрипция; компактная загружена и так
+    if file.transcription_compact is None:
+        set_committed_value(
+            file, "transcription", orjson.loads(transcription_json) if transcription_json is not None else None
+        )
+    detail = UserFileDetailFields.model_validate(file)
+    if file.transcription_edits:
+        detail.transcription_text = await transcript_render_service.render(file, TranscriptFormat.TEXT)
+    detail.transcription_srt = await transcript_render_service.render(file, TranscriptFormat.SRT)
+    detail.transcription_vtt = await transcript_render_service.render(file, TranscriptFormat.VTT)
+    return detail
 
 
+def _user_file_detail_json(
+    file: UserFile, transcription_json: str | None, detail: UserFileDetailFields | None = None
+) -> bytes:
+    """
+    UserFileDetail в JSON: поля без транскрипции сериализует pydantic, транскрипция
+    вставляется готовым JSON (текст JSONB из Postgres или orjson компактного вида)
+    """
+    if detail is None:
+        detail = UserFileDetailFields.model_validate(file)
+    fields = detail.__pydantic_serializer__.to_json(detail)
+    return fields[:-1] + b',"transcription":' + FileService.get_transcription_json(file, transcription_json) + b"}"
+
+
+MEDIA_TYPES = {
+    TranscriptFormat.TEXT: "text/plain; charset=utf-8",
+    TranscriptFormat.SRT: "application/x-subrip; charset=utf-8",
+    TranscriptFormat.VTT: "text/vtt; charset=utf-8",
+}
+
+
+@router.get("/{file_id}/transcription/{transcript_format}")
+async def get_transcription_rendered(
+    file_id: int,
+    transcript_format: TranscriptFormat,
+    current_user_id: Annotated[int, Depends(get_current_user_id)],
+    user_file_service: Annotated[UserFileService, Depends(get_user_file_service)],
+    transcript_render_service: Annotated[
+        TranscriptRenderService, Depends(get_transcript_render_service)
+    ],
+    max_line_length: int | None = Query(
+        None, ge=10, le=200, description="Максимальная длина строки субтитра"
+    ),
+    max_cps: float | None = Query(
+        None, gt=0, le=50, description="Максимальная скорость чтения, символов в секунду"
+    ),
+):
+    """
+    Транскрипция в формате text, srt или vtt, построенная из сегментов по запросу.
+    """
+    files = await user_file_service.get_user_file(current_user_id, [file_id])
+    if not files:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found or you don't have access to it",
+        )
+
+    content = await transcript_render_service.render(
+        files[0], transcript_format, max_line_length=max_line_length, max_cps=max_cps
+    )
+    if content is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Transcription not ready"
+        )
+    return Response(content=content, media_type=MEDIA_TYPES[transcript_format])
+
+
+@router.get("/{file_id}/peaks")
+async def get_waveform_peaks(
+    file_id: int,
+    request: Request,
+    current_user_id: Annotated[int, Depends(get_current_user_id)],
+    user_file_service: Annotated[UserFileService, Depends(get_user_file_service)],
+    waveform_service: Annotated[WaveformService, Depends(get_waveform_service)],
+    level: int = Query(0, ge=0, description="Уровень масштаба, 0 — самый подробный"),
+    source: AudioSource = Query(AudioSource.ORIGINAL, description="Исходное или обработанное аудио"),
+    v: str | None = Query(None, description="etag уровня из waveform_peaks файла"),
+):
+    """
+    Пики волны (min/max) в формате audiowaveform .dat.
+
+    С v, равным текущему etag уровня, ответ кэшируется навсегда (URL меняется вместе с пиками),
+    без v — клиент перепроверяет его по ETag и получает 304.
+    """
+    files = await user_file_service.get_user_file(current_user_id, [file_id])
+    if not files:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found or you don't have access to it",
+        )
+    peaks = waveform_service.get_level(files[0], source, level)
+    if peaks is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Peaks not ready")
+
+    etag, key = peaks
+    headers = {
+        "ETag": f'"{etag}"',
+        "Cache-Control": (
+            f"private, max-age={settings.WAVEFORM_PEAKS_CACHE_MAX_AGE_SECONDS}, immutable"
+            if v == etag
+            else "private, no-cache"
+        ),
+        "Vary": "Authorization",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if headers["ETag"] in {tag.strip() for tag in if_none_match.split(",")}:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    content = await asyncio.to_thread(waveform_service.read_level, key)
+    return Response(content=content, media_type="application/octet-stream", headers=headers)
+
+
+@router.get("/{file_id}/hls/{source}/master.m3u8")
+async def get_hls_master_playlist(
+    file_id: int,
+    source: AudioSource,
+    current_user_id: Annotated[int, Depends(get_current_user_id)],
+    hls_service: Annotated[HlsService, Depends(get_hls_service)],
+):
+    """
+    Master playlist HLS-нарезки исходного (source=original) или обработанного аудио.
+    Ссылки в нем относительные, поэтому плеер запрашивает варианты и сегменты через этот же роутер.
+    """
+    playlist = await hls_service.master_playlist(current_user_id, file_id, source)
+    if playlist is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Stream not ready")
+    # После повторной нарезки playlist указывает на новую, поэтому не кэшируется
+    return Response(
+        content=playlist,
+        media_type=HLS_MEDIA_TYPES[".m3u8"],
+        headers={"Cache-Control": "private, no-cache"},
+    )
+
+
+@router.get("/{file_id}/hls/{source}/{package_id}/{rendition}/{filename}")
+async def get_hls_file(
+    file_id: int,
+    source: AudioSource,
+    package_id: str,
+    rendition: str,
+    filename: str,
+    current_user_id: Annotated[int, Depends(get_current_user_id)],
+    hls_service: Annotated[HlsService, Depends(get_hls_service)],
+    file_service: Annotated[FileService, Depends(get_file_service)],
+):
+    """
+    Media playlist, init-сегмент или сегмент варианта. Файлы нарезки не меняются,
+    поэтому кэшируются клиентом без перепроверки.
+    """
+    key = await hls_service.get_object_key(current_user_id, file_id, source, package_id, rendition, filename)
+    if key is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Stream file not found")
+
+    metadata = await file_service.get_object_metadata("public-file", key)
+    if metadata is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Stream file not found")
+    headers = {
+        "Cache-Control": f"private, max-age={settings.HLS_SEGMENT_CACHE_MAX_AGE_SECONDS}, immutable",
+        "Content-Length": str(metadata.size),
+    }
+    return StreamingResponse(
+        file_service.iter_file_from_bucket("public-file", key),
+        media_type=HLS_MEDIA_TYPES[os.path.splitext(filename)[1]],
+        headers=headers,
+    )
+
+
+@router.get("/{file_id}/transcript/at", response_model=TranscriptSeekResponse)
+async def get_transcript_segment_at(
+    file_id: int,
+    current_user_id: Annotated[int, Depends(get_current_user_id)],
+    transcript_index_service: Annotated[
+        TranscriptIndexService, Depends(get_transcript_index_service)
+    ],
+    t: float = Query(..., ge=0, description="Время в секундах"),
+    context: int = Query(0, ge=0, le=20, description="Сколько сегментов вернуть до и после"),
+):
+    """
+    Сегмент транскрипции, который звучит в момент t.
+    """
+    result = await transcript_index_service.segments_at(current_user_id, file_id, t, context)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Transcription not found"
+        )
+    return TranscriptSeekResponse(**result)
+
+
+@router.get("/{file_id}/transcript/find", response_model=TranscriptFindResponse)
+async def find_transcript_phrase(
+    file_id: int,
+    current_user_id: Annotated[int, Depends(get_current_user_id)],
+    transcript_index_service: Annotated[
+        TranscriptIndexService, Depends(get_transcript_index_service)
+    ],
+    q: str = Query(..., min_length=1, max_length=200, description="Фраза"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """
+    Сегменты, в которых сказана фраза, с таймкодами.
+    """
+    items = await transcript_index_service.find_phrase(current_user_id, file_id, q, limit)
+    if items is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Transcription not found"
+        )
+    return TranscriptFindResponse(items=items)
+
+
+
+CONTENT_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".ogg": "audio/ogg",
+    ".flac": "audio/flac",
+}
+
+
+def _parse_ranges(range_header: str, size: int) -> list[tuple[int, int]]:
+    """
+    Диапазоны из заголовка Range ("bytes=0-99,200-,-500") с концами, обрезанными по размеру файла.
+    Диапазоны целиком за концом файла отбрасываются.
+
+    Raises:
+        ValueError: заголовок некорректный
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        raise ValueError("Invalid Range header")
+    ranges = []
+    for part in spec.split(","):
+        m = re.fullmatch(r"(\d*)-(\d*)", part.strip())
+        if not m or not (m.group(1) or m.group(2)):
+            raise ValueError("Invalid Range header")
+        if not m.group(1):
+            # Последние N байт
+            suffix = int(m.group(2))
+            if suffix:
+                ranges.append((max(size - suffix, 0), size - 1))
+            continue
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else max(start, size - 1)
+        if start > end:
+            raise ValueError("Invalid Range header")
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+    return ranges
+
 
 @router.get("/download")
 async def download_file(
@@ -77,91 +395,157 @@ async def download_file(
     parsed = urlparse(file_key)
     filename = parsed.path.rsplit("/", 1)[-1]
 
-    # Узнаём полный размер через stat_object
-    full_size = file_service.get_object_size("public-file", file_key)
-
-    # Разбираем заголовок Range
-    range_header = request.headers.get("range")
-    start = 0
-    end = full_size - 1
-    if range_header:
-        m = re.match(r"bytes=(\d+)-(\d*)", range_header)
-        if not m:
-            raise HTTPException(status_code=400, detail="Invalid Range header")
-        start = int(m.group(1))
-        if m.group(2):
-            end = int(m.group(2))
-        if start > end or end >= full_size:
-            raise HTTPException(status_code=416, detail="Requested Range Not Satisfiable")
-
-    length = end - start + 1
+    # Размер и etag из кэша метаданных, без stat_object на каждый Range-запрос
+    metadata = await file_service.get_object_metadata("public-file", file_key)
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    full_size = metadata.size
 
     # Определяем content_type по расширению
-    content_type = "application/octet-stream"
-    if filename.endswith(".mp3"):
-        content_type = "audio/mpeg"
-    elif filename.endswith(".wav"):
-        content_type = "audio/wav"
-    elif filename.endswith(".ogg"):
-        content_type = "audio/ogg"
-    elif filename.endswith(".flac"):
-        content_type = "audio/flac"
-
-    # Заголовки ответа
+    content_type = CONTENT_TYPES.get(os.path.splitext(filename)[1].lower(), metadata.content_type)
+
+    etag = f'"{metadata.etag}"'
+    last_modified = formatdate(metadata.last_modified, usegmt=True)
     headers = {
         "Accept-Ranges": "bytes",
         "Content-Disposition": f'attachment; filename="{filename}"',
-        "Content-Type": content_type,
+        "ETag": etag,
+        "Last-Modified": last_modified,
     }
 
-    status_code = status.HTTP_200_OK
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (
+        if_none_match.strip() == "*" or etag in {tag.strip() for tag in if_none_match.split(",")}
+    ):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Range с If-Range применяется, только если у клиента та же версия файла, иначе отдаем файл целиком
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and if_range.strip() not in (etag, last_modified):
+        range_header = None
+
+    ranges = None
     if range_header:
+        try:
+            ranges = _parse_ranges(range_header, full_size)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not ranges:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{full_size}"},
+            )
+        if len(ranges) > settings.DOWNLOAD_MAX_RANGES:
+            ranges = None
+
+    chunk_size = settings.DOWNLOAD_CHUNK_BYTES
+    if not ranges:
+        headers["Content-Length"] = str(full_size)
+        # Если не stream и нет Range — возвращаем весь файл разом
+        if not stream:
+            data = b"".join([
+                chunk async for chunk in file_service.iter_file_from_bucket("public-file", file_key, 0, full_size)
+            ])
+            return Response(content=data, headers=headers, media_type=content_type)
+        return StreamingResponse(
+            file_service.iter_file_from_bucket("public-file", file_key, 0, full_size, chunk_size),
+            headers=headers,
+            media_type=content_type,
+        )
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
         headers.update({
             "Content-Range": f"bytes {start}-{end}/{full_size}",
-            "Content-Length": str(length),
+            "Content-Length": str(end - start + 1),
         })
-        status_code = status.HTTP_206_PARTIAL_CONTENT
-    else:
-        headers["Content-Length"] = str(full_size)
-
-    # Берём нужный диапазон из MinIO
-    response = file_service.get_file_from_bucket(
-        bucket_name="public-file",
-        file_key=file_key,
-        offset=start,
-        length=length
-    )
-
-    # Если не stream и нет Range — возвращаем весь файл разом
-    if not stream and not range_header:
-        data = response.read()
-        response.close()
-        return Response(
-            content=data,
-            status_code=status_code,
+        return StreamingResponse(
+            file_service.iter_file_from_bucket("public-file", file_key, start, end - start + 1, chunk_size),
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
             headers=headers,
-            media_type=content_type
+            media_type=content_type,
         )
 
-    # Иначе — стримим чанками
-    async def iterator():
-        try:
-            while True:
-                chunk = response.read(64 * 1024)
-                if not chunk:
-                    break
+    # Несколько диапазонов — multipart/byteranges, каждая часть читается из MinIO своим запросом
+    boundary = uuid.uuid4().hex
+    part_headers = [
+        (
+            f"\r\n--{boundary}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{full_size}\r\n\r\n"
+        ).encode()
+        for start, end in ranges
+    ]
+    closing = f"\r\n--{boundary}--\r\n".encode()
+    headers["Content-Length"] = str(
+        sum(len(part) for part in part_headers) + sum(end - start + 1 for start, end in ranges) + len(closing)
+    )
+
+    async def multipart():
+        for part, (start, end) in zip(part_headers, ranges):
+            yield part
+            async for chunk in file_service.iter_file_from_bucket(
+                "public-file", file_key, start, end - start + 1, chunk_size
+            ):
                 yield chunk
-        finally:
-            response.close()
-            response.release_conn()
+        yield closing
 
     return StreamingResponse(
-        iterator(),
-        status_code=status_code,
+        multipart(),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
         headers=headers,
-        media_type=content_type
+        media_type=f"multipart/byteranges; boundary={boundary}",
     )
 
+
+@router.patch(
+    "/{file_id}/transcription/segments",
+    response_model=TranscriptSegmentsPatchResponse,
+)
+async def patch_transcription_segments(
+    file_id: int,
+    body: TranscriptSegmentsPatchRequest,
+    current_user_id: Annotated[int, Depends(get_current_user_id)],
+    user_file_service: Annotated[UserFileService, Depends(get_user_file_service)],
+    answer_cache: Annotated[ChatAnswerCacheService, Depends(get_chat_answer_cache_service)],
+):
+    """
+    Правка текста и таймкодов отдельных сегментов по номеру.
+
+    Сохраняются только сами правки; text, srt и vtt строятся из сегментов с правками,
+    сохраненная транскрипция и поисковый текст обновляются фоновой задачей.
+    """
+    if len(body.segments) > settings.TRANSCRIPT_EDITS_MAX_SEGMENTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many segments in one request (max {settings.TRANSCRIPT_EDITS_MAX_SEGMENTS})",
+        )
+    files = await user_file_service.get_user_file(current_user_id, [file_id])
+    if not files:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found or you don't have access to it",
+        )
+
+    edits = [edit.model_dump(exclude_none=True) for edit in body.segments]
+    try:
+        version, segments, text_changed = await user_file_service.patch_transcription_segments(
+            files[0], edits, body.expected_version
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except TranscriptVersionConflictExceptions as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=e.detail)
+
+    # Правка только таймкодов не меняет текст, ответы чата остаются актуальными
+    if text_changed:
+        await answer_cache.invalidate(file_id)
+    apply_transcription_edits.apply_async(
+        args=[file_id], countdown=settings.TRANSCRIPT_EDITS_APPLY_DELAY_SECONDS
+    )
+    return TranscriptSegmentsPatchResponse(transcription_version=version, segments=segments)
+
+
 @router.post(
     "/{file_id}/transcription",
     status_code=status.HTTP_200_OK,
@@ -171,6 +555,7 @@ async def update_transcription(
     body: TranscriptionUpdateRequest,
     current_user_id: Annotated[int, Depends(get_current_user_id)],
     user_file_service: Annotated[UserFileService, Depends(get_user_file_service)],
+    answer_cache: Annotated[ChatAnswerCacheService, Depends(get_chat_answer_cache_service)],
 ):
     """
     Update transcription data for a user file.
@@ -208,5 +593,8 @@ async def update_transcription(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid transcription type. Must be one of: json, text, vtt, srt",
         )
-    
+
+    # Ответы чата по старой транскрипции больше не актуальны
+    await answer_cache.invalidate(file_id)
+
     return {"status": "success"}
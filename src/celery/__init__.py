@@ -1,4 +1,21 @@
 from .celery_app import celery_app
-from .tasks import process_audio, enhance_audio_task
+from .tasks import process_audio, enhance_audio_task, summarize_chat_session, generate_file_insights, \
+    submit_transcription, submit_transcription_chunk, reconcile_transcriptions, transcribe_locally, compact_transcriptions, \
+    apply_transcription_edits, compute_waveform_peaks, package_hls, release_original_audio
 
-__all__ = ["celery_app", "process_audio", "enhance_audio_task"]
+__all__ = [
+    "celery_app",
+    "process_audio",
+    "enhance_audio_task",
+    "summarize_chat_session",
+    "generate_file_insights",
+    "submit_transcription",
+    "submit_transcription_chunk",
+    "reconcile_transcriptions",
+    "transcribe_locally",
+    "compact_transcriptions",
+    "apply_transcription_edits",
+    "compute_waveform_peaks",
+    "package_hls",
+    "release_original_audio",
+]
@@ -1,6 +1,8 @@
 from celery import Celery
 import os
 
+from src.settings import settings
+
 # Настройки брокера (Redis)
 redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
@@ -9,5 +11,32 @@ celery_app = Celery("audio_ai")
 celery_app.conf.broker_url = redis_url
 celery_app.conf.result_backend = redis_url
 
+# Отправка файлов на расшифровку идет через отдельную очередь
+TRANSCRIPTION_QUEUE = "transcription"
+# Расшифровка локальной моделью, воркер с concurrency=1: модель сама занимает все ядра
+TRANSCRIPTION_LOCAL_QUEUE = "transcription_local"
+# Пики волны и HLS-нарезка: свой воркер, чтобы они не ждали за разделением дорожек в общей очереди,
+# пока исходное аудио хранится ради них после транскрипции
+DERIVATIVES_QUEUE = "derivatives"
+
+celery_app.conf.beat_schedule = {
+    "reconcile-transcriptions": {
+        "task": "reconcile_transcriptions",
+        "schedule": float(settings.TRANSCRIPTION_RECONCILE_INTERVAL_SECONDS),
+    },
+    "rollup-usage": {
+        "task": "rollup_usage",
+        "schedule": float(settings.USAGE_ROLLUP_INTERVAL_SECONDS),
+    },
+    "reconcile-payment-webhooks": {
+        "task": "reconcile_payment_webhooks",
+        "schedule": float(settings.PAYMENT_WEBHOOK_RECONCILE_INTERVAL_SECONDS),
+    },
+    "release-original-audio": {
+        "task": "release_original_audio",
+        "schedule": float(settings.ORIGINAL_AUDIO_RELEASE_INTERVAL_SECONDS),
+    },
+}
+
 # Configure Celery to find tasks
 celery_app.autodiscover_tasks(["src.celery"])
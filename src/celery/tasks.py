@@ -1,6 +1,8 @@
 from celery import shared_task
 
-from src.celery.celery_app import celery_app
+from src.celery import worker_loop
+from src.celery.celery_app import celery_app, TRANSCRIPTION_QUEUE, TRANSCRIPTION_LOCAL_QUEUE, DERIVATIVES_QUEUE
+from src.exceptions import WhisperAIUnavailableExceptions
 from src.service.audio_processing import remove_noise, remove_melody, remove_vocals
 from src.service.enhance_audio import enhance_audio_async
 import tempfile
@@ -8,8 +10,13 @@ import os
 import logging
 from pathlib import Path
 import asyncio
-from src.models.enums import FileProcessingStatus, FileRemoveNoiseStatus, FileRemoveMelodyStatus, FileRemoveVocalStatus
-from src.facade.user_file_service_facade import UserFileServiceFacade, FileServiceFacade
+from src.models.enums import FileProcessingStatus, FileRemoveNoiseStatus, FileRemoveMelodyStatus, FileRemoveVocalStatus, \
+    TranscriptionBackendType, AudioSource, UsageEventType
+from src.facade.user_file_service_facade import UserFileServiceFacade, FileServiceFacade, ChatServiceFacade, \
+    FileInsightsServiceFacade, AudioConvertServiceFacade, WaveformServiceFacade, HlsServiceFacade, \
+    UserProductsServiceFacade, ProductCatalogCacheFacade, PaymentWebhookServiceFacade
+from src.service.payment.payment_webhook_service import PaymentWebhookRejected
+from src.settings import settings
 
 
 @celery_app.task(name="process_audio")
@@ -62,7 +69,408 @@ def process_audio(
 
 @shared_task(name="enhance_audio", queue="enhance")
 def enhance_audio_task(file_id: int, user_id: int, file_url: str, preset: str) -> dict:
-    return asyncio.run(enhance_audio_async(file_id, user_id, file_url, preset=preset))
+    result = asyncio.run(enhance_audio_async(file_id, user_id, file_url, preset=preset))
+    schedule_audio_derivatives(file_id, AudioSource.ENHANCED)
+    record_usage.delay(file_id, user_id, UsageEventType.ENHANCE.value)
+    return result
+
+
+@celery_app.task(name="summarize_chat_session")
+def summarize_chat_session(session_id: int) -> dict:
+    return asyncio.run(summarize_chat_session_async(session_id))
+
+
+async def summarize_chat_session_async(session_id: int) -> dict:
+    """Сворачивает старые сообщения чата в summary сессии"""
+    chat_service = await ChatServiceFacade.get_chat_service()
+    try:
+        updated = await chat_service.summarize_session(session_id)
+        logging.info(f"[TASK] Chat session {session_id} summary updated: {updated}")
+        return {"session_id": session_id, "updated": updated}
+    finally:
+        await chat_service.chat_repository.db.close()
+        await chat_service.answer_cache.redis.aclose()
+
+
+@celery_app.task(name="generate_file_insights")
+def generate_file_insights(file_id: int) -> dict:
+    return asyncio.run(generate_file_insights_async(file_id))
+
+
+async def generate_file_insights_async(file_id: int) -> dict:
+    """Генерирует summary, главы и plain text по готовой транскрипции"""
+    insights_service = await FileInsightsServiceFacade.get_file_insights_service()
+    try:
+        generated = await insights_service.generate_insights(file_id)
+        logging.info(f"[TASK] File {file_id} insights generated: {generated}")
+        return {"file_id": file_id, "generated": generated}
+    finally:
+        await insights_service.user_file_service.user_file_repository.db.close()
+
+
+@celery_app.task(
+    name="submit_transcription",
+    bind=True,
+    queue=TRANSCRIPTION_QUEUE,
+    # Сообщение подтверждается после отправки: при падении воркера задача вернется в очередь
+    acks_late=True,
+    reject_on_worker_lost=True,
+    rate_limit=settings.TRANSCRIPTION_SUBMIT_RATE_LIMIT,
+    max_retries=None,
+)
+def submit_transcription(self, file_id: int) -> dict:
+    try:
+        return worker_loop.run(submit_transcription_async(file_id))
+    except WhisperAIUnavailableExceptions as e:
+        logging.warning(f"[TASK] Whisper AI unavailable, file {file_id} will be resubmitted later")
+        raise self.retry(exc=e, countdown=settings.WISPER_AI_CIRCUIT_RESET_SECONDS)
+
+
+async def submit_transcription_async(file_id: int) -> dict:
+    """Отправляет файл провайдеру расшифровки, повторная отправка того же файла пропускается"""
+    # Клиент процесса воркера не закрывается: его пул и лимиты переживают задачу
+    audio_convert_service = await AudioConvertServiceFacade.get_audio_convert_service(
+        audio_ai_client=worker_loop.get_whisper_ai_client()
+    )
+    try:
+        submitted = await audio_convert_service.submit_transcription(file_id)
+        logging.info(f"[TASK] File {file_id} submitted for transcription: {submitted}")
+        return {"file_id": file_id, "submitted": submitted}
+    finally:
+        await audio_convert_service.user_file_service.user_file_repository.db.close()
+        await audio_convert_service.file_service.metadata_cache.redis.aclose()
+
+
+@celery_app.task(
+    name="submit_transcription_chunk",
+    bind=True,
+    queue=TRANSCRIPTION_QUEUE,
+    acks_late=True,
+    reject_on_worker_lost=True,
+    rate_limit=settings.TRANSCRIPTION_SUBMIT_RATE_LIMIT,
+    max_retries=None,
+)
+def submit_transcription_chunk(self, file_id: int, chunk_index: int) -> dict:
+    try:
+        return worker_loop.run(submit_transcription_chunk_async(file_id, chunk_index))
+    except WhisperAIUnavailableExceptions as e:
+        logging.warning(f"[TASK] Whisper AI unavailable, chunk {chunk_index} of file {file_id} will be resubmitted later")
+        raise self.retry(exc=e, countdown=settings.WISPER_AI_CIRCUIT_RESET_SECONDS)
+
+
+async def submit_transcription_chunk_async(file_id: int, chunk_index: int) -> dict:
+    """Повторно отправляет кусок, расшифровка которого не удалась"""
+    audio_convert_service = await AudioConvertServiceFacade.get_audio_convert_service(
+        audio_ai_client=worker_loop.get_whisper_ai_client()
+    )
+    try:
+        submitted = await audio_convert_service.submit_transcription_chunk(file_id, chunk_index)
+        logging.info(f"[TASK] Chunk {chunk_index} of file {file_id} resubmitted for transcription: {submitted}")
+        return {"file_id": file_id, "chunk_index": chunk_index, "submitted": submitted}
+    finally:
+        await audio_convert_service.user_file_service.user_file_repository.db.close()
+        await audio_convert_service.file_service.metadata_cache.redis.aclose()
+
+
+# Без acks_late: расшифровка длинного файла может идти дольше visibility timeout брокера,
+# а потерянную задачу переотправит reconcile_transcriptions
+@celery_app.task(name="transcribe_locally", queue=TRANSCRIPTION_LOCAL_QUEUE)
+def transcribe_locally(
+    file_id: int,
+    language: str | None = None,
+    audio_file_key: str | None = None,
+    chunk_index: int | None = None,
+) -> dict:
+    return asyncio.run(transcribe_locally_async(file_id, language, audio_file_key, chunk_index))
+
+
+async def transcribe_locally_async(
+    file_id: int,
+    language: str | None = None,
+    audio_file_key: str | None = None,
+    chunk_index: int | None = None,
+) -> dict:
+    """Расшифровывает файл локальной моделью Whisper"""
+    audio_convert_service = await AudioConvertServiceFacade.get_audio_convert_service(
+        TranscriptionBackendType.LOCAL
+    )
+    try:
+        completed = await audio_convert_service.transcribe_locally(
+            file_id, language, audio_file_key, chunk_index
+        )
+        logging.info(f"[TASK] File {file_id} transcribed locally: {completed}")
+        return {"file_id": file_id, "completed": completed}
+    finally:
+        await audio_convert_service.user_file_service.user_file_repository.db.close()
+        await audio_convert_service.file_service.metadata_cache.redis.aclose()
+
+
+@celery_app.task(name="reconcile_transcriptions")
+def reconcile_transcriptions() -> dict:
+    return asyncio.run(reconcile_transcriptions_async())
+
+
+async def reconcile_transcriptions_async() -> dict:
+    """
+    Переотправляет файлы, по которым задача потерялась или callback провайдера не пришел,
+    и помечает FAILED файлы, исчерпавшие попытки
+    """
+    user_file_service = await UserFileServiceFacade.get_user_file_service()
+    try:
+        failed_ids = await user_file_service.fail_exhausted_transcriptions()
+        stalled_ids = await user_file_service.get_stalled_transcription_ids()
+    finally:
+        await user_file_service.user_file_repository.db.close()
+
+    for file_id in stalled_ids:
+        submit_transcription.apply_async(args=[file_id], queue=TRANSCRIPTION_QUEUE)
+    if failed_ids or stalled_ids:
+        logging.warning(
+            f"[TASK] Transcription reconcile: resubmitted {stalled_ids}, failed {failed_ids}"
+        )
+    return {"resubmitted": stalled_ids, "failed": failed_ids}
+
+
+@celery_app.task(name="compact_transcriptions")
+def compact_transcriptions(batch_size: int | None = None) -> dict:
+    return asyncio.run(compact_transcriptions_async(batch_size))
+
+
+async def compact_transcriptions_async(batch_size: int | None = None) -> dict:
+    """
+    Переводит сохраненные ранее JSONB-транскрипции в компактный вид.
+    Запускается вручную после миграции, повторный запуск продолжает с оставшихся файлов
+    """
+    user_file_service = await UserFileServiceFacade.get_user_file_service()
+    try:
+        converted = await user_file_service.compact_transcriptions(
+            batch_size or settings.TRANSCRIPT_COMPACT_BATCH_SIZE
+        )
+    finally:
+        await user_file_service.user_file_repository.db.close()
+    logging.info(f"[TASK] Compacted {converted} transcriptions")
+    return {"converted": converted}
+
+
+@celery_app.task(
+    name="compute_waveform_peaks", bind=True, queue=DERIVATIVES_QUEUE, max_retries=settings.DERIVATIVE_MAX_RETRIES
+)
+def compute_waveform_peaks(self, file_id: int, source: str = AudioSource.ORIGINAL.value) -> dict:
+    try:
+        return asyncio.run(compute_waveform_peaks_async(file_id, AudioSource(source)))
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            logging.warning(f"[TASK] Waveform peaks for file {file_id} ({source}) failed, will retry: {str(e)}")
+            raise self.retry(exc=e, countdown=settings.DERIVATIVE_RETRY_SECONDS)
+        logging.error(f"[TASK] Waveform peaks for file {file_id} ({source}) failed: {str(e)}")
+        asyncio.run(fail_waveform_peaks_async(file_id, AudioSource(source)))
+        return {"file_id": file_id, "source": source, "computed": False, "error": str(e)}
+
+
+async def compute_waveform_peaks_async(file_id: int, source: AudioSource) -> dict:
+    waveform_service = await WaveformServiceFacade.get_waveform_service()
+    try:
+        peaks = await waveform_service.compute_peaks(file_id, source)
+    finally:
+        await waveform_service.user_file_service.user_file_repository.db.close()
+        await waveform_service.file_service.metadata_cache.redis.aclose()
+    logging.info(f"[TASK] Waveform peaks for file {file_id} ({source.value}): {'done' if peaks else 'no audio'}")
+    return {"file_id": file_id, "source": source.value, "computed": peaks is not None}
+
+
+async def fail_waveform_peaks_async(file_id: int, source: AudioSource) -> None:
+    waveform_service = await WaveformServiceFacade.get_waveform_service()
+    try:
+        await waveform_service.record_failure(file_id, source)
+    finally:
+        await waveform_service.user_file_service.user_file_repository.db.close()
+        await waveform_service.file_service.metadata_cache.redis.aclose()
+
+
+@celery_app.task(name="package_hls", bind=True, queue=DERIVATIVES_QUEUE, max_retries=settings.DERIVATIVE_MAX_RETRIES)
+def package_hls(self, file_id: int, source: str = AudioSource.ORIGINAL.value) -> dict:
+    try:
+        return asyncio.run(package_hls_async(file_id, AudioSource(source)))
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            logging.warning(f"[TASK] HLS package for file {file_id} ({source}) failed, will retry: {str(e)}")
+            raise self.retry(exc=e, countdown=settings.DERIVATIVE_RETRY_SECONDS)
+        logging.error(f"[TASK] HLS package for file {file_id} ({source}) failed: {str(e)}")
+        asyncio.run(fail_hls_package_async(file_id, AudioSource(source)))
+        return {"file_id": file_id, "source": source, "package_id": None, "error": str(e)}
+
+
+async def package_hls_async(file_id: int, source: AudioSource) -> dict:
+    hls_service = await HlsServiceFacade.get_hls_service()
+    try:
+        package = await hls_service.package(file_id, source)
+    finally:
+        await hls_service.user_file_service.user_file_repository.db.close()
+        await hls_service.file_service.metadata_cache.redis.aclose()
+    logging.info(f"[TASK] HLS package for file {file_id} ({source.value}): {'done' if package else 'no audio'}")
+    return {"file_id": file_id, "source": source.value, "package_id": package and package["package_id"]}
+
+
+async def fail_hls_package_async(file_id: int, source: AudioSource) -> None:
+    hls_service = await HlsServiceFacade.get_hls_service()
+    try:
+        await hls_service.record_failure(file_id, source)
+    finally:
+        await hls_service.user_file_service.user_file_repository.db.close()
+        await hls_service.file_service.metadata_cache.redis.aclose()
+
+
+@celery_app.task(name="release_original_audio")
+def release_original_audio() -> dict:
+    return asyncio.run(release_original_audio_async())
+
+
+async def release_original_audio_async() -> dict:
+    """
+    Удаляет исходное аудио, которое хранится дольше ORIGINAL_AUDIO_RETENTION_HOURS:
+    его производная так и не записалась или включена уже после загрузки файла
+    """
+    file_service = await FileServiceFacade.get_file_service()
+    user_file_service = await UserFileServiceFacade.get_user_file_service()
+    try:
+        released = await user_file_service.release_retained_original_audio(
+            file_service, settings.ORIGINAL_AUDIO_RELEASE_BATCH_SIZE
+        )
+    finally:
+        await user_file_service.user_file_repository.db.close()
+        await file_service.metadata_cache.redis.aclose()
+    if released:
+        logging.info(f"[TASK] Released original audio of files {released}")
+    return {"released": released}
+
+
+def schedule_audio_derivatives(file_id: int, source: AudioSource) -> None:
+    """Пики волны и HLS-нарезка для нового или обработанного аудио"""
+    if settings.WAVEFORM_PEAKS_ENABLED:
+        compute_waveform_peaks.delay(file_id, source.value)
+    if settings.HLS_ENABLED:
+        package_hls.delay(file_id, source.value)
+
+
+@celery_app.task(name="apply_transcription_edits")
+def apply_transcription_edits(file_id: int) -> dict:
+    return asyncio.run(apply_transcription_edits_async(file_id))
+
+
+async def apply_transcription_edits_async(file_id: int) -> dict:
+    """
+    Применяет накопленные правки сегментов к сохраненной транскрипции.
+    Ставится с задержкой после каждой правки, поэтому серия правок применяется одной записью
+    """
+    user_file_service = await UserFileServiceFacade.get_user_file_service()
+    try:
+        applied = await user_file_service.apply_transcription_edits(file_id)
+    finally:
+        await user_file_service.user_file_repository.db.close()
+    return {"file_id": file_id, "applied": applied}
+
+
+@celery_app.task(name="record_usage")
+def record_usage(file_id: int, user_id: int, event_type: str) -> dict:
+    return asyncio.run(record_usage_async(file_id, user_id, UsageEventType(event_type)))
+
+
+async def record_usage_async(file_id: int, user_id: int, event_type: UsageEventType) -> dict:
+    """Журнал списаний для обработки аудио: отдельной задачей, чтобы сбой учета не ронял обработку"""
+    user_file_service = await UserFileServiceFacade.get_user_file_service()
+    user_products_service = await UserProductsServiceFacade.get_user_products_service()
+    try:
+        user_file = await user_file_service.get_user_file_by_id(file_id)
+        seconds = (user_file.duration or 0) if user_file else 0
+        await user_products_service.deduct_minutes(
+            user_id=user_id, seconds_used=seconds, event_type=event_type, user_file_id=file_id
+        )
+    finally:
+        await user_file_service.user_file_repository.db.close()
+        await user_products_service.user_products_repository.db.close()
+        await user_products_service.plan_cache.redis.aclose()
+    return {"file_id": file_id, "event_type": event_type.value, "seconds": seconds}
+
+
+@celery_app.task(name="rollup_usage")
+def rollup_usage() -> dict:
+    return asyncio.run(rollup_usage_async())
+
+
+async def rollup_usage_async() -> dict:
+    """Пересчитывает дневные суммы журнала списаний за последние дни"""
+    user_products_service = await UserProductsServiceFacade.get_user_products_service()
+    try:
+        rows = await user_products_service.rollup_usage()
+    finally:
+        await user_products_service.user_products_repository.db.close()
+        await user_products_service.plan_cache.redis.aclose()
+    return {"rows": rows}
+
+
+@celery_app.task(
+    name="process_payment_webhook",
+    bind=True,
+    acks_late=True,
+    reject_on_worker_lost=True,
+    max_retries=None,
+)
+def process_payment_webhook(self, inbox_id: int) -> dict:
+    try:
+        return asyncio.run(process_payment_webhook_async(inbox_id))
+    except PaymentWebhookRejected as e:
+        logging.error(f"[TASK] Payment webhook {inbox_id} rejected: {str(e)}")
+        return {"inbox_id": inbox_id, "credited": False, "error": str(e)}
+    except Exception as e:
+        # Число попыток считает inbox: после PAYMENT_WEBHOOK_MAX_ATTEMPTS приходит PaymentWebhookRejected
+        logging.warning(f"[TASK] Payment webhook {inbox_id} failed, will retry: {str(e)}")
+        raise self.retry(exc=e, countdown=settings.PAYMENT_WEBHOOK_RETRY_SECONDS)
+
+
+async def process_payment_webhook_async(inbox_id: int) -> dict:
+    """Зачисляет оплату по сохраненному уведомлению; повторы и дубли задачи безопасны"""
+    payment_webhook_service = await PaymentWebhookServiceFacade.get_payment_webhook_service()
+    try:
+        credited = await payment_webhook_service.process(inbox_id)
+    finally:
+        await payment_webhook_service.payment_webhook_repository.db.close()
+        await payment_webhook_service.user_products_service.plan_cache.redis.aclose()
+    return {"inbox_id": inbox_id, "credited": credited}
+
+
+@celery_app.task(name="reconcile_payment_webhooks")
+def reconcile_payment_webhooks() -> dict:
+    return asyncio.run(reconcile_payment_webhooks_async())
+
+
+async def reconcile_payment_webhooks_async() -> dict:
+    """Ставит задачи для уведомлений, которые не обработались: задача не поставилась или потерялась"""
+    payment_webhook_service = await PaymentWebhookServiceFacade.get_payment_webhook_service()
+    try:
+        inbox_ids = await payment_webhook_service.get_stalled_ids()
+    finally:
+        await payment_webhook_service.payment_webhook_repository.db.close()
+        await payment_webhook_service.user_products_service.plan_cache.redis.aclose()
+    for inbox_id in inbox_ids:
+        process_payment_webhook.delay(inbox_id)
+    if inbox_ids:
+        logging.warning(f"[TASK] Payment webhook reconcile: requeued {inbox_ids}")
+    return {"requeued": inbox_ids}
+
+
+@celery_app.task(name="invalidate_product_catalog")
+def invalidate_product_catalog() -> dict:
+    return asyncio.run(invalidate_product_catalog_async())
+
+
+async def invalidate_product_catalog_async() -> dict:
+    """Сбрасывает кэш каталога во всех процессах API; запускается вручную после изменения продуктов"""
+    catalog_cache = await ProductCatalogCacheFacade.get_product_catalog_cache()
+    try:
+        await catalog_cache.invalidate()
+    finally:
+        await catalog_cache.redis.aclose()
+    return {"invalidated": True}
 
 
 async def process_audio_async(
@@ -139,6 +547,13 @@ async def process_audio_async(
                     await user_file_service.update_vocals_removed_url(file_id, uploaded_file_url)
                     await user_file_service.update_vocals_removed_status(file_id, status=FileRemoveVocalStatus.COMPLETED)
 
+                schedule_audio_derivatives(file_id, {
+                    "noise": AudioSource.NOISE_REMOVED,
+                    "melody": AudioSource.MELODY_REMOVED,
+                    "vocals": AudioSource.VOCALS_REMOVED,
+                }[processing_type])
+                record_usage.delay(file_id, user_id, UsageEventType.SEPARATION.value)
+
                 # Update file status to completed
                 await user_file_service.update_files_status(
                     [file_id], FileProcessingStatus.COMPLETED
@@ -176,3 +591,5 @@ async def process_audio_async(
         
         # Пробрасываем ошибку дальше
         raise e
+    finally:
+        await file_service.metadata_cache.redis.aclose()
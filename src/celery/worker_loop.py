@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import threading
+from typing import Coroutine, TypeVar
+
+from celery.signals import worker_process_shutdown, worker_shutdown
+
+from src.client.whisper_ai_client import WhisperAIClient
+from src.dependency import create_whisper_ai_client
+
+T = TypeVar("T")
+
+# Сколько ждать закрытия клиента при остановке воркера
+SHUTDOWN_TIMEOUT_SECONDS = 10
+
+# Event loop процесса воркера в отдельном потоке: живет между задачами, в отличие от asyncio.run.
+# Воркер transcription запущен с пулом потоков (--pool=threads): задачи из разных потоков
+# выполняются в этом loop одновременно, поэтому лимиты клиента действуют на все отправки процесса,
+# а долгая подготовка аудио или пауза перед повтором одного файла не держат остальные
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_thread: threading.Thread | None = None
+# Клиент провайдера транскрипции процесса: пул соединений, лимиты и circuit breaker
+# общие для всех задач отправки этого процесса
+_whisper_ai_client: WhisperAIClient | None = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Loop создается при первой задаче: поток, запущенный до fork (пул prefork), в дочернем процессе не работает"""
+    global _loop, _loop_thread
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="worker-loop", daemon=True)
+            _loop_thread.start()
+        return _loop
+
+
+def run(coro: Coroutine[object, object, T]) -> T:
+    """Выполняет корутину задачи в event loop процесса вместо asyncio.run и ждет результата"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+
+def get_whisper_ai_client() -> WhisperAIClient:
+    global _whisper_ai_client
+    with _lock:
+        if _whisper_ai_client is None:
+            _whisper_ai_client = create_whisper_ai_client()
+        return _whisper_ai_client
+
+
+@worker_shutdown.connect
+@worker_process_shutdown.connect
+def shutdown_worker_loop(**kwargs) -> None:
+    global _loop, _loop_thread, _whisper_ai_client
+    with _lock:
+        loop, loop_thread, client = _loop, _loop_thread, _whisper_ai_client
+        _loop = _loop_thread = _whisper_ai_client = None
+    if loop is None or loop.is_closed():
+        return
+    try:
+        if client is not None:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(SHUTDOWN_TIMEOUT_SECONDS)
+        asyncio.run_coroutine_threadsafe(loop.shutdown_asyncgens(), loop).result(SHUTDOWN_TIMEOUT_SECONDS)
+    except Exception as e:
+        logging.warning(f"Failed to close worker event loop: {str(e)}")
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        if loop_thread is not None:
+            loop_thread.join(SHUTDOWN_TIMEOUT_SECONDS)
+        if not loop.is_running():
+            loop.close()
@@ -0,0 +1,74 @@
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=2)
+def _load_model(model_size: str, compute_type: str, cpu_threads: int, download_root: str | None):
+    # faster-whisper ставится только в образ воркера
+    from faster_whisper import WhisperModel
+
+    logger.info(f"Загрузка модели Whisper {model_size} ({compute_type})")
+    return WhisperModel(
+        model_size,
+        device="cpu",
+        compute_type=compute_type,
+        cpu_threads=cpu_threads,
+        download_root=download_root,
+    )
+
+
+@dataclass
+class LocalWhisperClient:
+    """
+    Квантизованная модель Whisper (faster-whisper / CTranslate2) на CPU.
+    Модель загружается один раз на процесс воркера.
+    """
+
+    model_size: str = "small"
+    compute_type: str = "int8"
+    cpu_threads: int = 4
+    beam_size: int = 1
+    download_root: str | None = None
+
+    def transcribe(self, audio_path: str, language: str | None = None) -> dict:
+        """
+        Расшифровывает файл и возвращает результат в формате verbose_json,
+        как его присылает удаленный провайдер.
+        """
+        model = _load_model(
+            self.model_size, self.compute_type, self.cpu_threads, self.download_root
+        )
+        segments, info = model.transcribe(
+            audio_path,
+            language=language,
+            beam_size=self.beam_size,
+            vad_filter=True,
+        )
+
+        result_segments = []
+        for segment in segments:
+            result_segments.append(
+                {
+                    "id": segment.id,
+                    "seek": segment.seek,
+                    "start": segment.start,
+                    "end": segment.end,
+                    "text": segment.text,
+                    "tokens": segment.tokens,
+                    "temperature": segment.temperature,
+                    "avg_logprob": segment.avg_logprob,
+                    "compression_ratio": segment.compression_ratio,
+                    "no_speech_prob": segment.no_speech_prob,
+                }
+            )
+
+        return {
+            "task": "transcribe",
+            "language": info.language,
+            "duration": info.duration,
+            "text": "".join(seg["text"] for seg in result_segments).strip(),
+            "segments": result_segments,
+        }
@@ -2,6 +2,7 @@ from typing import BinaryIO
 
 from fastapi import File, HTTPException
 from minio import Minio, S3Error
+from minio.deleteobjects import DeleteObject
 
 
 class S3Client:
@@ -48,6 +49,17 @@ class S3Client:
                 detail=f"Failed to upload file: {file_key}. Error: {str(e)}",
             )
 
+    def stat_object(self, bucket_name: str, object_name: str):
+        """
+        Object metadata (size, etag, content type, last modified), or None if there is no such object.
+        """
+        try:
+            return self.s3.stat_object(bucket_name, object_name)
+        except S3Error as err:
+            if err.code in ("NoSuchKey", "NoSuchBucket"):
+                return None
+            raise
+
     def get_object_size(self, bucket_name: str, object_name: str) -> int:
         try:
             info = self.s3.stat_object(bucket_name, object_name)
@@ -80,3 +92,18 @@ class S3Client:
                 status_code=500,
                 detail=f"Failed to delete file: {file_key}. Error: {str(e)}",
             )
+
+    def delete_prefix(self, prefix: str) -> list[str]:
+        """
+        Delete all objects under the prefix (e.g. every segment of an HLS package).
+
+        :return: Keys of the deleted objects.
+        """
+        keys = [obj.object_name for obj in self.s3.list_objects(self.bucket_name, prefix=prefix, recursive=True)]
+        errors = list(self.s3.remove_objects(self.bucket_name, (DeleteObject(key) for key in keys)))
+        if errors:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to delete files under: {prefix}. Error: {errors[0].message}",
+            )
+        return keys
@@ -1,18 +1,80 @@
+import asyncio
 import logging
-from dataclasses import dataclass
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator
 
 import httpx
 
-from src.settings import settings
+from src.exceptions import WhisperAIUnavailableExceptions, WhisperAIRequestUnconfirmedExceptions
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Ошибки, при которых запрос точно не ушел провайдеру: его можно отправить еще раз.
+# После отправки (таймаут чтения, обрыв ответа) провайдер мог уже принять задачу —
+# отправка не идемпотентна, поэтому такой запрос не повторяется
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
 
 @dataclass
 class WhisperAIClient:
+    """
+    Долгоживущий клиент провайдера транскрипции: один пул соединений на процесс,
+    общий и пользовательский лимиты параллельных запросов, ограничение частоты,
+    повторы с экспоненциальной задержкой и circuit breaker.
+    """
+
     base_url: str
     auth_token: str
+    max_concurrency: int = 8
+    max_concurrency_per_user: int = 2
+    rate_limit_per_second: float = 5.0
+    connect_timeout: float = 10.0
+    read_timeout: float = 60.0
+    max_retries: int = 5
+    backoff_base_seconds: float = 1.0
+    backoff_max_seconds: float = 60.0
+    circuit_failure_threshold: int = 5
+    circuit_reset_seconds: float = 30.0
+    proxy: str | None = None
+
+    _http_client: httpx.AsyncClient | None = field(default=None, init=False, repr=False)
+    _semaphore: asyncio.Semaphore = field(init=False, repr=False)
+    # Семафоры пользователей, у которых есть запросы в работе или в ожидании, и число таких запросов
+    _user_semaphores: dict[int, asyncio.Semaphore] = field(default_factory=dict, init=False, repr=False)
+    _user_requests: dict[int, int] = field(default_factory=dict, init=False, repr=False)
+    _rate_lock: asyncio.Lock = field(init=False, repr=False)
+    _next_request_at: float = field(default=0.0, init=False, repr=False)
+    _consecutive_failures: int = field(default=0, init=False, repr=False)
+    _circuit_open_until: float = field(default=0.0, init=False, repr=False)
+
+    def __post_init__(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._rate_lock = asyncio.Lock()
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    self.read_timeout, connect=self.connect_timeout
+                ),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+                proxy=self.proxy,
+            )
+        return self._http_client
+
+    async def aclose(self) -> None:
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
 
     async def convert_audio_to_text(
         self,
@@ -20,7 +82,8 @@ class WhisperAIClient:
         response_format: str,
         language: str | None = None,
         callback_url: str | None = None,
-    ) -> str:
+        user_id: int | None = None,
+    ) -> dict:
         data = {
             "file": audio_file_url,
             "response_format": response_format,
@@ -29,14 +92,116 @@ class WhisperAIClient:
         if language:
             data["language"] = language
 
-        async with httpx.AsyncClient(timeout=None, proxy=settings.PROXY_URL) as client:
+        async with self._user_slot(user_id), self._semaphore:
+            response = await self._post_with_retries(data)
+
+        logger.info(f"Запрос в whisper  по audio_file_url{audio_file_url}")
+        return response.json()
+
+    @asynccontextmanager
+    async def _user_slot(self, user_id: int | None) -> AsyncIterator[None]:
+        """
+        Лимит параллельных запросов пользователя. Семафор удаляется, когда последний
+        запрос пользователя завершился и никто его не ждет, поэтому словарь не растет
+        с числом пользователей за время жизни процесса
+        """
+        if user_id is None:
+            yield
+            return
+        semaphore = self._user_semaphores.get(user_id)
+        if semaphore is None:
+            semaphore = self._user_semaphores[user_id] = asyncio.Semaphore(self.max_concurrency_per_user)
+        self._user_requests[user_id] = self._user_requests.get(user_id, 0) + 1
+        try:
+            async with semaphore:
+                yield
+        finally:
+            self._user_requests[user_id] -= 1
+            if not self._user_requests[user_id]:
+                del self._user_requests[user_id]
+                del self._user_semaphores[user_id]
+
+    async def _post_with_retries(self, data: dict) -> httpx.Response:
+        attempt = 0
+        while True:
+            self._check_circuit()
+            await self._wait_for_rate_limit()
+            retry_after = None
             try:
-                response = await client.post(
+                response = await self.http_client.post(
                     url=f"{self.base_url}",
                     json=data,
                     headers={"Authorization": f"Bearer {self.auth_token}"},
                 )
-                logger.info(f"Запрос в whisper  по audio_file_url{audio_file_url}")
-                return response.json()
-            except httpx.ReadTimeout:
-                pass
+                if response.status_code not in RETRY_STATUS_CODES:
+                    # 4xx кроме 429 — ошибка запроса, повтор не поможет
+                    response.raise_for_status()
+                    self._record_success()
+                    return response
+                error = httpx.HTTPStatusError(
+                    f"Whisper AI responded with {response.status_code}",
+                    request=response.request,
+                    response=response,
+                )
+                retry_after = self._parse_retry_after(response)
+                # 429 означает, что нас притормаживают, а не что провайдер лежит
+                if response.status_code != 429:
+                    self._record_failure()
+            except NOT_SENT_ERRORS as e:
+                error = e
+                # Нехватка соединений в своем пуле — не сбой провайдера
+                if not isinstance(e, httpx.PoolTimeout):
+                    self._record_failure()
+            except httpx.TransportError as e:
+                self._record_failure()
+                raise WhisperAIRequestUnconfirmedExceptions(str(e)) from e
+
+            attempt += 1
+            if attempt > self.max_retries:
+                raise error
+            delay = retry_after if retry_after is not None else self._backoff(attempt)
+            logger.warning(
+                f"Whisper AI request failed ({error}), retry {attempt}/{self.max_retries} in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    @staticmethod
+    def _parse_retry_after(response: httpx.Response) -> float | None:
+        try:
+            return float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            return None
+
+    async def _wait_for_rate_limit(self) -> None:
+        """Выдает слоты на запросы не чаще rate_limit_per_second, остальные ждут в очереди."""
+        if self.rate_limit_per_second <= 0:
+            return
+        async with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + 1 / self.rate_limit_per_second
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _check_circuit(self) -> None:
+        if self._circuit_open_until > time.monotonic():
+            raise WhisperAIUnavailableExceptions()
+
+    def _record_success(self) -> None:
+        self._consecutive_failures = 0
+        self._circuit_open_until = 0.0
+
+    def _record_failure(self) -> None:
+        self._consecutive_failures += 1
+        if self._consecutive_failures >= self.circuit_failure_threshold:
+            # После паузы пропускаем пробный запрос (half-open): одна неудача снова откроет цепь
+            self._consecutive_failures = self.circuit_failure_threshold - 1
+            self._circuit_open_until = time.monotonic() + self.circuit_reset_seconds
+            logger.error(
+                f"Whisper AI circuit opened for {self.circuit_reset_seconds}s"
+            )
+
@@ -8,14 +8,18 @@ from fastapi import Depends, HTTPException, status, Request
 from firebase_admin import App as FirebaseApp
 from firebase_admin import credentials
 from openai import OpenAI
+from redis.asyncio import Redis
 from sqlalchemy import NullPool
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
+from src.client.local_whisper_client import LocalWhisperClient
 from src.client.mail_client import MailClient
 from src.client.openai_client import OpenAIClient
 from src.client.s3_client import S3Client
 from src.client.whisper_ai_client import WhisperAIClient
+from src.models.enums import TranscriptionBackendType
 from src.repository.chat_repository import ChatRepository
+from src.repository.payment.payment_webhook_repository import PaymentWebhookRepository
 from src.repository.payment.user_payment_repository import UserPaymentRepository
 from src.repository.products_repository import ProductsRepository
 from src.repository.user_file_repository import UserFileRepository
@@ -23,13 +27,28 @@ from src.repository.user_products_repository import UserProductsRepository
 from src.repository.user_repository import UserRepository
 from src.service.audio_convert_service import AudioConvertService
 from src.service.auth import AuthService
+from src.service.chat_answer_cache_service import ChatAnswerCacheService
 from src.service.chat_service import ChatService
 from src.service.file_service import FileService
+from src.service.hls_service import HlsService
+from src.service.object_metadata_cache import ObjectMetadataCache
+from src.service.payment.payment_webhook_service import PaymentWebhookService
 from src.service.payment.user_payment import UserPaymentService
+from src.service.product_catalog_cache import ProductCatalogCache
+from src.service.rate_limiter import RateLimiter
+from src.service.user_plan_cache import UserPlanCache
 from src.service.products_service import ProductsService
+from src.service.transcript_index_service import TranscriptIndexService
+from src.service.transcript_render_service import TranscriptRenderService
+from src.service.transcription_backend import (
+    TranscriptionBackend,
+    RemoteTranscriptionBackend,
+    LocalTranscriptionBackend,
+)
 from src.service.user_file_service import UserFileService
 from src.service.user_products_service import UserProductsService
 from src.service.user_service import UserService
+from src.service.waveform_service import WaveformService
 from src.settings import settings
 
 db_url = os.environ.get(
@@ -53,6 +72,38 @@ null_pool_db_engine = create_async_engine(
 null_pool_async_session = async_sessionmaker(null_pool_db_engine, expire_on_commit=False)
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
+redis_client = Redis.from_url(settings.REDIS_URL)
+
+
+def create_whisper_ai_client() -> WhisperAIClient:
+    return WhisperAIClient(
+        base_url=settings.WISPER_AI_BASE_URL,
+        auth_token=settings.WISPER_AI_AUTH_TOKEN,
+        max_concurrency=settings.WISPER_AI_MAX_CONCURRENCY,
+        max_concurrency_per_user=settings.WISPER_AI_MAX_CONCURRENCY_PER_USER,
+        rate_limit_per_second=settings.WISPER_AI_RATE_LIMIT_PER_SECOND,
+        connect_timeout=settings.WISPER_AI_CONNECT_TIMEOUT,
+        read_timeout=settings.WISPER_AI_READ_TIMEOUT,
+        max_retries=settings.WISPER_AI_MAX_RETRIES,
+        circuit_failure_threshold=settings.WISPER_AI_CIRCUIT_FAILURE_THRESHOLD,
+        circuit_reset_seconds=settings.WISPER_AI_CIRCUIT_RESET_SECONDS,
+        proxy=settings.PROXY_URL,
+    )
+
+
+def create_local_whisper_client() -> LocalWhisperClient:
+    return LocalWhisperClient(
+        model_size=settings.LOCAL_WHISPER_MODEL_SIZE,
+        compute_type=settings.LOCAL_WHISPER_COMPUTE_TYPE,
+        cpu_threads=settings.LOCAL_WHISPER_CPU_THREADS,
+        beam_size=settings.LOCAL_WHISPER_BEAM_SIZE,
+        download_root=settings.LOCAL_WHISPER_MODELS_DIR,
+    )
+
+
+# Один клиент на процесс: общий пул соединений и лимиты на все запросы
+whisper_ai_client = create_whisper_ai_client()
+
 
 async def get_session() -> AsyncGenerator[AsyncSession]:
     async with async_session() as session:
@@ -72,10 +123,23 @@ async def get_s3_client() -> S3Client:
     )
 
 
+async def get_object_metadata_cache(
+    s3_client: Annotated[S3Client, Depends(get_s3_client)],
+) -> ObjectMetadataCache:
+    return ObjectMetadataCache(
+        redis=redis_client,
+        s3_client=s3_client,
+        ttl_seconds=settings.OBJECT_METADATA_CACHE_TTL_SECONDS,
+        local_ttl_seconds=settings.OBJECT_METADATA_LOCAL_TTL_SECONDS,
+        local_size=settings.OBJECT_METADATA_LOCAL_CACHE_SIZE,
+    )
+
+
 async def get_file_service(
     s3_client: Annotated[S3Client, Depends(get_s3_client)],
+    metadata_cache: Annotated[ObjectMetadataCache, Depends(get_object_metadata_cache)],
 ) -> FileService:
-    return FileService(s3_client=s3_client)
+    return FileService(s3_client=s3_client, metadata_cache=metadata_cache)
 
 
 async def get_user_file_repository(db: DB) -> UserFileRepository:
@@ -91,19 +155,26 @@ async def get_user_file_service(
 
 
 async def get_audio_ai_client() -> WhisperAIClient:
-    return WhisperAIClient(
-        base_url=settings.WISPER_AI_BASE_URL,
-        auth_token=settings.WISPER_AI_AUTH_TOKEN,
-    )
+    return whisper_ai_client
 
 
-async def get_audio_convert_service(
+async def get_transcription_backend(
     audio_ai_client: Annotated[WhisperAIClient, Depends(get_audio_ai_client)],
-    user_file_service: Annotated[UserFileService, Depends(get_user_file_service)]
+) -> TranscriptionBackend:
+    if settings.TRANSCRIPTION_BACKEND == TranscriptionBackendType.LOCAL.value:
+        return LocalTranscriptionBackend(whisper_client=create_local_whisper_client())
+    return RemoteTranscriptionBackend(audio_ai_client=audio_ai_client)
+
+
+async def get_audio_convert_service(
+    transcription_backend: Annotated[TranscriptionBackend, Depends(get_transcription_backend)],
+    user_file_service: Annotated[UserFileService, Depends(get_user_file_service)],
+    file_service: Annotated[FileService, Depends(get_file_service)],
 ) -> AudioConvertService:
     return AudioConvertService(
-        audio_ai_client=audio_ai_client,
-        user_file_service=user_file_service
+        transcription_backend=transcription_backend,
+        user_file_service=user_file_service,
+        file_service=file_service,
     )
 
 
@@ -135,12 +206,27 @@ async def get_products_repository(db: DB) -> ProductsRepository:
     return ProductsRepository(db=db)
 
 
+def get_product_catalog_cache() -> ProductCatalogCache:
+    return ProductCatalogCache(
+        redis=redis_client,
+        ttl_seconds=settings.PRODUCT_CATALOG_CACHE_TTL_SECONDS,
+        local_ttl_seconds=settings.PRODUCT_CATALOG_LOCAL_TTL_SECONDS,
+    )
+
+
 async def get_products_service(
     products_repository: Annotated[
         ProductsRepository, Depends(get_products_repository)
     ],
 ) -> ProductsService:
-    return ProductsService(products_repository=products_repository)
+    return ProductsService(
+        products_repository=products_repository,
+        catalog_cache=get_product_catalog_cache(),
+    )
+
+
+async def get_payment_webhook_repository(db: DB) -> PaymentWebhookRepository:
+    return PaymentWebhookRepository(db=db)
 
 
 async def get_user_payment_repository(db: DB) -> UserPaymentRepository:
@@ -163,12 +249,24 @@ async def get_user_service(
     )
 
 
+def get_user_plan_cache() -> UserPlanCache:
+    return UserPlanCache(
+        redis=redis_client,
+        ttl_seconds=settings.USER_PLAN_CACHE_TTL_SECONDS,
+        local_ttl_seconds=settings.USER_PLAN_LOCAL_TTL_SECONDS,
+        local_size=settings.USER_PLAN_LOCAL_CACHE_SIZE,
+    )
+
+
 async def get_user_products_service(
     user_products_repository: Annotated[
         UserProductsRepository, Depends(get_user_products_repository)
     ],
 ) -> UserProductsService:
-    return UserProductsService(user_products_repository=user_products_repository)
+    return UserProductsService(
+        user_products_repository=user_products_repository,
+        plan_cache=get_user_plan_cache(),
+    )
 
 
 async def get_user_payment_service(
@@ -187,6 +285,26 @@ async def get_user_payment_service(
     )
 
 
+async def get_payment_webhook_service(
+    payment_webhook_repository: Annotated[
+        PaymentWebhookRepository, Depends(get_payment_webhook_repository)
+    ],
+    user_payment_repository: Annotated[
+        UserPaymentRepository, Depends(get_user_payment_repository)
+    ],
+    user_products_service: Annotated[
+        UserProductsService, Depends(get_user_products_service)
+    ],
+    products_repository: Annotated[ProductsRepository, Depends(get_products_repository)],
+) -> PaymentWebhookService:
+    return PaymentWebhookService(
+        payment_webhook_repository=payment_webhook_repository,
+        user_payment_repository=user_payment_repository,
+        user_products_service=user_products_service,
+        products_repository=products_repository,
+    )
+
+
 async def get_current_user_id(
     request: Request, auth_service: Annotated[AuthService, Depends(get_auth_service)]
 ) -> int:
@@ -256,17 +374,101 @@ async def get_openai_client() -> OpenAIClient:
     )
 
 
+async def get_redis_client() -> Redis:
+    return redis_client
+
+
+async def get_chat_answer_cache_service(
+    redis: Annotated[Redis, Depends(get_redis_client)],
+) -> ChatAnswerCacheService:
+    return ChatAnswerCacheService(
+        redis=redis, ttl_seconds=settings.CHAT_ANSWER_CACHE_TTL_SECONDS
+    )
+
+
+async def get_transcript_render_service(
+    redis: Annotated[Redis, Depends(get_redis_client)],
+    file_service: Annotated[FileService, Depends(get_file_service)],
+) -> TranscriptRenderService:
+    return TranscriptRenderService(
+        redis=redis,
+        file_service=file_service,
+        ttl_seconds=settings.TRANSCRIPT_RENDER_CACHE_TTL_SECONDS,
+    )
+
+
+async def get_transcript_index_service(
+    user_file_service: Annotated[UserFileService, Depends(get_user_file_service)],
+) -> TranscriptIndexService:
+    return TranscriptIndexService(user_file_service=user_file_service)
+
+
+async def get_waveform_service(
+    file_service: Annotated[FileService, Depends(get_file_service)],
+    user_file_service: Annotated[UserFileService, Depends(get_user_file_service)],
+) -> WaveformService:
+    return WaveformService(file_service=file_service, user_file_service=user_file_service)
+
+
+async def get_hls_service(
+    file_service: Annotated[FileService, Depends(get_file_service)],
+    user_file_service: Annotated[UserFileService, Depends(get_user_file_service)],
+) -> HlsService:
+    return HlsService(file_service=file_service, user_file_service=user_file_service)
+
+
 async def get_chat_service(
     chat_repository: Annotated[ChatRepository, Depends(get_chat_repository)],
     openai_client: Annotated[OpenAIClient, Depends(get_openai_client)],
-    user_products_repository: Annotated[
-        UserProductsRepository, Depends(get_user_products_repository)
+    answer_cache: Annotated[
+        ChatAnswerCacheService, Depends(get_chat_answer_cache_service)
     ],
-    product_repository: Annotated[ProductsRepository, Depends(get_products_repository)],
 ) -> ChatService:
     return ChatService(
         chat_repository=chat_repository,
         openai_client=openai_client,
-        user_products_repository=user_products_repository,
-        product_repository=product_repository,
+        answer_cache=answer_cache,
+    )
+
+
+def get_rate_limiter() -> RateLimiter:
+    return RateLimiter(
+        redis=redis_client,
+        limits=settings.RATE_LIMITS,
+        queues=settings.RATE_LIMIT_QUEUES,
+        max_queue_depth=settings.RATE_LIMIT_MAX_QUEUE_DEPTH,
+        shed_retry_seconds=settings.RATE_LIMIT_SHED_RETRY_SECONDS,
     )
+
+
+def rate_limit(group: str):
+    """
+    Зависимость маршрута: лимит группы RATE_LIMITS на пользователя по его тарифу
+    и защита очереди Celery группы. Подключается через dependencies=[Depends(rate_limit(...))]
+    """
+
+    async def check_rate_limit(
+        current_user_id: Annotated[int, Depends(get_current_user_id)],
+        user_products_service: Annotated[
+            UserProductsService, Depends(get_user_products_service)
+        ],
+        rate_limiter: Annotated[RateLimiter, Depends(get_rate_limiter)],
+    ) -> None:
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        tier = await user_products_service.get_plan_tier(current_user_id)
+        result = await rate_limiter.acquire(group, current_user_id, tier)
+        if result.shed:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Service is busy, try again later",
+                headers={"Retry-After": str(result.retry_after)},
+            )
+        if not result.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(result.retry_after)},
+            )
+
+    return check_rate_limit
@@ -4,3 +4,17 @@ class CodeExpiredExceptions(Exception):
 
 class CodeNotFoundExceptions(Exception):
     detail = "Code not found"
+
+
+class WhisperAIUnavailableExceptions(Exception):
+    detail = "Transcription provider is temporarily unavailable"
+
+
+class WhisperAIRequestUnconfirmedExceptions(Exception):
+    """Запрос мог дойти до провайдера, но ответ не получен: повторная отправка может создать дубль задачи"""
+
+    detail = "Transcription request was sent but not confirmed by the provider"
+
+
+class TranscriptVersionConflictExceptions(Exception):
+    detail = "Transcription was changed by another request"
@@ -1,8 +1,31 @@
+from redis.asyncio import Redis
+
 from src.client.s3_client import S3Client
+from src.client.whisper_ai_client import WhisperAIClient
+from src.models.enums import TranscriptionBackendType
+from src.repository.chat_repository import ChatRepository
+from src.repository.payment.payment_webhook_repository import PaymentWebhookRepository
+from src.repository.payment.user_payment_repository import UserPaymentRepository
+from src.repository.products_repository import ProductsRepository
 from src.repository.user_file_repository import UserFileRepository
+from src.repository.user_products_repository import UserProductsRepository
+from src.service.audio_convert_service import AudioConvertService
+from src.service.chat_answer_cache_service import ChatAnswerCacheService
+from src.service.chat_service import ChatService
+from src.service.file_insights_service import FileInsightsService
 from src.service.file_service import FileService
+from src.service.hls_service import HlsService
+from src.service.object_metadata_cache import ObjectMetadataCache
+from src.service.payment.payment_webhook_service import PaymentWebhookService
+from src.service.product_catalog_cache import ProductCatalogCache
+from src.service.transcription_backend import RemoteTranscriptionBackend, LocalTranscriptionBackend
 from src.service.user_file_service import UserFileService
-from src.dependency import null_pool_async_session
+from src.service.user_plan_cache import UserPlanCache
+from src.service.user_products_service import UserProductsService
+from src.service.waveform_service import WaveformService
+from src.dependency import null_pool_async_session, get_openai_client, create_whisper_ai_client, \
+    create_local_whisper_client
+from src.settings import settings
 
 
 class UserFileServiceFacade:
@@ -13,16 +36,144 @@ class UserFileServiceFacade:
         )
 
 
+class UserPlanCacheFacade:
+    @staticmethod
+    def get_user_plan_cache() -> UserPlanCache:
+        return UserPlanCache(
+            redis=Redis.from_url(settings.REDIS_URL),
+            ttl_seconds=settings.USER_PLAN_CACHE_TTL_SECONDS,
+            local_ttl_seconds=settings.USER_PLAN_LOCAL_TTL_SECONDS,
+            local_size=settings.USER_PLAN_LOCAL_CACHE_SIZE,
+        )
+
+
+class UserProductsServiceFacade:
+    @staticmethod
+    async def get_user_products_service() -> UserProductsService:
+        return UserProductsService(
+            user_products_repository=UserProductsRepository(db=null_pool_async_session()),
+            plan_cache=UserPlanCacheFacade.get_user_plan_cache(),
+        )
+
+
+class PaymentWebhookServiceFacade:
+    @staticmethod
+    async def get_payment_webhook_service() -> PaymentWebhookService:
+        # Зачисление идет одной транзакцией, поэтому у всех репозиториев общая сессия
+        db = null_pool_async_session()
+        return PaymentWebhookService(
+            payment_webhook_repository=PaymentWebhookRepository(db=db),
+            user_payment_repository=UserPaymentRepository(db=db),
+            user_products_service=UserProductsService(
+                user_products_repository=UserProductsRepository(db=db),
+                plan_cache=UserPlanCacheFacade.get_user_plan_cache(),
+            ),
+            products_repository=ProductsRepository(db=db),
+        )
+
+
+class ProductCatalogCacheFacade:
+    @staticmethod
+    async def get_product_catalog_cache() -> ProductCatalogCache:
+        return ProductCatalogCache(
+            redis=Redis.from_url(settings.REDIS_URL),
+            ttl_seconds=settings.PRODUCT_CATALOG_CACHE_TTL_SECONDS,
+            local_ttl_seconds=settings.PRODUCT_CATALOG_LOCAL_TTL_SECONDS,
+        )
+
+
 class FileServiceFacade:
 
     @staticmethod
     async def get_file_service() -> FileService:
+        s3_client = S3Client(
+            bucket_name="public-file",
+            access_key="minioadmin",
+            secret_key="minioadmin",
+            service_url="http://app:8000",
+            s3_url="minio:9000",
+        )
         return FileService(
-            s3_client=S3Client(
-                bucket_name="public-file",
-                access_key="minioadmin",
-                secret_key="minioadmin",
-                service_url="http://app:8000",
-                s3_url="minio:9000",
+            s3_client=s3_client,
+            # Воркеры перезаписывают обработанные файлы, поэтому тоже сбрасывают кэш метаданных.
+            # Новый клиент на каждый вызов: задача закрывает его в finally
+            metadata_cache=ObjectMetadataCache(
+                redis=Redis.from_url(settings.REDIS_URL),
+                s3_client=s3_client,
+                ttl_seconds=settings.OBJECT_METADATA_CACHE_TTL_SECONDS,
+                local_ttl_seconds=settings.OBJECT_METADATA_LOCAL_TTL_SECONDS,
+                local_size=settings.OBJECT_METADATA_LOCAL_CACHE_SIZE,
+            ),
+        )
+
+
+class WaveformServiceFacade:
+
+    @staticmethod
+    async def get_waveform_service() -> WaveformService:
+        return WaveformService(
+            file_service=await FileServiceFacade.get_file_service(),
+            user_file_service=await UserFileServiceFacade.get_user_file_service(),
+        )
+
+
+class HlsServiceFacade:
+
+    @staticmethod
+    async def get_hls_service() -> HlsService:
+        return HlsService(
+            file_service=await FileServiceFacade.get_file_service(),
+            user_file_service=await UserFileServiceFacade.get_user_file_service(),
+        )
+
+
+class ChatServiceFacade:
+
+    @staticmethod
+    async def get_chat_service() -> ChatService:
+        return ChatService(
+            chat_repository=ChatRepository(db=null_pool_async_session()),
+            openai_client=await get_openai_client(),
+            # Новый клиент на каждый вызов: задачи Celery запускают свой event loop и закрывают его в finally
+            answer_cache=ChatAnswerCacheService(
+                redis=Redis.from_url(settings.REDIS_URL),
+                ttl_seconds=settings.CHAT_ANSWER_CACHE_TTL_SECONDS,
+            ),
+        )
+
+
+class FileInsightsServiceFacade:
+
+    @staticmethod
+    async def get_file_insights_service() -> FileInsightsService:
+        return FileInsightsService(
+            openai_client=await get_openai_client(),
+            user_file_service=await UserFileServiceFacade.get_user_file_service(),
+        )
+
+
+class AudioConvertServiceFacade:
+
+    @staticmethod
+    async def get_audio_convert_service(
+        backend_type: TranscriptionBackendType | None = None,
+        audio_ai_client: WhisperAIClient | None = None,
+    ) -> AudioConvertService:
+        """
+        audio_ai_client — клиент процесса воркера (src.celery.worker_loop): лимиты и circuit breaker
+        должны действовать на все отправки, а не только на куски одного файла
+        """
+        backend_type = backend_type or TranscriptionBackendType(settings.TRANSCRIPTION_BACKEND)
+        if backend_type == TranscriptionBackendType.LOCAL:
+            transcription_backend = LocalTranscriptionBackend(
+                whisper_client=create_local_whisper_client()
+            )
+        else:
+            transcription_backend = RemoteTranscriptionBackend(
+                audio_ai_client=audio_ai_client or create_whisper_ai_client()
             )
+        return AudioConvertService(
+            transcription_backend=transcription_backend,
+            user_file_service=await UserFileServiceFacade.get_user_file_service(),
+            file_service=await FileServiceFacade.get_file_service(),
         )
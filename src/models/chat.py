@@ -1,7 +1,8 @@
 from datetime import datetime
 from enum import Enum
+from typing import Optional
 
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import ForeignKey, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.models.base import Base
@@ -21,6 +22,17 @@ class ChatSession(Base):
     )
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    user_message_count: Mapped[int] = mapped_column(
+        default=0,
+        server_default="0",
+        comment="Количество сообщений пользователя в сессии",
+    )
+    summary: Mapped[Optional[str]] = mapped_column(
+        comment="Сжатое содержание ранней части переписки", nullable=True
+    )
+    summarized_until_message_id: Mapped[Optional[int]] = mapped_column(
+        comment="ID последнего сообщения, вошедшего в summary", nullable=True
+    )
 
     # Relationship to UserFile (back-reference)
     user_file = relationship(
@@ -38,6 +50,9 @@ class ChatSession(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index("ix_chat_messages_session_id_id", "session_id", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     session_id: Mapped[int] = mapped_column(
@@ -40,3 +40,43 @@ class FileImproveAudioStatus(Enum):
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+
+
+class FileInsightsStatus(Enum):
+    NOT_STARTED = "not started"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class TranscriptionBackendType(Enum):
+    REMOTE = "remote"
+    LOCAL = "local"
+
+
+class TranscriptFormat(Enum):
+    TEXT = "text"
+    SRT = "srt"
+    VTT = "vtt"
+
+
+class AudioSource(Enum):
+    """Исходный файл и производные от него аудио"""
+    ORIGINAL = "original"
+    NOISE_REMOVED = "noise_removed"
+    VOCALS_REMOVED = "vocals_removed"
+    MELODY_REMOVED = "melody_removed"
+    ENHANCED = "enhanced"
+
+
+class UsageEventType(Enum):
+    """Тарифицируемые события в журнале списаний"""
+    UPLOAD = "upload"
+    SEPARATION = "separation"
+    ENHANCE = "enhance"
+
+
+class PaymentWebhookStatus(Enum):
+    RECEIVED = "received"
+    PROCESSED = "processed"
+    FAILED = "failed"
@@ -2,17 +2,20 @@ from datetime import datetime
 from typing import Optional
 from uuid import UUID
 
-from sqlalchemy import ForeignKey, func
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Computed, ForeignKey, Index, LargeBinary, UniqueConstraint, func, text
+from sqlalchemy.dialects.postgresql import JSONB, REGCONFIG, TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.models.base import Base
 from src.models.enums import FileRemoveNoiseStatus, FileRemoveVocalStatus, FileRemoveMelodyStatus, \
-    FileImproveAudioStatus, FileTranscriptionStatus
+    FileImproveAudioStatus, FileTranscriptionStatus, FileInsightsStatus
 
 
 class UserFile(Base):
     __tablename__ = "user_files"
+    __table_args__ = (
+        Index("ix_user_files_transcription_tsv", "transcription_tsv", postgresql_using="gin"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
@@ -28,16 +31,88 @@ class UserFile(Base):
     transcription: Mapped[Optional[dict]] = mapped_column(
         JSONB(none_as_null=True), nullable=True
     )
+    transcription_compact: Mapped[Optional[bytes]] = mapped_column(
+        LargeBinary,
+        comment="Транскрипция в компактном виде (FileService.encode_transcript), заменяет JSONB",
+        nullable=True,
+    )
+    # Загружается только запросами seek/find, а не вместе с файлом
+    transcription_index: Mapped[Optional[bytes]] = mapped_column(
+        LargeBinary,
+        comment="Индекс для поиска по времени и фразам (TranscriptIndexBuilder)",
+        nullable=True,
+        deferred=True,
+    )
+    # Правки сегментов поверх сохраненной транскрипции: запись правки не переписывает весь blob
+    transcription_edits: Mapped[Optional[list]] = mapped_column(
+        JSONB(none_as_null=True),
+        comment="Неприменённые правки сегментов: [{index, start?, end?, text?}]",
+        nullable=True,
+    )
+    transcription_version: Mapped[int] = mapped_column(
+        comment="Версия транскрипции, растет при каждом изменении",
+        default=1,
+        server_default="1",
+    )
+    transcription_requested_at: Mapped[Optional[datetime]] = mapped_column(
+        comment="Когда пользователь запросил расшифровку", nullable=True
+    )
+    transcription_submitted_at: Mapped[Optional[datetime]] = mapped_column(
+        comment="Когда файл последний раз отправлен провайдеру", nullable=True
+    )
+    transcription_attempts: Mapped[int] = mapped_column(
+        comment="Сколько раз файл отправлялся провайдеру",
+        default=0,
+        server_default="0",
+    )
+    original_audio_deleted_at: Mapped[Optional[datetime]] = mapped_column(
+        comment="Когда исходное аудио удалено из MinIO после транскрипции и производных", nullable=True
+    )
+    prepared_audio_url: Mapped[Optional[str]] = mapped_column(
+        comment="Аудио без длинных пауз (Opus), отправляемое на расшифровку", nullable=True
+    )
+    transcription_offset_map: Mapped[Optional[list]] = mapped_column(
+        JSONB(none_as_null=True),
+        comment="Карта смещений обрезанного аудио: [[начало в обрезанном, начало в исходном]]",
+        nullable=True,
+    )
+    transcription_progress: Mapped[Optional[float]] = mapped_column(
+        comment="Доля готовых кусков при расшифровке по частям (0..1)", nullable=True
+    )
     # Transcription formatted outputs
     transcription_text: Mapped[Optional[str]] = mapped_column(
         comment="Транскрипция в формате plain text", nullable=True
     )
+    transcription_search_config: Mapped[str] = mapped_column(
+        REGCONFIG,
+        comment="Конфигурация полнотекстового поиска по языку транскрипции",
+        default="simple",
+        server_default=text("'simple'"),
+    )
+    # Не загружается вместе с файлом: нужен только в условиях поиска
+    transcription_tsv: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR,
+        Computed("to_tsvector(transcription_search_config, coalesce(transcription_text, ''))", persisted=True),
+        deferred=True,
+    )
     transcription_vtt: Mapped[Optional[str]] = mapped_column(
         comment="Транскрипция в формате VTT", nullable=True
     )
     transcription_srt: Mapped[Optional[str]] = mapped_column(
         comment="Транскрипция в формате SRT", nullable=True
     )
+    summary: Mapped[Optional[str]] = mapped_column(
+        comment="Краткое содержание транскрипции", nullable=True
+    )
+    chapters: Mapped[Optional[list]] = mapped_column(
+        JSONB(none_as_null=True),
+        comment="Главы с таймкодами: [{start, end, title}]",
+        nullable=True,
+    )
+    insights_status: Mapped[Optional[str]] = mapped_column(
+        comment="Статус генерации summary и глав",
+        default=FileInsightsStatus.NOT_STARTED.value,
+    )
     duration: Mapped[Optional[float]] = mapped_column(
         comment="Длительность файла в секундах"
     )
@@ -71,6 +146,49 @@ class UserFile(Base):
     improved_audio_file_status: Mapped[Optional[str]] = mapped_column(
         comment="Статус улучшения аудио", default=FileImproveAudioStatus.NOT_STARTED.value
     )
+    waveform_peaks: Mapped[Optional[dict]] = mapped_column(
+        JSONB(none_as_null=True),
+        comment="Готовые пики волны по источникам (AudioSource): {source: {audio_url, bits, levels}}"
+        " или {source: {audio_url, failed}}, если посчитать не удалось",
+        nullable=True,
+    )
+    hls_packages: Mapped[Optional[dict]] = mapped_column(
+        JSONB(none_as_null=True),
+        comment="HLS-нарезка по источникам (AudioSource): {source: {audio_url, package_id, renditions}}"
+        " или {source: {audio_url, failed}}, если нарезать не удалось",
+        nullable=True,
+    )
 
     # Relationship with ChatSession
     chat_sessions = relationship("ChatSession", back_populates="user_file")
+
+
+class TranscriptionChunk(Base):
+    """Кусок длинной записи, который расшифровывается отдельно от остальных"""
+
+    __tablename__ = "transcription_chunks"
+    __table_args__ = (UniqueConstraint("user_file_id", "index"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_file_id: Mapped[int] = mapped_column(
+        ForeignKey("user_files.id", ondelete="CASCADE"), index=True
+    )
+    index: Mapped[int] = mapped_column(comment="Порядковый номер куска")
+    audio_url: Mapped[str] = mapped_column(comment="Ключ аудио куска в S3")
+    offset_map: Mapped[list] = mapped_column(
+        JSONB(none_as_null=True),
+        comment="Карта смещений куска: [[начало в куске, начало в исходном файле]]",
+    )
+    duration: Mapped[float] = mapped_column(comment="Длительность куска в секундах")
+    status: Mapped[str] = mapped_column(default=FileTranscriptionStatus.PROCESSING.value)
+    attempts: Mapped[int] = mapped_column(
+        comment="Неудачных попыток расшифровки куска",
+        default=0,
+        server_default="0",
+    )
+    result: Mapped[Optional[dict]] = mapped_column(
+        JSONB(none_as_null=True),
+        comment="verbose_json куска с таймкодами исходного файла",
+        nullable=True,
+    )
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
@@ -1,12 +1,14 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Any, Optional
 from uuid import UUID
 
 import uuid
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import BigInteger, ForeignKey, UniqueConstraint, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
 from src.models.base import Base
+from src.models.enums import PaymentWebhookStatus
 
 
 class Products(Base):
@@ -81,6 +83,29 @@ class Transactions(Base):
     user_product_id: Mapped[UUID] = mapped_column(ForeignKey("user_products.uuid"))
 
 
+class PaymentWebhookInbox(Base):
+    """
+    Входящие уведомления платежной системы. Повтор того же уведомления не создает
+    новую запись (уникальный external_id), зачисление делает воркер
+    """
+
+    __tablename__ = "payment_webhook_inbox"
+    __table_args__ = (UniqueConstraint("provider", "external_id"),)
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    provider: Mapped[str] = mapped_column(comment="Платежная система, например cloudpayments")
+    external_id: Mapped[str] = mapped_column(comment="ID транзакции в платежной системе")
+    payload: Mapped[dict] = mapped_column(JSONB, comment="Тело уведомления")
+    status: Mapped[str] = mapped_column(default=PaymentWebhookStatus.RECEIVED.value)
+    attempts: Mapped[int] = mapped_column(default=0, comment="Неудачных попыток зачисления")
+    error: Mapped[Optional[str]] = mapped_column(comment="Ошибка последней попытки")
+    last_attempt_at: Mapped[Optional[datetime]] = mapped_column(
+        comment="Время последней неудачной попытки: до повтора Celery запись не переставляется сверкой"
+    )
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    processed_at: Mapped[Optional[datetime]]
+
+
 class UserProducts(Base):
     __tablename__ = "user_products"
 
@@ -117,3 +142,41 @@ class UserProductsToProductsM2M(Base):
     created_at: Mapped[datetime] = mapped_column(server_default=func.now())
     amount: Mapped[float]
     user_product: Mapped[UUID] = mapped_column(ForeignKey("user_products.uuid"))
+
+
+class UsageLedger(Base):
+    """Журнал списаний минут: одна запись на тарифицируемое событие, записи не изменяются"""
+
+    __tablename__ = "usage_ledger"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    user_product_id: Mapped[Optional[UUID]] = mapped_column(
+        ForeignKey("user_products.uuid"),
+        comment="Продукт, с которого списаны минуты; пусто для бесплатных событий без продукта",
+    )
+    user_file_id: Mapped[Optional[int]] = mapped_column(
+        comment="Файл события, без внешнего ключа: история списаний переживает удаление файла"
+    )
+    event_type: Mapped[str] = mapped_column(comment="Тип события (UsageEventType)")
+    seconds: Mapped[float] = mapped_column(comment="Длительность обработанного аудио")
+    minutes: Mapped[float] = mapped_column(comment="Списано минут")
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now(), index=True)
+
+
+class UsageDailyRollup(Base):
+    """Суммы журнала списаний по дням, пересчитываются периодической задачей"""
+
+    __tablename__ = "usage_daily_rollups"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    user_product_id: Mapped[UUID] = mapped_column(
+        primary_key=True,
+        comment="Продукт списания; нулевой UUID для событий без продукта",
+    )
+    day: Mapped[date] = mapped_column(primary_key=True)
+    event_type: Mapped[str] = mapped_column(primary_key=True)
+    events: Mapped[int] = mapped_column(comment="Количество событий")
+    seconds: Mapped[float] = mapped_column(comment="Длительность обработанного аудио")
+    minutes: Mapped[float] = mapped_column(comment="Списано минут")
+    updated_at: Mapped[datetime] = mapped_column(server_default=func.now())
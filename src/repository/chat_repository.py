@@ -1,117 +1,285 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
-from sqlalchemy import select, func
+from sqlalchemy import select, insert, update, func, true, literal_column, case, null
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
 from src.models.chat import ChatMessage, ChatSession, ChatSenderType
 from src.models.file import UserFile
+from src.models.products import Products, UserProducts
+
+
+@dataclass
+class ChatContext:
+    """Данные для обработки сообщения в чате, полученные одним запросом."""
+
+    file_id: int
+    user_id: int
+    transcription: dict | None
+    transcription_text: str | None
+    transcription_compact: bytes | None
+    file_summary: str | None
+    chapters: list[dict] | None
+    session_id: int | None
+    user_message_count: int
+    has_subscription: bool
+    gpt_request_limit_one_file: int | None
+    summary: str | None = None
+    messages: list[dict] = field(default_factory=list)
 
 
 @dataclass
 class ChatRepository:
     db: AsyncSession
 
-    async def create_chat_session(self, user_file_id: int) -> ChatSession:
+    async def create_chat_session(self, user_file_id: int, user_id: int) -> ChatSession:
         """Create a new chat session for a user file."""
-        # Сначала получаем user_file, чтобы узнать user_id
-        user_file = await self.get_user_file(user_file_id)
-        if not user_file:
-            raise ValueError(f"User file with ID {user_file_id} not found")
-
-        # Создаем новую сессию с правильным user_file_id и user_id
-        session = ChatSession(user_file_id=user_file_id, user_id=user_file.user_id)
+        session = ChatSession(user_file_id=user_file_id, user_id=user_id)
         self.db.add(session)
         await self.db.commit()
         await self.db.refresh(session)
         return session
 
-    async def get_chat_session(self, user_file_id: int) -> ChatSession | None:
+    async def get_chat_session(
+        self, user_file_id: int, user_id: int
+    ) -> ChatSession | None:
         """Get a chat session by user file ID or return None if it doesn't exist."""
-        # Сначала получаем user_file, чтобы узнать user_id
-        user_file = await self.get_user_file(user_file_id)
-        if not user_file:
-            return None
-
         result = await self.db.execute(
             select(ChatSession)
             .where(
                 (ChatSession.user_file_id == user_file_id)
-                & (ChatSession.user_id == user_file.user_id)
+                & (ChatSession.user_id == user_id)
             )
-            .options(selectinload(ChatSession.messages))
             .order_by(ChatSession.created_at.desc())
+            .limit(1)
         )
         return result.scalar_one_or_none()
 
-    async def get_user_message_count(self, user_file_id: int) -> tuple[int, int | None]:
+    async def get_chat_context(
+        self, user_file_id: int, messages_limit: int
+    ) -> ChatContext | None:
         """
-        Подсчитывает количество сообщений пользователя для указанного файла
-        и возвращает ID сессии, если она существует.
+        Одним запросом получает владельца файла, транскрипцию, сессию чата,
+        счетчик сообщений пользователя, лимит GPT активной подписки, summary
+        и последние messages_limit сообщений сессии, еще не вошедших в summary.
 
         Returns:
-            Tuple[int, Optional[int]]: (количество сообщений, id сессии)
-            Если сессия не найдена, возвращается (0, None)
+            ChatContext или None, если файл не найден
         """
-        # Получаем user_file для определения user_id
-        user_file = await self.get_user_file(user_file_id)
-        if not user_file:
-            return 0, None
-
-        # Подзапрос для получения ID сессии
-        session_subquery = (
-            select(ChatSession.id)
+        session = (
+            select(
+                ChatSession.id,
+                ChatSession.user_message_count,
+                ChatSession.summary,
+                ChatSession.summarized_until_message_id,
+            )
             .where(
-                (ChatSession.user_file_id == user_file_id)
-                & (ChatSession.user_id == user_file.user_id)
+                (ChatSession.user_file_id == UserFile.id)
+                & (ChatSession.user_id == UserFile.user_id)
+            )
+            .order_by(ChatSession.created_at.desc())
+            .limit(1)
+            .lateral("session")
+        )
+
+        subscription = (
+            select(UserProducts.is_active, Products.gpt_request_limit_one_file)
+            .join(UserProducts, UserProducts.product_id == Products.uuid)
+            .where(
+                (UserProducts.user_id == UserFile.user_id)
+                & (UserProducts.is_subscription == True)  # noqa: E712
+                & (UserProducts.is_active == True)  # noqa: E712
             )
-            .scalar_subquery()
+            .limit(1)
+            .lateral("subscription")
         )
 
-        # Основной запрос для подсчета сообщений пользователя
-        result = await self.db.execute(
+        # Последние N сообщений берем по индексу (session_id, id) с LIMIT,
+        # а в хронологическом порядке собираем их уже в json_agg
+        last_messages = (
+            select(ChatMessage.id, ChatMessage.sender, ChatMessage.content)
+            .where(
+                (ChatMessage.session_id == session.c.id)
+                & (
+                    ChatMessage.id
+                    > func.coalesce(session.c.summarized_until_message_id, 0)
+                )
+            )
+            .order_by(ChatMessage.id.desc())
+            .limit(messages_limit)
+            .correlate(session)
+            .subquery("last_messages")
+        )
+        recent = (
             select(
-                func.count(ChatMessage.id).label("message_count"),
-                session_subquery.label("session_id"),
+                func.json_agg(
+                    aggregate_order_by(
+                        func.json_build_object(
+                            literal_column("'sender'"),
+                            last_messages.c.sender,
+                            literal_column("'content'"),
+                            last_messages.c.content,
+                        ),
+                        last_messages.c.id,
+                    )
+                ).label("messages")
             )
-            .select_from(ChatMessage)
-            .where(
-                (ChatMessage.session_id == session_subquery)
-                & (ChatMessage.sender == ChatSenderType.USER.value)
+            .lateral("recent")
+        )
+
+        query = (
+            select(
+                UserFile.id,
+                UserFile.user_id,
+                UserFile.transcription_text,
+                UserFile.summary,
+                UserFile.chapters,
+                # JSONB читаем только для старых файлов без готового plain text
+                case(
+                    (UserFile.transcription_text.is_(None), UserFile.transcription),
+                    else_=null(),
+                ).label("transcription"),
+                case(
+                    (UserFile.transcription_text.is_(None), UserFile.transcription_compact),
+                    else_=null(),
+                ).label("transcription_compact"),
+                session.c.id.label("session_id"),
+                session.c.user_message_count,
+                session.c.summary,
+                subscription.c.is_active.label("has_subscription"),
+                subscription.c.gpt_request_limit_one_file,
+                recent.c.messages,
             )
+            .select_from(UserFile)
+            .outerjoin(session, true())
+            .outerjoin(subscription, true())
+            .outerjoin(recent, true())
+            .where(UserFile.id == user_file_id)
+        )
+        row = (await self.db.execute(query)).one_or_none()
+        if row is None:
+            return None
+
+        return ChatContext(
+            file_id=row.id,
+            user_id=row.user_id,
+            transcription=row.transcription,
+            transcription_compact=row.transcription_compact,
+            transcription_text=row.transcription_text,
+            file_summary=row.summary,
+            chapters=row.chapters,
+            session_id=row.session_id,
+            user_message_count=row.user_message_count or 0,
+            has_subscription=bool(row.has_subscription),
+            gpt_request_limit_one_file=row.gpt_request_limit_one_file,
+            summary=row.summary,
+            messages=row.messages or [],
         )
 
-        row = result.one_or_none()
-        if row:
-            return row.message_count, row.session_id
+    async def save_chat_exchange(
+        self,
+        user_file_id: int,
+        user_id: int,
+        session_id: int | None,
+        user_content: str,
+        assistant_content: str,
+    ) -> int:
+        """
+        Сохраняет сообщение пользователя и ответ ассистента одной транзакцией,
+        при необходимости создает сессию и увеличивает счетчик сообщений пользователя.
 
-        # Запрос для получения ID сессии (если сессия существует, но нет сообщений)
-        session_result = await self.db.execute(
-            select(ChatSession.id).where(
-                (ChatSession.user_file_id == user_file_id)
-                & (ChatSession.user_id == user_file.user_id)
+        Returns:
+            ID сессии чата
+        """
+        if session_id is None:
+            session_id = (
+                await self.db.execute(
+                    insert(ChatSession)
+                    .values(
+                        user_file_id=user_file_id,
+                        user_id=user_id,
+                        user_message_count=1,
+                    )
+                    .returning(ChatSession.id)
+                )
+            ).scalar_one()
+        else:
+            await self.db.execute(
+                update(ChatSession)
+                .where(ChatSession.id == session_id)
+                .values(user_message_count=ChatSession.user_message_count + 1)
             )
+
+        await self.db.execute(
+            insert(ChatMessage).values(
+                [
+                    {
+                        "session_id": session_id,
+                        "sender": ChatSenderType.USER.value,
+                        "content": user_content,
+                    },
+                    {
+                        "session_id": session_id,
+                        "sender": ChatSenderType.ASSISTANT.value,
+                        "content": assistant_content,
+                    },
+                ]
+            )
+        )
+        await self.db.commit()
+        return session_id
+
+    async def get_chat_session_by_id(self, session_id: int) -> ChatSession | None:
+        return await self.db.scalar(
+            select(ChatSession).where(ChatSession.id == session_id)
         )
 
-        session_id = session_result.scalar_one_or_none()
-        return 0, session_id
+    async def get_chat_messages_after(
+        self, session_id: int, after_message_id: int | None
+    ) -> list[ChatMessage]:
+        """Get messages of a chat session that are newer than after_message_id."""
+        query = select(ChatMessage).where(ChatMessage.session_id == session_id)
+        if after_message_id is not None:
+            query = query.where(ChatMessage.id > after_message_id)
+        result = await self.db.execute(query.order_by(ChatMessage.id))
+        return result.scalars().all()
+
+    async def update_chat_summary(
+        self,
+        session_id: int,
+        summary: str,
+        summarized_until_message_id: int,
+        previous_until_message_id: int | None,
+    ) -> bool:
+        """
+        Сохраняет новый summary, только если его не успела обновить другая задача.
 
-    async def create_chat_message(
-        self, session_id: int, sender: str, content: str
-    ) -> ChatMessage:
-        """Add a new message to a chat session."""
-        message = ChatMessage(session_id=session_id, sender=sender, content=content)
-        self.db.add(message)
+        Returns:
+            True, если summary обновлен
+        """
+        if previous_until_message_id is None:
+            is_same_version = ChatSession.summarized_until_message_id.is_(None)
+        else:
+            is_same_version = (
+                ChatSession.summarized_until_message_id == previous_until_message_id
+            )
+        result = await self.db.execute(
+            update(ChatSession)
+            .where((ChatSession.id == session_id) & is_same_version)
+            .values(
+                summary=summary,
+                summarized_until_message_id=summarized_until_message_id,
+            )
+        )
         await self.db.commit()
-        await self.db.refresh(message)
-        return message
+        return result.rowcount > 0
 
     async def get_chat_messages(self, session_id: int) -> list[ChatMessage]:
         """Get all messages for a chat session ordered by timestamp."""
         result = await self.db.execute(
             select(ChatMessage)
             .where(ChatMessage.session_id == session_id)
-            .order_by(ChatMessage.timestamp)
+            .order_by(ChatMessage.timestamp, ChatMessage.id)
         )
         return result.scalars().all()
 
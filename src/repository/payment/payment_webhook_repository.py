@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import PaymentWebhookInbox, User
+from src.models.enums import PaymentWebhookStatus
+
+
+@dataclass
+class PaymentWebhookRepository:
+    db: AsyncSession
+
+    async def add(self, provider: str, external_id: str, payload: dict) -> int | None:
+        """
+        Returns:
+            id новой записи или None, если уведомление с этим external_id уже принято
+        """
+        query = (
+            pg_insert(PaymentWebhookInbox)
+            .values(provider=provider, external_id=external_id, payload=payload)
+            .on_conflict_do_nothing(index_elements=["provider", "external_id"])
+            .returning(PaymentWebhookInbox.id)
+        )
+        inbox_id = await self.db.scalar(query)
+        await self.db.commit()
+        return inbox_id
+
+    async def lock_received(self, inbox_id: int) -> PaymentWebhookInbox | None:
+        """
+        Блокирует необработанное уведомление до конца транзакции.
+        Если его уже обрабатывает другой воркер или оно обработано, возвращает None
+        """
+        query = (
+            select(PaymentWebhookInbox)
+            .where(
+                PaymentWebhookInbox.id == inbox_id,
+                PaymentWebhookInbox.status == PaymentWebhookStatus.RECEIVED.value,
+            )
+            .with_for_update(skip_locked=True)
+        )
+        return await self.db.scalar(query)
+
+    async def lock_user(self, user_id: int) -> User | None:
+        """Зачисления одному пользователю идут по очереди: продукт пользователя читается и меняется"""
+        return await self.db.scalar(select(User).where(User.id == user_id).with_for_update())
+
+    async def mark_processed(self, inbox: PaymentWebhookInbox) -> None:
+        """Завершает транзакцию зачисления"""
+        inbox.status = PaymentWebhookStatus.PROCESSED.value
+        inbox.processed_at = func.now()
+        inbox.error = None
+        await self.db.commit()
+
+    async def record_failure(self, inbox_id: int, error: str, final: bool, max_attempts: int) -> bool:
+        """
+        Считает неудачную попытку; после max_attempts попыток или при final уведомление помечается failed
+
+        Returns:
+            True, если уведомление больше не будет обрабатываться
+        """
+        attempts = PaymentWebhookInbox.attempts + 1
+        failed = PaymentWebhookStatus.FAILED.value
+        query = (
+            update(PaymentWebhookInbox)
+            .where(
+                PaymentWebhookInbox.id == inbox_id,
+                PaymentWebhookInbox.status == PaymentWebhookStatus.RECEIVED.value,
+            )
+            .values(
+                attempts=attempts,
+                error=error,
+                last_attempt_at=func.now(),
+                status=failed if final else case((attempts >= max_attempts, failed), else_=PaymentWebhookInbox.status),
+            )
+            .returning(PaymentWebhookInbox.status)
+        )
+        status = await self.db.scalar(query)
+        await self.db.commit()
+        return status != PaymentWebhookStatus.RECEIVED.value
+
+    async def get_stalled_ids(
+        self, older_than_seconds: int, retry_window_seconds: int, max_attempts: int, limit: int
+    ) -> list[int]:
+        """
+        Необработанные уведомления, задача для которых потерялась или еще не выполнилась.
+        После неудачной попытки запись не берется retry_window_seconds: повтор уже запланирован
+        Celery, и лишняя задача только потратила бы попытку
+        """
+        now = func.now()
+        query = (
+            select(PaymentWebhookInbox.id)
+            .where(
+                PaymentWebhookInbox.status == PaymentWebhookStatus.RECEIVED.value,
+                PaymentWebhookInbox.attempts < max_attempts,
+                PaymentWebhookInbox.created_at < now - timedelta(seconds=older_than_seconds),
+                or_(
+                    PaymentWebhookInbox.last_attempt_at.is_(None),
+                    PaymentWebhookInbox.last_attempt_at < now - timedelta(seconds=retry_window_seconds),
+                ),
+            )
+            .order_by(PaymentWebhookInbox.id)
+            .limit(limit)
+        )
+        return list((await self.db.scalars(query)).all())
@@ -60,9 +60,11 @@ class UserPaymentRepository:
         metainfo: dict,
         external_transaction_id: str,
         status: str,
+        commit: bool = True,
     ) -> Transactions:
         """
-        Create a transaction record in the database
+        Create a transaction record in the database.
+        commit=False leaves the transaction open for the caller
         """
         query = (
             insert(Transactions)
@@ -80,5 +82,7 @@ class UserPaymentRepository:
         )
 
         result = await self.db.execute(query)
-        await self.db.commit()
-        return result.scalar_one()
+        transaction = result.scalar_one()
+        if commit:
+            await self.db.commit()
+        return transaction
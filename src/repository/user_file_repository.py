@@ -1,10 +1,15 @@
 from dataclasses import dataclass
 
-from sqlalchemy import insert, select, update, delete
+from functools import reduce
+
+from sqlalchemy import insert, select, update, delete, func, or_, and_, literal_column, cast, literal, tuple_, \
+    Row, REAL, case, null, Text
+from sqlalchemy.dialects.postgresql import JSONB, REGCONFIG
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
 
 from src.models import FileRemoveVocalStatus, FileRemoveMelodyStatus, FileRemoveNoiseStatus
-from src.models.file import UserFile
+from src.models.file import UserFile, TranscriptionChunk
 
 
 @dataclass
@@ -15,10 +20,11 @@ class UserFileRepository:
         self, 
         file_url: str, 
         status: str, 
-        transcription: dict | str,
+        transcription: dict | str | None,
         transcription_text: str | None = None,
-        transcription_vtt: str | None = None,
-        transcription_srt: str | None = None
+        transcription_compact: bytes | None = None,
+        transcription_index: bytes | None = None,
+        search_config: str = "simple",
     ) -> None:
         query = (
             update(UserFile)
@@ -26,9 +32,15 @@ class UserFileRepository:
             .values(
                 status=status, 
                 transcription=transcription,
+                transcription_compact=transcription_compact,
+                transcription_index=transcription_index,
+                transcription_search_config=search_config,
                 transcription_text=transcription_text,
-                transcription_vtt=transcription_vtt,
-                transcription_srt=transcription_srt
+                transcription_edits=None,
+                # SRT и VTT строятся по запросу из сегментов
+                transcription_vtt=None,
+                transcription_srt=None,
+                transcription_version=UserFile.transcription_version + 1,
             )
         )
         await self.db.execute(query)
@@ -52,6 +64,243 @@ class UserFileRepository:
         await self.db.execute(query)
         await self.db.commit()
 
+    async def request_transcription(
+        self, file_ids: list[int], processing_status: str, transcription_status: str
+    ) -> list[int]:
+        """
+        Mark files as waiting for transcription.
+        Files that are already being transcribed are skipped, so repeated requests don't resubmit them.
+        """
+        query = (
+            update(UserFile)
+            .where(
+                UserFile.id.in_(file_ids),
+                UserFile.transcription_status.is_distinct_from(transcription_status),
+            )
+            .values(
+                status=processing_status,
+                transcription_status=transcription_status,
+                transcription_requested_at=func.now(),
+                transcription_submitted_at=None,
+                transcription_attempts=0,
+            )
+            .returning(UserFile.id)
+        )
+        result = await self.db.execute(query)
+        await self.db.commit()
+        return list(result.scalars().all())
+
+    @staticmethod
+    def _submission_expired(
+        callback_timeout_seconds: int, timeout_per_audio_second: float
+    ):
+        """Условие: провайдер не прислал callback за отведенное время (зависит от длительности файла)"""
+        timeout = callback_timeout_seconds + func.coalesce(UserFile.duration, 0) * timeout_per_audio_second
+        return UserFile.transcription_submitted_at < func.now() - literal_column("interval '1 second'") * timeout
+
+    async def claim_transcription_submission(
+        self,
+        file_id: int,
+        transcription_status: str,
+        callback_timeout_seconds: int,
+        timeout_per_audio_second: float,
+    ) -> UserFile | None:
+        """
+        Atomically take a file for submission to the provider.
+        Returns None if the file is already submitted and its callback is not overdue, or transcription is finished.
+        """
+        query = (
+            update(UserFile)
+            .where(
+                UserFile.id == file_id,
+                UserFile.transcription_status == transcription_status,
+                or_(
+                    UserFile.transcription_submitted_at.is_(None),
+                    self._submission_expired(callback_timeout_seconds, timeout_per_audio_second),
+                ),
+            )
+            .values(
+                transcription_submitted_at=func.now(),
+                transcription_attempts=UserFile.transcription_attempts + 1,
+            )
+            .returning(UserFile)
+        )
+        result = await self.db.execute(query)
+        await self.db.commit()
+        return result.scalar_one_or_none()
+
+    async def update_prepared_audio(
+        self, file_id: int, prepared_audio_url: str, offset_map: list[list[float]]
+    ) -> None:
+        query = (
+            update(UserFile)
+            .where(UserFile.id == file_id)
+            .values(
+                prepared_audio_url=prepared_audio_url,
+                transcription_offset_map=offset_map,
+            )
+        )
+        await self.db.execute(query)
+        await self.db.commit()
+
+    async def create_transcription_chunks(self, file_id: int, chunks: list[dict]) -> None:
+        await self.db.execute(
+            insert(TranscriptionChunk),
+            [{"user_file_id": file_id, **chunk} for chunk in chunks],
+        )
+        await self.db.execute(
+            update(UserFile).where(UserFile.id == file_id).values(transcription_progress=0.0)
+        )
+        await self.db.commit()
+
+    async def get_transcription_chunks(self, file_id: int) -> list[TranscriptionChunk]:
+        query = (
+            select(TranscriptionChunk)
+            .where(TranscriptionChunk.user_file_id == file_id)
+            .order_by(TranscriptionChunk.index)
+        )
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+
+    async def get_transcription_chunk(self, file_id: int, index: int) -> TranscriptionChunk | None:
+        query = select(TranscriptionChunk).where(
+            TranscriptionChunk.user_file_id == file_id,
+            TranscriptionChunk.index == index,
+        )
+        return await self.db.scalar(query)
+
+    async def complete_transcription_chunk(
+        self, file_id: int, index: int, result: dict, completed_status: str
+    ) -> tuple[bool, int, int]:
+        """
+        Save the chunk result and update the file progress.
+        Chunks of one file are serialized by a lock on the file row, so exactly one call sees the last chunk.
+
+        Returns:
+            Whether this call completed the chunk, number of completed chunks, total number of chunks
+        """
+        await self.db.execute(
+            select(UserFile.id).where(UserFile.id == file_id).with_for_update()
+        )
+        updated = await self.db.execute(
+            update(TranscriptionChunk)
+            .where(
+                TranscriptionChunk.user_file_id == file_id,
+                TranscriptionChunk.index == index,
+                TranscriptionChunk.status != completed_status,
+            )
+            .values(result=result, status=completed_status)
+        )
+        counts = await self.db.execute(
+            select(
+                func.count(),
+                func.count().filter(TranscriptionChunk.status == completed_status),
+            ).where(TranscriptionChunk.user_file_id == file_id)
+        )
+        total, completed = counts.one()
+        if total:
+            await self.db.execute(
+                update(UserFile)
+                .where(UserFile.id == file_id)
+                .values(transcription_progress=completed / total)
+            )
+        await self.db.commit()
+        return updated.rowcount > 0, completed, total
+
+    async def fail_transcription_chunk(
+        self, file_id: int, index: int, completed_status: str, max_attempts: int
+    ) -> bool:
+        """
+        Count a failed attempt of a chunk that has no result yet.
+
+        Returns:
+            True if the chunk has used up max_attempts
+        """
+        attempts = await self.db.scalar(
+            update(TranscriptionChunk)
+            .where(
+                TranscriptionChunk.user_file_id == file_id,
+                TranscriptionChunk.index == index,
+                TranscriptionChunk.status != completed_status,
+            )
+            .values(attempts=TranscriptionChunk.attempts + 1)
+            .returning(TranscriptionChunk.attempts)
+        )
+        await self.db.commit()
+        return attempts is not None and attempts >= max_attempts
+
+    async def delete_transcription_chunks(self, file_id: int) -> None:
+        query = delete(TranscriptionChunk).where(TranscriptionChunk.user_file_id == file_id)
+        await self.db.execute(query)
+        await self.db.commit()
+
+    async def release_transcription_submission(self, file_id: int) -> None:
+        """Откатывает захват файла, если запрос до провайдера так и не ушел"""
+        query = (
+            update(UserFile)
+            .where(UserFile.id == file_id)
+            .values(
+                transcription_submitted_at=None,
+                transcription_attempts=func.greatest(UserFile.transcription_attempts - 1, 0),
+            )
+        )
+        await self.db.execute(query)
+        await self.db.commit()
+
+    async def fail_exhausted_transcriptions(
+        self,
+        transcription_status: str,
+        failed_status: str,
+        max_attempts: int,
+        callback_timeout_seconds: int,
+        timeout_per_audio_second: float,
+    ) -> list[int]:
+        """
+        Mark as failed the files whose callback did not arrive after the last allowed attempt
+        """
+        query = (
+            update(UserFile)
+            .where(
+                UserFile.transcription_status == transcription_status,
+                UserFile.transcription_attempts >= max_attempts,
+                self._submission_expired(callback_timeout_seconds, timeout_per_audio_second),
+            )
+            .values(transcription_status=failed_status)
+            .returning(UserFile.id)
+        )
+        result = await self.db.execute(query)
+        await self.db.commit()
+        return list(result.scalars().all())
+
+    async def get_stalled_transcription_ids(
+        self,
+        transcription_status: str,
+        submit_grace_seconds: int,
+        callback_timeout_seconds: int,
+        timeout_per_audio_second: float,
+    ) -> list[int]:
+        """
+        Files waiting for transcription that were never submitted (the queue message was lost)
+        or whose provider callback is overdue.
+        Files left in processing before requested_at existed have it NULL and are stalled as well
+        """
+        query = select(UserFile.id).where(
+            UserFile.transcription_status == transcription_status,
+            or_(
+                and_(
+                    UserFile.transcription_submitted_at.is_(None),
+                    or_(
+                        UserFile.transcription_requested_at.is_(None),
+                        UserFile.transcription_requested_at
+                        < func.now() - literal_column("interval '1 second'") * submit_grace_seconds,
+                    ),
+                ),
+                self._submission_expired(callback_timeout_seconds, timeout_per_audio_second),
+            ),
+        )
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+
     async def create_user_file(
         self,
         user_id: int,
@@ -92,6 +341,78 @@ class UserFileRepository:
         result = await self.db.execute(query)
         return result.scalars().all()
 
+    async def get_user_files_with_transcription_json(
+        self, user_id: int, file_ids: list[int] | None = None, status: str | None = None
+    ) -> list[tuple[UserFile, str | None]]:
+        """
+        Файлы пользователя и их JSONB-транскрипция текстом (transcription::text): ответ собирается
+        из этого текста без разбора в объекты Python. Сам столбец transcription не загружается
+        """
+        query = (
+            select(UserFile, cast(UserFile.transcription, Text))
+            .options(defer(UserFile.transcription))
+            .where(UserFile.user_id == user_id)
+            .order_by(UserFile.updated_at.desc())
+        )
+        if file_ids is not None:
+            query = query.where(UserFile.id.in_(file_ids))
+        if status:
+            query = query.where(UserFile.status == status)
+        return [(user_file, transcription_json) for user_file, transcription_json in (await self.db.execute(query)).all()]
+
+    async def search_transcriptions(
+        self,
+        user_id: int,
+        query: str,
+        configs: list[str],
+        headline_options: str,
+        limit: int,
+        after: tuple[float, int] | None = None,
+    ) -> list[Row]:
+        """
+        Full-text search over the user's transcriptions, ordered by (rank, id) descending.
+        The query is parsed with every config in `configs` and OR-ed, because its language is unknown;
+        the result is a constant tsquery, so the GIN index on transcription_tsv is used.
+        ts_headline and the query lexemes are computed only for the returned page.
+        """
+        tsquery = reduce(
+            lambda left, right: left.op("||")(right),
+            [func.websearch_to_tsquery(cast(literal(config), REGCONFIG), query) for config in configs],
+        )
+        rank = func.ts_rank_cd(UserFile.transcription_tsv, tsquery)
+        page = (
+            select(UserFile.id, rank.label("rank"))
+            .where(UserFile.user_id == user_id, UserFile.transcription_tsv.op("@@")(tsquery))
+            .order_by(rank.desc(), UserFile.id.desc())
+            .limit(limit)
+        )
+        if after:
+            page = page.where(tuple_(rank, UserFile.id) < tuple_(cast(after[0], REAL), after[1]))
+        page = page.subquery("page")
+
+        result = await self.db.execute(
+            select(
+                UserFile.id,
+                UserFile.display_name,
+                page.c.rank,
+                func.ts_headline(
+                    UserFile.transcription_search_config,
+                    UserFile.transcription_text,
+                    tsquery,
+                    headline_options,
+                ).label("snippet"),
+                func.tsvector_to_array(
+                    func.to_tsvector(UserFile.transcription_search_config, query)
+                ).label("lexemes"),
+                UserFile.transcription_compact,
+                UserFile.transcription,
+            )
+            .join(page, page.c.id == UserFile.id)
+            .where(UserFile.user_id == user_id)
+            .order_by(page.c.rank.desc(), UserFile.id.desc())
+        )
+        return result.all()
+
     async def delete_user_file(self, file_id: int) -> None:
         """
         Delete a user file from the database
@@ -107,6 +428,43 @@ class UserFileRepository:
         query = select(UserFile).where(UserFile.file_url == file_url)
         return await self.db.scalar(query)
 
+    async def get_user_file_by_id(self, file_id: int) -> UserFile | None:
+        query = select(UserFile).where(UserFile.id == file_id)
+        return await self.db.scalar(query)
+
+    async def update_insights_status(self, file_id: int, status: str) -> None:
+        query = (
+            update(UserFile)
+            .where(UserFile.id == file_id)
+            .values(insights_status=status)
+        )
+        await self.db.execute(query)
+        await self.db.commit()
+
+    async def update_file_insights(
+        self,
+        file_id: int,
+        summary: str,
+        chapters: list[dict],
+        transcription_text: str,
+        status: str,
+    ) -> None:
+        """
+        Save precomputed summary, chapters and plain text of the transcription
+        """
+        query = (
+            update(UserFile)
+            .where(UserFile.id == file_id)
+            .values(
+                summary=summary,
+                chapters=chapters,
+                transcription_text=transcription_text,
+                insights_status=status,
+            )
+        )
+        await self.db.execute(query)
+        await self.db.commit()
+
     async def update_noise_removed_url(
         self, file_id: int, removed_noise_url: str
     ) -> None:
@@ -176,18 +534,169 @@ class UserFileRepository:
         await self.db.execute(query)
         await self.db.commit()
 
-    async def update_transcription_json(self, file_id: int, transcription_data: dict) -> None:
+    async def update_transcription_json(
+        self,
+        file_id: int,
+        transcription_data: dict | None,
+        transcription_compact: bytes | None = None,
+        transcription_index: bytes | None = None,
+    ) -> None:
         """
         Update the JSON transcription data for a file
         """
         query = (
             update(UserFile)
             .where(UserFile.id == file_id)
-            .values(transcription=transcription_data)
+            .values(
+                transcription=transcription_data,
+                transcription_compact=transcription_compact,
+                transcription_index=transcription_index,
+                transcription_edits=None,
+                transcription_version=UserFile.transcription_version + 1,
+            )
+        )
+        await self.db.execute(query)
+        await self.db.commit()
+
+    async def get_json_transcriptions(self, after_id: int, limit: int) -> list[tuple[int, dict]]:
+        """
+        Files whose transcription is still stored as JSONB, ordered by id (keyset pagination)
+        """
+        query = (
+            select(UserFile.id, UserFile.transcription)
+            .where(
+                UserFile.id > after_id,
+                UserFile.transcription_compact.is_(None),
+                func.jsonb_typeof(UserFile.transcription) == "object",
+            )
+            .order_by(UserFile.id)
+            .limit(limit)
+        )
+        result = await self.db.execute(query)
+        return [tuple(row) for row in result.all()]
+
+    async def store_compact_transcription(
+        self, file_id: int, transcription_compact: bytes, transcription_index: bytes | None = None
+    ) -> bool:
+        """
+        Replace JSONB transcription with its compact form. The caller has checked that the blob decodes
+        back to the same JSON, so the version is kept.
+        Returns False if the file was changed or deleted meanwhile.
+        """
+        query = (
+            update(UserFile)
+            .where(UserFile.id == file_id, UserFile.transcription_compact.is_(None))
+            .values(
+                transcription=None,
+                transcription_compact=transcription_compact,
+                transcription_index=func.coalesce(UserFile.transcription_index, transcription_index),
+            )
+            .returning(UserFile.id)
+        )
+        result = await self.db.execute(query)
+        await self.db.commit()
+        return result.scalar_one_or_none() is not None
+
+    async def get_transcription_index(
+        self, user_id: int, file_id: int, known_version: int | None = None
+    ) -> Row | None:
+        """
+        Version and search index of the user's file transcription.
+        The index is not sent if its version equals known_version (already cached by the caller).
+        has_edits: the stored index doesn't include pending segment edits yet.
+        """
+        query = select(
+            UserFile.transcription_version.label("version"),
+            case(
+                (UserFile.transcription_version == known_version, null()),
+                else_=UserFile.transcription_index,
+            ).label("transcription_index"),
+            or_(UserFile.transcription.is_not(None), UserFile.transcription_compact.is_not(None)).label(
+                "has_transcription"
+            ),
+            UserFile.transcription_edits.is_not(None).label("has_edits"),
+        ).where(UserFile.user_id == user_id, UserFile.id == file_id)
+        return (await self.db.execute(query)).one_or_none()
+
+    async def update_transcription_index(self, file_id: int, version: int, transcription_index: bytes) -> None:
+        """
+        Save an index built on demand, unless the transcription has changed since it was read
+        """
+        query = (
+            update(UserFile)
+            .where(UserFile.id == file_id, UserFile.transcription_version == version)
+            .values(transcription_index=transcription_index)
         )
         await self.db.execute(query)
         await self.db.commit()
 
+    async def append_transcription_edits(
+        self,
+        user_id: int,
+        file_id: int,
+        edits: list[dict],
+        expected_version: int | None = None,
+        clear_subtitles: bool = False,
+    ) -> int | None:
+        """
+        Append segment edits to the pending list and bump the version.
+        Only the small edits value is rewritten: large TOASTed columns keep their stored values.
+        Returns the new version, or None if the file is missing or its version differs from expected_version.
+        """
+        values = dict(
+            transcription_edits=func.coalesce(UserFile.transcription_edits, cast([], JSONB)).op("||")(
+                cast(edits, JSONB)
+            ),
+            transcription_version=UserFile.transcription_version + 1,
+        )
+        if clear_subtitles:
+            # Сохраненные вручную SRT/VTT разошлись бы с сегментами, дальше они строятся из сегментов
+            values.update(transcription_srt=None, transcription_vtt=None)
+        query = (
+            update(UserFile)
+            .where(UserFile.user_id == user_id, UserFile.id == file_id)
+            .values(**values)
+            .returning(UserFile.transcription_version)
+        )
+        if expected_version is not None:
+            query = query.where(UserFile.transcription_version == expected_version)
+        result = await self.db.execute(query)
+        await self.db.commit()
+        return result.scalar_one_or_none()
+
+    async def apply_transcription_edits(
+        self,
+        file_id: int,
+        version: int,
+        transcription: dict | None,
+        transcription_compact: bytes | None,
+        transcription_index: bytes | None,
+        transcription_text: str | None = None,
+    ) -> bool:
+        """
+        Store the transcription with pending edits applied and clear the edits.
+        The content readers see is unchanged, so the version is kept.
+        transcription_text is updated only when given (text of some segment was edited).
+        Returns False if new edits arrived since the file was read.
+        """
+        values = dict(
+            transcription=transcription,
+            transcription_compact=transcription_compact,
+            transcription_index=transcription_index,
+            transcription_edits=None,
+        )
+        if transcription_text is not None:
+            values["transcription_text"] = transcription_text
+        query = (
+            update(UserFile)
+            .where(UserFile.id == file_id, UserFile.transcription_version == version)
+            .values(**values)
+            .returning(UserFile.id)
+        )
+        result = await self.db.execute(query)
+        await self.db.commit()
+        return result.scalar_one_or_none() is not None
+
     async def update_transcription_text(self, file_id: int, text: str) -> None:
         """
         Update the text transcription for a file
@@ -195,7 +704,10 @@ class UserFileRepository:
         query = (
             update(UserFile)
             .where(UserFile.id == file_id)
-            .values(transcription_text=text)
+            .values(
+                transcription_text=text,
+                transcription_version=UserFile.transcription_version + 1,
+            )
         )
         await self.db.execute(query)
         await self.db.commit()
@@ -207,7 +719,10 @@ class UserFileRepository:
         query = (
             update(UserFile)
             .where(UserFile.id == file_id)
-            .values(transcription_vtt=vtt)
+            .values(
+                transcription_vtt=vtt,
+                transcription_version=UserFile.transcription_version + 1,
+            )
         )
         await self.db.execute(query)
         await self.db.commit()
@@ -219,11 +734,109 @@ class UserFileRepository:
         query = (
             update(UserFile)
             .where(UserFile.id == file_id)
-            .values(transcription_srt=srt)
+            .values(
+                transcription_srt=srt,
+                transcription_version=UserFile.transcription_version + 1,
+            )
         )
         await self.db.execute(query)
         await self.db.commit()
 
+    async def update_waveform_peaks(self, file_id: int, source: str, peaks: dict) -> None:
+        """
+        Save peaks metadata of one audio source, keeping the other sources
+        """
+        query = (
+            update(UserFile)
+            .where(UserFile.id == file_id)
+            .values(
+                waveform_peaks=func.coalesce(UserFile.waveform_peaks, cast({}, JSONB)).op("||")(
+                    cast({source: peaks}, JSONB)
+                )
+            )
+        )
+        await self.db.execute(query)
+        await self.db.commit()
+
+    async def update_hls_package(self, file_id: int, source: str, package: dict) -> dict | None:
+        """
+        Save HLS package metadata of one audio source, keeping the other sources.
+        Returns the replaced package of this source (its objects can be deleted).
+        """
+        previous = await self.db.execute(
+            select(UserFile.hls_packages[source]).where(UserFile.id == file_id).with_for_update()
+        )
+        replaced = previous.scalar_one_or_none()
+        query = (
+            update(UserFile)
+            .where(UserFile.id == file_id)
+            .values(
+                hls_packages=func.coalesce(UserFile.hls_packages, cast({}, JSONB)).op("||")(
+                    cast({source: package}, JSONB)
+                )
+            )
+        )
+        await self.db.execute(query)
+        await self.db.commit()
+        return replaced
+
+    async def get_file_media(self, user_id: int, file_id: int) -> Row | None:
+        """
+        Audio urls and HLS packages of the user's file, without loading the transcription
+        """
+        query = select(
+            UserFile.file_url,
+            UserFile.removed_noise_file_url,
+            UserFile.removed_vocals_file_url,
+            UserFile.removed_melody_file_url,
+            UserFile.improved_audio_file_url,
+            UserFile.hls_packages,
+        ).where(UserFile.user_id == user_id, UserFile.id == file_id)
+        return (await self.db.execute(query)).one_or_none()
+
+    async def get_original_audio_state(self, file_id: int, source: str) -> Row | None:
+        """
+        Original audio url, transcription status and the audio urls its waveform peaks
+        and HLS package were built from, read from the database rather than the session
+        """
+        query = select(
+            UserFile.file_url,
+            UserFile.transcription_status,
+            UserFile.original_audio_deleted_at,
+            UserFile.waveform_peaks[source]["audio_url"].astext.label("peaks_audio_url"),
+            UserFile.hls_packages[source]["audio_url"].astext.label("hls_audio_url"),
+        ).where(UserFile.id == file_id)
+        return (await self.db.execute(query)).one_or_none()
+
+    async def mark_original_audio_deleted(self, file_id: int) -> None:
+        query = (
+            update(UserFile)
+            .where(UserFile.id == file_id, UserFile.original_audio_deleted_at.is_(None))
+            .values(original_audio_deleted_at=func.now())
+        )
+        await self.db.execute(query)
+        await self.db.commit()
+
+    async def get_retained_original_audio_ids(
+        self, transcription_status: str, retention_hours: int, limit: int
+    ) -> list[int]:
+        """
+        Transcribed files uploaded more than retention_hours ago whose original audio is still stored:
+        a derivative never finished or was enabled after the upload
+        """
+        query = (
+            select(UserFile.id)
+            .where(
+                UserFile.transcription_status == transcription_status,
+                UserFile.original_audio_deleted_at.is_(None),
+                UserFile.created_at < func.now() - literal_column("interval '1 hour'") * retention_hours,
+            )
+            .order_by(UserFile.created_at)
+            .limit(limit)
+        )
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+
     async def update_enhance_audio_status(self, file_id: int, status: str) -> None:
         query = (
             update(UserFile)
@@ -1,24 +1,40 @@
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from typing import List, Optional
 from uuid import UUID, uuid4
 
-from sqlalchemy import insert, select, update
+from sqlalchemy import ColumnElement, Row, Select, cast, Date, func, insert, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.models.products import UserProducts, UserProductsToProductsM2M, Products
+from src.models.enums import UsageEventType
+from src.models.users import User
+from src.models.products import (
+    UserProducts, UserProductsToProductsM2M, Products, UsageLedger, UsageDailyRollup,
+)
+
+# Ключ сводки для событий, записанных без продукта
+NO_PRODUCT_ID = UUID(int=0)
 
 
 @dataclass
 class UserProductsRepository:
     db: AsyncSession
 
+    async def _save(self, commit: bool) -> None:
+        """commit=False: изменения только отправляются в базу, транзакцию завершает вызывающий"""
+        if commit:
+            await self.db.commit()
+        else:
+            await self.db.flush()
+
     async def create_user_product(
         self,
         user_id: int,
         minute_count: float,
         amount: float,
         product_id: UUID,
+        commit: bool = True,
     ) -> UserProducts:
         user_products = UserProducts(
             uuid=uuid4(),
@@ -28,8 +44,9 @@ class UserProductsRepository:
         )
 
         self.db.add(user_products)
-        await self.db.commit()
-        await self.db.refresh(user_products)
+        await self._save(commit)
+        if commit:
+            await self.db.refresh(user_products)
 
         user_products_to_products = UserProductsToProductsM2M(
             user_id=user_id,
@@ -39,20 +56,79 @@ class UserProductsRepository:
         )
 
         self.db.add(user_products_to_products)
-        await self.db.commit()
+        await self._save(commit)
 
         return user_products
 
     async def get_user_product(self, user_id: int) -> UserProducts:
-        query = select(UserProducts).where(UserProducts.user_id == user_id)
+        query = (
+            select(UserProducts)
+            .where(UserProducts.user_id == user_id)
+            .order_by(UserProducts.created_at, UserProducts.uuid)
+            .limit(1)
+        )
         return await self.db.scalar(query)
 
+    @staticmethod
+    def _active_products_filter(user_id: int | ColumnElement[int]) -> tuple:
+        """Действующие продукты пользователя: активные и не истекшие"""
+        return (
+            UserProducts.user_id == user_id,
+            UserProducts.is_active == True,
+            or_(UserProducts.expires_at.is_(None), UserProducts.expires_at > func.now()),
+        )
+
+    @staticmethod
+    def _deduction_order() -> tuple:
+        """
+        Порядок списания минут: действующая подписка, затем пакеты минут;
+        среди равных — раньше истекающий, затем самый старый
+        """
+        return (
+            UserProducts.is_subscription.desc(),
+            UserProducts.expires_at.asc().nulls_last(),
+            UserProducts.created_at,
+            UserProducts.uuid,
+        )
+
+    @classmethod
+    def _active_product_id_query(cls, user_id: int | ColumnElement[int]) -> Select:
+        """
+        Продукт, с которого сейчас списываются минуты: первый по порядку списания с остатком минут,
+        а если остатка нет ни на одном — первый по тому же порядку.
+        user_id может быть столбцом внешнего запроса (коррелированный подзапрос)
+        """
+        return (
+            select(UserProducts.uuid)
+            .where(*cls._active_products_filter(user_id))
+            .order_by(
+                (UserProducts.minute_count > UserProducts.minute_count_used).desc(),
+                *cls._deduction_order(),
+            )
+            .limit(1)
+        )
+
+    async def get_active_user_product(self, user_id: int) -> UserProducts | None:
+        active_id = self._active_product_id_query(user_id).scalar_subquery()
+        return await self.db.scalar(select(UserProducts).where(UserProducts.uuid == active_id))
+
+    async def get_remaining_minutes(self, user_id: int) -> float:
+        """
+        Сумма остатков минут по всем действующим продуктам пользователя. Перерасход одного продукта
+        (minute_count_used > minute_count) вычитается из остатков остальных, иначе он не учитывался бы
+        """
+        query = select(
+            func.greatest(func.coalesce(func.sum(UserProducts.minute_count - UserProducts.minute_count_used), 0), 0)
+        ).where(*self._active_products_filter(user_id))
+        return float(await self.db.scalar(query))
+
     async def update_user_product(
         self,
         user_id: int,
         minute_count: float,
         user_product_id: UUID,
         product_id: UUID,
+        commit: bool = True,
     ) -> UserProducts:
         query = (
             update(UserProducts)
@@ -77,7 +153,9 @@ class UserProductsRepository:
                 product_id=product_id,
                 amount=updated_user_products.amount,
                 user_product=updated_user_products.uuid,
+                commit=commit,
             )
+        elif commit:
             await self.db.commit()
         return updated_user_products
 
@@ -87,6 +165,7 @@ class UserProductsRepository:
         product_id: UUID,
         amount: float,
         user_product: UUID,
+        commit: bool = True,
     ):
         user_products_to_products_query = insert(UserProductsToProductsM2M).values(
             user_id=user_id,
@@ -95,30 +174,144 @@ class UserProductsRepository:
             user_product=user_product,
         )
         await self.db.execute(user_products_to_products_query)
-        await self.db.commit()
+        await self._save(commit)
 
     async def deduct_minutes(
-        self, user_id: int, minutes_to_deduct: float
+        self,
+        user_id: int,
+        minutes_to_deduct: float,
+        seconds: float,
+        event_type: UsageEventType = UsageEventType.UPLOAD,
+        user_file_id: int | None = None,
     ) -> UserProducts:
         """
-        Deduct minutes from user's balance after file transcription
+        Списывает минуты с действующих продуктов пользователя по порядку списания: с каждого не больше
+        его остатка, а то, что не покрыто остатками, — с первого из них. На каждый затронутый продукт
+        пишется событие в журнал в той же транзакции. Строки продуктов блокируются, а значение
+        увеличивается в базе, поэтому параллельные списания не теряются и не делят один остаток
+
+        Returns:
+            Первый продукт, с которого списаны минуты
         """
-        user_product = await self.get_user_product(user_id)
-        if not user_product:
-            raise ValueError(f"User {user_id} has no product with minutes")
-        minute_count_used = user_product.minute_count_used + minutes_to_deduct
-        query = (
-            update(UserProducts)
-            .where(
-                UserProducts.uuid == user_product.uuid, UserProducts.user_id == user_id
+        user_products = (
+            await self.db.scalars(
+                select(UserProducts)
+                .where(*self._active_products_filter(user_id))
+                .order_by(*self._deduction_order())
+                .with_for_update()
+            )
+        ).all()
+        if not user_products:
+            await self.db.rollback()
+            raise ValueError(f"User {user_id} has no active product with minutes")
+
+        charges: dict[UUID, float] = {}
+        left = minutes_to_deduct
+        for user_product in user_products:
+            balance = max(0.0, user_product.minute_count - user_product.minute_count_used)
+            charge = min(balance, left)
+            if charge > 0:
+                charges[user_product.uuid] = charge
+                left -= charge
+        if left > 0 or not charges:
+            # Остатков не хватило (допуск загрузки не резервирует минуты, параллельные загрузки могут уйти
+            # в минус): перерасход записывается на первый продукт с остатком или первый по порядку
+            # и уменьшает сумму остатков, по которой допускаются следующие загрузки
+            first_id = next(iter(charges), user_products[0].uuid)
+            charges[first_id] = charges.get(first_id, 0.0) + left
+
+        updated_user_products = []
+        for user_product_id, minutes in charges.items():
+            updated_user_products.append(
+                (
+                    await self.db.execute(
+                        update(UserProducts)
+                        .where(UserProducts.uuid == user_product_id)
+                        .values(minute_count_used=UserProducts.minute_count_used + minutes)
+                        .returning(UserProducts)
+                    )
+                ).scalar_one()
+            )
+            await self.db.execute(
+                insert(UsageLedger).values(
+                    user_id=user_id,
+                    user_product_id=user_product_id,
+                    user_file_id=user_file_id,
+                    event_type=event_type.value,
+                    seconds=seconds * minutes / minutes_to_deduct,
+                    minutes=minutes,
+                )
+            )
+        await self.db.commit()
+        return updated_user_products[0]
+
+    async def record_usage(
+        self,
+        user_id: int,
+        seconds: float,
+        event_type: UsageEventType,
+        user_file_id: int | None = None,
+    ) -> None:
+        """Событие без списания минут: пишется только в журнал, с действующим продуктом, если он есть"""
+        await self.db.execute(
+            insert(UsageLedger).values(
+                user_id=user_id,
+                user_product_id=self._active_product_id_query(user_id).scalar_subquery(),
+                user_file_id=user_file_id,
+                event_type=event_type.value,
+                seconds=seconds,
+                minutes=0,
             )
-            .values(minute_count_used=minute_count_used)
-            .returning(UserProducts)
         )
+        await self.db.commit()
 
-        updated_user_product = (await self.db.execute(query)).scalar_one()
+    async def rollup_usage(self, days: int) -> int:
+        """
+        Пересчитывает дневные суммы журнала за последние days дней (включая текущий).
+        Дни пересчитываются целиком, поэтому повторный запуск ничего не удваивает
+
+        Returns:
+            Количество обновленных строк сводки
+        """
+        day = cast(UsageLedger.created_at, Date)
+        since = func.date_trunc("day", func.now()) - timedelta(days=days - 1)
+        totals = (
+            select(
+                UsageLedger.user_id,
+                func.coalesce(UsageLedger.user_product_id, literal(NO_PRODUCT_ID)),
+                day,
+                UsageLedger.event_type,
+                func.count(),
+                func.sum(UsageLedger.seconds),
+                func.sum(UsageLedger.minutes),
+            )
+            .where(UsageLedger.created_at >= since)
+            .group_by(UsageLedger.user_id, UsageLedger.user_product_id, day, UsageLedger.event_type)
+        )
+        query = pg_insert(UsageDailyRollup).from_select(
+            ["user_id", "user_product_id", "day", "event_type", "events", "seconds", "minutes"],
+            totals,
+        )
+        query = query.on_conflict_do_update(
+            index_elements=["user_id", "user_product_id", "day", "event_type"],
+            set_={
+                "events": query.excluded.events,
+                "seconds": query.excluded.seconds,
+                "minutes": query.excluded.minutes,
+                "updated_at": func.now(),
+            },
+        )
+        result = await self.db.execute(query)
         await self.db.commit()
-        return updated_user_product
+        return result.rowcount
+
+    async def get_usage_by_day(self, user_id: int, since: date) -> list[UsageDailyRollup]:
+        query = (
+            select(UsageDailyRollup)
+            .where(UsageDailyRollup.user_id == user_id, UsageDailyRollup.day >= since)
+            .order_by(UsageDailyRollup.day, UsageDailyRollup.event_type)
+        )
+        return list((await self.db.scalars(query)).all())
 
     # Методы для работы с подписками
     async def create_subscription_product(
@@ -130,6 +323,7 @@ class UserProductsRepository:
         subscription_id: str | None,
         expires_at: datetime,
         interval: str = "Month",
+        commit: bool = True,
     ) -> UserProducts:
         """Создать запись о продукте с подпиской"""
         user_products = UserProducts(
@@ -146,8 +340,9 @@ class UserProductsRepository:
         )
 
         self.db.add(user_products)
-        await self.db.commit()
-        await self.db.refresh(user_products)
+        await self._save(commit)
+        if commit:
+            await self.db.refresh(user_products)
 
         user_products_to_products = UserProductsToProductsM2M(
             user_id=user_id,
@@ -157,7 +352,7 @@ class UserProductsRepository:
         )
 
         self.db.add(user_products_to_products)
-        await self.db.commit()
+        await self._save(commit)
 
         return user_products
 
@@ -216,5 +411,45 @@ class UserProductsRepository:
 
         return res.scalar_one()
 
+    async def get_user_plan(self, user_id: int) -> Row[tuple[User, UserProducts | None, Products | None]] | None:
+        """
+        Пользователь, его действующая подписка и продукт подписки одним запросом.
+        Из нескольких подписок берется та, с которой сейчас списываются минуты
+        (тот же порядок, что в deduct_minutes), поэтому план показывает ее расход.
+
+        Returns:
+            None, если пользователя нет; подписка и продукт None, если активной подписки нет
+        """
+        plan_id = (
+            self._active_product_id_query(User.id)
+            .where(UserProducts.is_subscription == True)
+            .correlate(User)
+            .scalar_subquery()
+        )
+        query = (
+            select(User, UserProducts, Products)
+            .outerjoin(UserProducts, UserProducts.uuid == plan_id)
+            .outerjoin(Products, Products.uuid == UserProducts.product_id)
+            .where(User.id == user_id)
+        )
+        return (await self.db.execute(query)).one_or_none()
+
+    async def get_user_with_product(self, user_id: int) -> Row[tuple[User, UserProducts | None]] | None:
+        """Пользователь и его первый продукт (как get_user_product) одним запросом"""
+        product_id = (
+            select(UserProducts.uuid)
+            .where(UserProducts.user_id == User.id)
+            .order_by(UserProducts.created_at, UserProducts.uuid)
+            .limit(1)
+            .correlate(User)
+            .scalar_subquery()
+        )
+        query = (
+            select(User, UserProducts)
+            .outerjoin(UserProducts, UserProducts.uuid == product_id)
+            .where(User.id == user_id)
+        )
+        return (await self.db.execute(query)).one_or_none()
+
     async def get_product_by_id(self, product_id: UUID) -> Products:
         return await self.db.scalar(select(Products).where(Products.uuid == product_id))
@@ -1,6 +1,6 @@
 from datetime import datetime
 from uuid import UUID
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 
 class UserFileBase(BaseModel):
@@ -17,12 +17,24 @@ class UserFileBase(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
-class UserFileDetail(UserFileBase):
-    transcription: dict | None = None
+class FileChapter(BaseModel):
+    start: float
+    end: float
+    title: str
+
+
+class UserFileDetailFields(UserFileBase):
+    """Поля UserFileDetail кроме transcription: ее JSON вставляется в ответ готовым"""
+
     transcription_status: str | None = None
+    transcription_progress: float | None = None
+    transcription_version: int | None = Field(None, description="Для expected_version при правке сегментов")
     transcription_text: str | None = None
     transcription_vtt: str | None = None
     transcription_srt: str | None = None
+    summary: str | None = None
+    chapters: list[FileChapter] | None = None
+    insights_status: str | None = None
     duration: int | None = None
     removed_noise_file_url: str | None = None
     removed_vocals_file_url: str | None = None
@@ -32,6 +44,14 @@ class UserFileDetail(UserFileBase):
     removed_melody_file_status: str | None = None
     improved_audio_file_status: str | None = None
     improved_audio_file_url: str | None = None
+    waveform_peaks: dict | None = Field(
+        None,
+        description="Пики по источникам: уровни с etag для GET /user-files/{id}/peaks или failed, если посчитать не удалось",
+    )
+
+
+class UserFileDetail(UserFileDetailFields):
+    transcription: dict | None = None
 
 
 class UserFileListResponse(BaseModel):
@@ -42,6 +62,65 @@ class UserFileListDetailResponse(BaseModel):
     items: list[UserFileDetail]
 
 
+class TranscriptSegment(BaseModel):
+    start: float
+    end: float
+    text: str
+
+
+class TranscriptIndexedSegment(TranscriptSegment):
+    index: int = Field(..., description="Номер сегмента в транскрипции")
+
+
+class TranscriptSeekResponse(BaseModel):
+    segment_index: int | None = Field(None, description="Сегмент, который звучит в момент t")
+    segments: list[TranscriptIndexedSegment]
+
+
+class TranscriptFindResponse(BaseModel):
+    items: list[TranscriptIndexedSegment]
+
+
+class TranscriptSearchHit(BaseModel):
+    file_id: int
+    display_name: str
+    rank: float
+    snippet: str = Field(..., description="Фрагменты текста, совпадения выделены <mark>")
+    segments: list[TranscriptSegment]
+
+
+class TranscriptSearchResponse(BaseModel):
+    items: list[TranscriptSearchHit]
+    next_cursor: str | None = None
+
+
+class TranscriptSegmentEdit(BaseModel):
+    index: int = Field(..., ge=0, description="Номер сегмента в транскрипции")
+    start: float | None = Field(None, ge=0)
+    end: float | None = Field(None, ge=0)
+    text: str | None = None
+
+    @model_validator(mode="after")
+    def check_not_empty(self) -> "TranscriptSegmentEdit":
+        if self.start is None and self.end is None and self.text is None:
+            raise ValueError("At least one of start, end, text is required")
+        if self.start is not None and self.end is not None and self.start > self.end:
+            raise ValueError("start must not be greater than end")
+        return self
+
+
+class TranscriptSegmentsPatchRequest(BaseModel):
+    segments: list[TranscriptSegmentEdit] = Field(..., min_length=1)
+    expected_version: int | None = Field(
+        None, description="Версия, которую видел клиент; при расхождении правка отклоняется с 409"
+    )
+
+
+class TranscriptSegmentsPatchResponse(BaseModel):
+    transcription_version: int
+    segments: list[TranscriptIndexedSegment]
+
+
 class FileTranscriptionRequest(BaseModel):
     file_ids: list[int]
 
@@ -1,6 +1,15 @@
 from pydantic import BaseModel
 
 
+class CloudPaymentsCallback(BaseModel):
+    TransactionId: int
+    Amount: float
+    Status: str
+    Data: dict | None = None # Содержит productId, userId, minuteCount из виджета
+    SubscriptionId: str | None = None
+    AccountId: int
+
+
 class CloudPaymentsRecurrentCallback(BaseModel):
     Id: str
     Amount: float  # Сумма операции
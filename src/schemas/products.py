@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from uuid import UUID
 from enum import Enum
 
@@ -83,3 +83,13 @@ class UserProductPlanResponse(BaseModel):
     is_subscription: bool
     amount: float
     expires_at: datetime
+
+
+class UsageDayResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    day: date
+    event_type: str
+    events: int
+    seconds: float
+    minutes: float
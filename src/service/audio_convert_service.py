@@ -1,29 +1,409 @@
+import asyncio
+import logging
+import os
+import tempfile
 from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
 
-from src.client.whisper_ai_client import WhisperAIClient
+from src.exceptions import WhisperAIUnavailableExceptions, WhisperAIRequestUnconfirmedExceptions
+from src.models import UserFile, TranscriptionChunk
 from src.models.enums import FileTranscriptionStatus
+from src.service.audio_preprocessing import prepare_transcription_audio, remap_timestamps, merge_chunk_results, \
+    timestamp_remapper
+from src.service.file_service import FileService
+from src.service.transcript_ingest import read_transcription_result, encode_transcription_stream
+from src.service.transcription_backend import TranscriptionBackend, LocalTranscriptionBackend
 from src.service.user_file_service import UserFileService
+from src.settings import settings
 
 
 @dataclass
 class AudioConvertService:
-    audio_ai_client: WhisperAIClient
+    transcription_backend: TranscriptionBackend
     user_file_service: UserFileService
+    file_service: FileService
 
-    async def convert_audio_to_text(
+    async def submit_transcription(
         self,
         file_id: int,
-        audio_file_url: str,
-        response_format: str,
-        callback_url: str,
-        language: str | None,
-    ) -> None:
+        response_format: str = "verbose_json",
+        language: str | None = None,
+    ) -> bool:
+        """
+        Запускает расшифровку файла, если он еще не отправлен или результат по нему просрочен.
+
+        Returns:
+            True, если расшифровка запущена
+        """
+        user_file = await self.user_file_service.claim_transcription_submission(file_id)
+        if not user_file:
+            return False
+
+        audio_parts = await self.prepare_audio(user_file)
+        # Куски длинной записи отправляются параллельно, лимиты держит клиент провайдера
+        results = await asyncio.gather(
+            *(
+                self.transcription_backend.submit(
+                    user_file, audio_file_key, response_format, language, chunk_index=chunk_index
+                )
+                for audio_file_key, chunk_index in audio_parts
+            ),
+            return_exceptions=True,
+        )
+        # (номер куска или None, ошибка) для запросов, которые не удались
+        failures = [
+            (chunk_index, result)
+            for (_, chunk_index), result in zip(audio_parts, results)
+            if isinstance(result, Exception)
+        ]
+        unconfirmed = [error for _, error in failures if isinstance(error, WhisperAIRequestUnconfirmedExceptions)]
+        failures = [failure for failure in failures if not isinstance(failure[1], WhisperAIRequestUnconfirmedExceptions)]
+        if unconfirmed:
+            # Провайдер мог принять задачу: файл остается отправленным, и если callback не придет,
+            # reconcile_transcriptions переотправит его (или куски без результата) после таймаута.
+            # Немедленный повтор создал бы платную задачу-дубль
+            logging.warning(
+                f"Transcription request for file {file_id} is not confirmed, waiting for callback: "
+                f"{str(unconfirmed[0])}"
+            )
+        if any(isinstance(error, WhisperAIUnavailableExceptions) for _, error in failures):
+            if not unconfirmed:
+                # Часть запросов не ушла — попытка не считается, задача повторится позже,
+                # уже готовые куски повторно не сохранятся
+                await self.user_file_service.release_transcription_submission(file_id)
+                raise WhisperAIUnavailableExceptions()
+            # Неотправленные куски уйдут вместе с неподтвержденными при переотправке reconcile
+            failures = [failure for failure in failures if not isinstance(failure[1], WhisperAIUnavailableExceptions)]
+
+        for chunk_index, error in failures:
+            if chunk_index is None:
+                logging.error(f"Transcription request failed for file {file_id}: {str(error)}")
+                await self.user_file_service.update_files_transcription_status(
+                    file_ids=[file_id],
+                    status=FileTranscriptionStatus.FAILED
+                )
+                return False
+            # Остальные куски уже у провайдера: повторяется только этот
+            if not await self._fail_transcription_chunk(user_file, chunk_index, str(error)):
+                return False
+        return True
+
+    async def submit_transcription_chunk(
+        self,
+        file_id: int,
+        chunk_index: int,
+        response_format: str = "verbose_json",
+        language: str | None = None,
+    ) -> bool:
+        """
+        Повторно отправляет один кусок, расшифровка которого не удалась.
+
+        Returns:
+            True, если кусок отправлен
+        """
+        user_file = await self.user_file_service.get_user_file_by_id(file_id)
+        if not user_file or user_file.transcription_status != FileTranscriptionStatus.PROCESSING.value:
+            return False
+        chunk = await self.user_file_service.get_transcription_chunk(file_id, chunk_index)
+        if not chunk or chunk.status == FileTranscriptionStatus.COMPLETED.value:
+            return False
+
         try:
-            await self.audio_ai_client.convert_audio_to_text(
-                audio_file_url, response_format, language, callback_url
+            await self.transcription_backend.submit(
+                user_file, chunk.audio_url, response_format, language, chunk_index=chunk_index
             )
-        except:
+        except WhisperAIUnavailableExceptions:
+            # Попытка не считается, задача повторится после паузы circuit breaker
+            raise
+        except WhisperAIRequestUnconfirmedExceptions as e:
+            logging.warning(
+                f"Transcription chunk {chunk_index} of file {file_id} is not confirmed, waiting for callback: {str(e)}"
+            )
+        except Exception as e:
+            await self._fail_transcription_chunk(user_file, chunk_index, str(e))
+            return False
+        return True
+
+    async def _fail_transcription_chunk(self, user_file: UserFile, chunk_index: int, error: str) -> bool:
+        """
+        Считает неудачную попытку куска и ставит его повторную отправку. Файл помечается FAILED,
+        только когда кусок исчерпал TRANSCRIPTION_MAX_ATTEMPTS: остальные куски тем временем
+        продолжают расшифровываться
+
+        Returns:
+            True, если кусок будет отправлен еще раз
+        """
+        from src.celery.celery_app import TRANSCRIPTION_QUEUE
+        from src.celery.tasks import submit_transcription_chunk
+
+        logging.error(f"Transcription chunk {chunk_index} of file {user_file.id} failed: {error}")
+        if await self.user_file_service.fail_transcription_chunk(user_file.id, chunk_index):
+            logging.error(f"Transcription chunk {chunk_index} of file {user_file.id} has no attempts left")
+            await self.user_file_service.update_files_transcription_status(
+                file_ids=[user_file.id],
+                status=FileTranscriptionStatus.FAILED
+            )
+            return False
+        submit_transcription_chunk.apply_async(
+            args=[user_file.id, chunk_index],
+            queue=TRANSCRIPTION_QUEUE,
+            countdown=settings.TRANSCRIPTION_CHUNK_RETRY_SECONDS,
+        )
+        return True
+
+    async def prepare_audio(self, user_file: UserFile) -> list[tuple[str, int | None]]:
+        """
+        Вырезает длинные паузы, режет длинную запись на куски и перекодирует
+        в 16 kHz mono Opus, чтобы уменьшить передаваемый объем и оплачиваемые минуты.
+
+        Returns:
+            Пары (ключ файла в S3, номер куска) для отправки на расшифровку;
+            номер None, если файл отправляется целиком
+        """
+        chunks = await self.user_file_service.get_transcription_chunks(user_file.id)
+        if chunks:
+            # Повторная отправка: только куски без результата
+            return [
+                (chunk.audio_url, chunk.index)
+                for chunk in chunks
+                if chunk.status != FileTranscriptionStatus.COMPLETED.value
+            ]
+        if user_file.prepared_audio_url:
+            return [(user_file.prepared_audio_url, None)]
+        if not settings.TRANSCRIPTION_VAD_ENABLED and not settings.TRANSCRIPTION_CHUNK_SECONDS:
+            return [(user_file.file_url, None)]
+
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                input_path = os.path.join(tmp_dir, Path(user_file.file_url).name)
+                # В потоке: event loop воркера общий для всех отправок процесса
+                await asyncio.to_thread(
+                    self.file_service.download_file_from_bucket, "public-file", user_file.file_url, input_path
+                )
+
+                prepared = await asyncio.to_thread(
+                    prepare_transcription_audio,
+                    input_path,
+                    tmp_dir,
+                    Path(user_file.file_url).stem,
+                    vad_enabled=settings.TRANSCRIPTION_VAD_ENABLED,
+                    threshold_db=settings.TRANSCRIPTION_VAD_THRESHOLD_DB,
+                    min_silence_seconds=settings.TRANSCRIPTION_VAD_MIN_SILENCE_SECONDS,
+                    padding_seconds=settings.TRANSCRIPTION_VAD_PADDING_SECONDS,
+                    chunk_seconds=settings.TRANSCRIPTION_CHUNK_SECONDS,
+                    chunk_min_duration_seconds=settings.TRANSCRIPTION_CHUNK_MIN_DURATION_SECONDS,
+                    overlap_seconds=settings.TRANSCRIPTION_CHUNK_OVERLAP_SECONDS,
+                    bitrate=settings.TRANSCRIPTION_OPUS_BITRATE,
+                )
+                audio_urls = []
+                for prepared_audio in prepared:
+                    with open(prepared_audio.path, "rb") as f:
+                        audio_urls.append(
+                            await self.file_service.upload_file_to_s3(
+                                f, user_file.user_id, Path(prepared_audio.path).name
+                            )
+                        )
+        except Exception as e:
+            # Без подготовки файл уходит как есть
+            logging.warning(f"Audio preparation failed for file {user_file.id}: {str(e)}")
+            return [(user_file.file_url, None)]
+
+        logging.info(
+            f"File {user_file.id} prepared for transcription: "
+            f"{sum(p.duration for p in prepared):.1f}s of {user_file.duration}s in {len(prepared)} parts"
+        )
+        if len(prepared) == 1:
+            await self.user_file_service.update_prepared_audio(
+                user_file.id, audio_urls[0], prepared[0].offset_map
+            )
+            return [(audio_urls[0], None)]
+
+        await self.user_file_service.create_transcription_chunks(
+            user_file.id,
+            [
+                {
+                    "index": idx,
+                    "audio_url": audio_url,
+                    "offset_map": prepared_audio.offset_map,
+                    "duration": prepared_audio.duration,
+                }
+                for idx, (audio_url, prepared_audio) in enumerate(zip(audio_urls, prepared))
+            ],
+        )
+        return [(audio_url, idx) for idx, audio_url in enumerate(audio_urls)]
+
+    async def transcribe_locally(
+        self,
+        file_id: int,
+        language: str | None = None,
+        audio_file_key: str | None = None,
+        chunk_index: int | None = None,
+    ) -> bool:
+        """
+        Расшифровывает файл локальной моделью и сохраняет результат так же, как callback провайдера.
+
+        Returns:
+            True, если транскрипция сохранена
+        """
+        if not isinstance(self.transcription_backend, LocalTranscriptionBackend):
+            raise TypeError("Local transcription requires LocalTranscriptionBackend")
+
+        user_file = await self.user_file_service.get_user_file_by_id(file_id)
+        if not user_file or user_file.transcription_status != FileTranscriptionStatus.PROCESSING.value:
+            return False
+
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                audio_file_key = audio_file_key or user_file.file_url
+                audio_path = os.path.join(tmp_dir, Path(audio_file_key).name)
+                with open(audio_path, "wb") as f:
+                    file_obj = self.file_service.get_file_from_bucket("public-file", audio_file_key)
+                    f.write(file_obj.read())
+                result = await self.transcription_backend.transcribe(audio_path, language)
+        except Exception as e:
+            if chunk_index is not None:
+                await self._fail_transcription_chunk(user_file, chunk_index, str(e))
+                return False
+            logging.error(f"Local transcription failed for file {file_id}: {str(e)}")
             await self.user_file_service.update_files_transcription_status(
                 file_ids=[file_id],
                 status=FileTranscriptionStatus.FAILED
             )
+            raise
+
+        if chunk_index is not None:
+            await self.complete_transcription_chunk(user_file, chunk_index, result)
+        else:
+            await self.complete_transcription(user_file, result)
+        return True
+
+    async def ingest_transcription_callback(
+        self, user_file: UserFile, body: BinaryIO, chunk_index: int | None = None
+    ) -> None:
+        """
+        Сохраняет результат из тела callback провайдера, разбирая его потоково:
+        полный verbose_json (с таймкодами слов) не загружается в память целиком.
+        """
+        if chunk_index is not None:
+            result = await asyncio.to_thread(read_transcription_result, body)
+            await self.complete_transcription_chunk(user_file, chunk_index, result)
+            return
+
+        offset_map = user_file.transcription_offset_map
+        streamed = await asyncio.to_thread(
+            encode_transcription_stream,
+            body,
+            timestamp_remapper(offset_map) if offset_map else None,
+            user_file.duration,
+        )
+        if streamed.error is not None:
+            await self.complete_transcription(user_file, streamed.error)
+            return
+        await self._save_transcription(
+            user_file,
+            transcription_result=None,
+            transcription_text=streamed.transcription_text,
+            transcription_compact=streamed.transcription_compact,
+            transcription_index=streamed.transcription_index,
+            transcription_language=streamed.language,
+        )
+
+    async def complete_transcription_chunk(
+        self, user_file: UserFile, chunk_index: int, result: dict | str
+    ) -> None:
+        """
+        Сохраняет результат одного куска. Когда готовы все куски,
+        склеивает их и сохраняет как обычный результат расшифровки.
+        """
+        chunk = await self.user_file_service.get_transcription_chunk(user_file.id, chunk_index)
+        if not chunk:
+            logging.warning(f"Unknown transcription chunk {chunk_index} for file {user_file.id}")
+            return
+        if not isinstance(result, dict):
+            await self._fail_transcription_chunk(user_file, chunk_index, str(result))
+            return
+
+        result = remap_timestamps(result, chunk.offset_map)
+        completed_now, completed, total = await self.user_file_service.complete_transcription_chunk(
+            user_file.id, chunk_index, result
+        )
+        logging.info(f"File {user_file.id}: {completed}/{total} transcription chunks ready")
+        if not completed_now or completed < total:
+            return
+
+        chunks = await self.user_file_service.get_transcription_chunks(user_file.id)
+        merged = merge_chunk_results([chunk.result for chunk in chunks])
+        if user_file.duration:
+            merged["duration"] = user_file.duration
+        await self.complete_transcription(user_file, merged, chunks=chunks)
+
+    async def complete_transcription(
+        self,
+        user_file: UserFile,
+        result: dict | str,
+        chunks: list[TranscriptionChunk] | None = None,
+    ) -> None:
+        """
+        Сохраняет результат расшифровки и plain text, запускает генерацию
+        summary и удаляет исходный файл из S3.
+        """
+        # SRT и VTT не считаются здесь: они строятся по запросу из сегментов
+        transcription_text = None
+        if isinstance(result, dict):
+            # Таймкоды приходят во времени обрезанного файла
+            if user_file.transcription_offset_map:
+                result = remap_timestamps(result, user_file.transcription_offset_map)
+                if user_file.duration:
+                    result["duration"] = user_file.duration
+            transcription_text = self.file_service.json_to_plain_text(result)
+        await self._save_transcription(user_file, result, transcription_text, chunks=chunks)
+
+    async def _save_transcription(
+        self,
+        user_file: UserFile,
+        transcription_result: dict | str | None,
+        transcription_text: str | None,
+        transcription_compact: bytes | None = None,
+        transcription_index: bytes | None = None,
+        transcription_language: str | None = None,
+        chunks: list[TranscriptionChunk] | None = None,
+    ) -> None:
+        from src.celery.tasks import generate_file_insights
+
+        # Save transcription result
+        await self.user_file_service.make_user_file_completed(
+            file_url=user_file.file_url,
+            transcription_result=transcription_result,
+            transcription_text=transcription_text,
+            transcription_compact=transcription_compact,
+            transcription_index=transcription_index,
+            transcription_language=transcription_language,
+        )
+        await self.user_file_service.update_files_transcription_status(
+            file_ids=[user_file.id],
+            status=FileTranscriptionStatus.COMPLETED
+        )
+
+        # Summary и главы считаются один раз в воркере, а не на каждый запрос чата
+        if settings.FILE_INSIGHTS_ENABLED and transcription_text is not None:
+            try:
+                generate_file_insights.delay(file_id=user_file.id)
+            except Exception as e:
+                logging.error(f"Failed to start file insights task: {str(e)}")
+
+        if chunks:
+            await self.user_file_service.delete_transcription_chunks(user_file.id)
+
+        # Delete the audio files from S3. Исходное аудио удаляется только после пиков волны и HLS-нарезки:
+        # они считаются по нему в очереди derivatives и могут еще ждать своей очереди
+        await self.user_file_service.release_original_audio(user_file.id, self.file_service)
+        audio_urls = [user_file.prepared_audio_url]
+        audio_urls.extend(chunk.audio_url for chunk in chunks or [])
+        for file_url in filter(None, audio_urls):
+            user_id, file_name = file_url.split("/", 1)
+            try:
+                await self.file_service.delete_file_from_s3(user_id, file_name)
+            except Exception as e:
+                # Log the error but don't fail the request since we already have the transcription
+                logging.error(f"Error deleting file from S3: {str(e)}")
@@ -0,0 +1,326 @@
+import bisect
+import logging
+import os
+import subprocess
+from dataclasses import dataclass
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+# Размер блока чтения из ffmpeg: 10 секунд 16-bit PCM
+READ_BLOCK_BYTES = SAMPLE_RATE * 2 * 10
+FRAME_MS = 30
+
+
+def _decode_pcm_process(input_path: str) -> subprocess.Popen:
+    """Декодирует любой входной файл в поток 16 kHz mono s16le."""
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error",
+        "-i", input_path,
+        "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE),
+        "pipe:1",
+    ]
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def _iter_pcm_blocks(process: subprocess.Popen):
+    while True:
+        block = process.stdout.read(READ_BLOCK_BYTES)
+        if not block:
+            break
+        yield np.frombuffer(block[: len(block) - len(block) % 2], dtype=np.int16)
+    process.stdout.close()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg decode failed: {process.stderr.read().decode()}")
+
+
+def frame_energies_db(input_path: str, frame_ms: int = FRAME_MS) -> np.ndarray:
+    """
+    Энергия каждого фрейма в dBFS. Файл читается потоком,
+    в памяти держатся только блок PCM и массив энергий.
+    """
+    frame_size = SAMPLE_RATE * frame_ms // 1000
+    energies = []
+    tail = np.empty(0, dtype=np.int16)
+    for block in _iter_pcm_blocks(_decode_pcm_process(input_path)):
+        samples = np.concatenate((tail, block))
+        frames_count = len(samples) // frame_size
+        tail = samples[frames_count * frame_size:]
+        if not frames_count:
+            continue
+        frames = samples[: frames_count * frame_size].reshape(frames_count, frame_size)
+        rms = np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1))
+        energies.append(20 * np.log10(np.maximum(rms, 1.0) / 32768.0))
+    return np.concatenate(energies) if energies else np.empty(0, dtype=np.float32)
+
+
+def detect_speech_intervals(
+    energies_db: np.ndarray,
+    frame_ms: int = FRAME_MS,
+    threshold_db: float = -45.0,
+    min_silence_seconds: float = 1.0,
+    padding_seconds: float = 0.25,
+) -> list[tuple[float, float]]:
+    """
+    Энергетический VAD: отрезки речи в секундах исходного файла.
+    Вырезаются только паузы длиннее min_silence_seconds, вокруг речи остается padding.
+    """
+    if not len(energies_db):
+        return []
+    frame_seconds = frame_ms / 1000
+    # Порог подстраивается под шумовой фон записи
+    noise_floor = float(np.percentile(energies_db, 10))
+    threshold = max(threshold_db, noise_floor + 10.0)
+    voiced = energies_db > threshold
+    if not voiced.any():
+        return []
+
+    # Границы серий подряд идущих фреймов с речью
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1) * frame_seconds
+    ends = np.flatnonzero(edges == -1) * frame_seconds
+    total = len(energies_db) * frame_seconds
+
+    intervals: list[tuple[float, float]] = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        start = max(0.0, start - padding_seconds)
+        end = min(total, end + padding_seconds)
+        if intervals and start - intervals[-1][1] < min_silence_seconds:
+            intervals[-1] = (intervals[-1][0], end)
+        else:
+            intervals.append((start, end))
+    return intervals
+
+
+def _start_opus_encoder(output_path: str, bitrate: str) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            "ffmpeg", "-nostdin", "-loglevel", "error", "-y",
+            "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-i", "pipe:0",
+            "-c:a", "libopus", "-b:a", bitrate, "-application", "voip",
+            output_path,
+        ],
+        stdin=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+
+def _finish_encoder(encoder: subprocess.Popen) -> None:
+    encoder.stdin.close()
+    if encoder.wait() != 0:
+        raise RuntimeError(f"ffmpeg encode failed: {encoder.stderr.read().decode()}")
+
+
+def encode_chunks_to_opus(
+    input_path: str,
+    chunks: list[tuple[str, list[tuple[float, float]]]],
+    bitrate: str = "24k",
+) -> None:
+    """
+    Кодирует отрезки речи в 16 kHz mono Opus: каждый кусок — в свой файл.
+    Исходник декодируется один раз, энкодер куска живет только пока идут его отрезки.
+    """
+    plan = [
+        (output_path, [(int(start * SAMPLE_RATE), int(end * SAMPLE_RATE)) for start, end in intervals])
+        for output_path, intervals in chunks
+    ]
+    encoders: dict[int, subprocess.Popen] = {}
+    finished: set[int] = set()
+    position = 0
+    try:
+        for block in _iter_pcm_blocks(_decode_pcm_process(input_path)):
+            block_end = position + len(block)
+            for idx, (output_path, bounds) in enumerate(plan):
+                if idx in finished or bounds[0][0] >= block_end:
+                    continue
+                for start, end in bounds:
+                    if end <= position or start >= block_end:
+                        continue
+                    if idx not in encoders:
+                        encoders[idx] = _start_opus_encoder(output_path, bitrate)
+                    encoders[idx].stdin.write(
+                        block[max(start, position) - position: min(end, block_end) - position].tobytes()
+                    )
+                if bounds[-1][1] <= block_end and idx in encoders:
+                    _finish_encoder(encoders.pop(idx))
+                    finished.add(idx)
+            position = block_end
+        # Отрезки, которые заканчиваются после конца декодированного потока
+        for idx in list(encoders):
+            _finish_encoder(encoders.pop(idx))
+    finally:
+        for encoder in encoders.values():
+            encoder.kill()
+
+
+def split_into_chunks(
+    intervals: list[tuple[float, float]],
+    chunk_seconds: float,
+    overlap_seconds: float = 1.0,
+) -> list[list[tuple[float, float]]]:
+    """
+    Группирует отрезки речи в куски примерно по chunk_seconds, разрезая по паузам.
+    Сплошную речь длиннее куска режет по времени с небольшим перекрытием,
+    дубли на стыке убираются при склейке.
+    """
+    chunks: list[list[tuple[float, float]]] = []
+    current: list[tuple[float, float]] = []
+    current_seconds = 0.0
+    for start, end in intervals:
+        while end - start > chunk_seconds:
+            if current:
+                chunks.append(current)
+                current, current_seconds = [], 0.0
+            chunks.append([(start, start + chunk_seconds)])
+            start = start + chunk_seconds - overlap_seconds
+        if current and current_seconds + (end - start) > chunk_seconds:
+            chunks.append(current)
+            current, current_seconds = [], 0.0
+        current.append((start, end))
+        current_seconds += end - start
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def build_offset_map(intervals: list[tuple[float, float]]) -> list[list[float]]:
+    """
+    Карта смещений: для каждого сохраненного отрезка [начало в обрезанном файле, начало в исходном].
+    """
+    offset_map = []
+    trimmed_position = 0.0
+    for start, end in intervals:
+        offset_map.append([round(trimmed_position, 3), round(start, 3)])
+        trimmed_position += end - start
+    return offset_map
+
+
+@dataclass
+class PreparedAudio:
+    path: str
+    offset_map: list[list[float]]
+    duration: float
+
+
+def prepare_transcription_audio(
+    input_path: str,
+    output_dir: str,
+    stem: str,
+    vad_enabled: bool = True,
+    threshold_db: float = -45.0,
+    min_silence_seconds: float = 1.0,
+    padding_seconds: float = 0.25,
+    chunk_seconds: float = 0,
+    chunk_min_duration_seconds: float = 0,
+    overlap_seconds: float = 1.0,
+    bitrate: str = "24k",
+) -> list[PreparedAudio]:
+    """
+    Вырезает длинные паузы, при необходимости режет длинную запись на куски
+    и кодирует результат в Opus.
+
+    Returns:
+        Подготовленные файлы по порядку, у каждого своя карта смещений
+    """
+    energies = frame_energies_db(input_path)
+    if vad_enabled:
+        intervals = detect_speech_intervals(
+            energies,
+            threshold_db=threshold_db,
+            min_silence_seconds=min_silence_seconds,
+            padding_seconds=padding_seconds,
+        )
+        if not intervals:
+            raise ValueError("No speech detected")
+    else:
+        intervals = [(0.0, len(energies) * FRAME_MS / 1000)]
+
+    speech_seconds = sum(end - start for start, end in intervals)
+    if chunk_seconds and speech_seconds > chunk_min_duration_seconds:
+        groups = split_into_chunks(intervals, chunk_seconds, overlap_seconds)
+    else:
+        groups = [intervals]
+
+    outputs = [
+        (os.path.join(output_dir, f"{stem}_speech_{idx}.ogg" if len(groups) > 1 else f"{stem}_speech.ogg"), group)
+        for idx, group in enumerate(groups)
+    ]
+    encode_chunks_to_opus(input_path, outputs, bitrate=bitrate)
+    logger.info(f"VAD: kept {len(intervals)} intervals, {speech_seconds:.1f}s in {len(groups)} chunks")
+    return [
+        PreparedAudio(
+            path=output_path,
+            offset_map=build_offset_map(group),
+            duration=sum(end - start for start, end in group),
+        )
+        for output_path, group in outputs
+    ]
+
+
+def timestamp_remapper(offset_map: list[list[float]]):
+    """
+    Функция, переводящая таймкоды сегмента (и его слов) из времени обрезанного файла во время исходного.
+    """
+    trimmed_starts = [item[0] for item in offset_map]
+
+    def to_original(t: float, is_end: bool = False) -> float:
+        # Конец, попавший ровно на стык, относится к предыдущему отрезку
+        idx = (bisect.bisect_left if is_end else bisect.bisect_right)(trimmed_starts, t) - 1
+        idx = max(idx, 0)
+        trimmed_start, original_start = offset_map[idx]
+        return round(original_start + (t - trimmed_start), 3)
+
+    def remap(item: dict) -> dict:
+        item["start"] = to_original(item["start"])
+        item["end"] = to_original(item["end"], is_end=True)
+        for word in item.get("words") or []:
+            remap(word)
+        return item
+
+    return remap
+
+
+def remap_timestamps(result: dict, offset_map: list[list[float]]) -> dict:
+    """
+    Переводит таймкоды сегментов (и слов) из времени обрезанного файла во время исходного.
+    """
+    if not offset_map:
+        return result
+    remap = timestamp_remapper(offset_map)
+    for segment in result.get("segments") or []:
+        remap(segment)
+    for word in result.get("words") or []:
+        remap(word)
+    return result
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def merge_chunk_results(results: list[dict], tolerance_seconds: float = 0.05) -> dict:
+    """
+    Склеивает verbose_json кусков (таймкоды уже во времени исходного файла) в один результат.
+    Сегменты из перекрытия на стыке, повторяющие предыдущий, отбрасываются.
+    """
+    segments: list[dict] = []
+    for result in results:
+        for segment in result.get("segments") or []:
+            if segments and segment["start"] < segments[-1]["end"] - tolerance_seconds:
+                last = segments[-1]
+                if segment["end"] <= last["end"] or _normalize_text(segment["text"]) in _normalize_text(last["text"]):
+                    continue
+                segment["start"] = last["end"]
+            segments.append(segment)
+
+    for idx, segment in enumerate(segments):
+        segment["id"] = idx
+    return {
+        "task": "transcribe",
+        "language": next((r.get("language") for r in results if r.get("language")), None),
+        "duration": segments[-1]["end"] if segments else 0.0,
+        "text": "".join(segment["text"] for segment in segments).strip(),
+        "segments": segments,
+    }
@@ -0,0 +1,82 @@
+import hashlib
+import logging
+from dataclasses import dataclass
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+# Версия построения контекста для OpenAI. Повышается при изменении
+# системного промпта, чтобы не отдавать ответы, полученные по старому промпту
+CHAT_CONTEXT_VERSION = 2
+
+
+@dataclass
+class ChatAnswerCacheService:
+    """
+    Кэш ответов ассистента на типовые вопросы по файлу.
+
+    Ответы одного файла лежат в одном Redis hash, поэтому при изменении
+    транскрипции весь кэш файла сбрасывается одной командой DEL.
+    """
+
+    redis: Redis
+    ttl_seconds: int
+
+    @staticmethod
+    def _file_key(file_id: int) -> str:
+        return f"chat:answers:{file_id}"
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Приводит вопрос к нижнему регистру, схлопывает пробелы и убирает концевую пунктуацию."""
+        return " ".join(question.lower().split()).strip(" .,!?;:…")
+
+    def _answer_field(self, context_text: str, model: str, question: str) -> str:
+        # Контекст — весь системный промпт: транскрипция, summary и главы.
+        # Ответ, полученный до появления summary, не отдается после него
+        context_hash = hashlib.sha256(context_text.encode()).hexdigest()
+        raw = "|".join(
+            (
+                context_hash,
+                model,
+                str(CHAT_CONTEXT_VERSION),
+                self.normalize_question(question),
+            )
+        )
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def get_answer(
+        self, file_id: int, context_text: str, model: str, question: str
+    ) -> str | None:
+        field = self._answer_field(context_text, model, question)
+        try:
+            answer = await self.redis.hget(self._file_key(file_id), field)
+        except RedisError as e:
+            logging.warning(f"Chat answer cache is unavailable: {str(e)}")
+            return None
+        return answer.decode() if answer is not None else None
+
+    async def set_answer(
+        self,
+        file_id: int,
+        context_text: str,
+        model: str,
+        question: str,
+        answer: str,
+    ) -> None:
+        key = self._file_key(file_id)
+        field = self._answer_field(context_text, model, question)
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, field, answer)
+                pipe.expire(key, self.ttl_seconds)
+                await pipe.execute()
+        except RedisError as e:
+            logging.warning(f"Failed to cache chat answer: {str(e)}")
+
+    async def invalidate(self, file_id: int) -> None:
+        """Сбрасывает все закэшированные ответы по файлу."""
+        try:
+            await self.redis.delete(self._file_key(file_id))
+        except RedisError as e:
+            logging.error(f"Failed to invalidate chat answer cache: {str(e)}")
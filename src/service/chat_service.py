@@ -1,3 +1,4 @@
+import logging
 from dataclasses import dataclass
 from typing import Dict, Optional, Tuple
 
@@ -5,183 +6,272 @@ from typing import Dict, Optional, Tuple
 from src.client.openai_client import OpenAIClient
 from src.models.chat import ChatMessage, ChatSession, ChatSenderType
 from src.models.file import UserFile
-from src.repository.chat_repository import ChatRepository
-from src.repository.products_repository import ProductsRepository
-from src.repository.user_products_repository import UserProductsRepository
+from src.repository.chat_repository import ChatContext, ChatRepository
+from src.service.chat_answer_cache_service import ChatAnswerCacheService
+from src.service.file_service import FileService
 from src.schemas import GPTModelType, GPT_MODEL_NAME_TO_OPENAI_MODEL
+from src.settings import settings
+
+# Сколько последних сообщений сессии отправляется в OpenAI как контекст
+CHAT_HISTORY_LIMIT = 10
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant "
+    "about an audio file. Merge the previous summary with the new messages into one "
+    "concise summary. Keep facts, user preferences, open questions and answers given. "
+    "Reply in the language of the conversation with the summary only."
+)
 
 
 @dataclass
 class ChatService:
     chat_repository: ChatRepository
     openai_client: OpenAIClient
-    user_products_repository: UserProductsRepository
-    product_repository: ProductsRepository
+    answer_cache: ChatAnswerCacheService
 
-    async def get_or_create_chat_session(self, user_file_id: int) -> ChatSession:
+    async def get_or_create_chat_session(
+        self, user_file_id: int, user_id: int
+    ) -> ChatSession:
         """Get an existing chat session or create a new one if none exists."""
-        session = await self.chat_repository.get_chat_session(user_file_id)
+        session = await self.chat_repository.get_chat_session(user_file_id, user_id)
         if not session:
-            session = await self.chat_repository.create_chat_session(user_file_id)
+            session = await self.chat_repository.create_chat_session(
+                user_file_id, user_id
+            )
         return session
 
-    async def save_user_message(self, session_id: int, content: str) -> ChatMessage:
-        """Save a user message to the database."""
-        return await self.chat_repository.create_chat_message(
-            session_id=session_id, sender=ChatSenderType.USER.value, content=content
-        )
-
-    async def save_assistant_message(
-        self, session_id: int, content: str
-    ) -> ChatMessage:
-        """Save an assistant message to the database."""
-        return await self.chat_repository.create_chat_message(
-            session_id=session_id,
-            sender=ChatSenderType.ASSISTANT.value,
-            content=content,
-        )
-
     async def get_user_file(self, file_id: int) -> Optional[UserFile]:
         """Get a user file by ID."""
         return await self.chat_repository.get_user_file(file_id)
 
-    async def check_gpt_limits(
-        self, user_id: int, file_id: int
-    ) -> Tuple[bool, str, Optional[int]]:
+    async def get_chat_context(self, file_id: int) -> Optional[ChatContext]:
+        """Get the file, session, limits and recent messages needed to process a message."""
+        # Новое сообщение пользователя само входит в окно контекста
+        return await self.chat_repository.get_chat_context(
+            file_id, messages_limit=CHAT_HISTORY_LIMIT - 1
+        )
+
+    def check_gpt_limits(self, context: ChatContext) -> Tuple[bool, str]:
         """
         Проверяет, не превышены ли лимиты GPT-запросов для пользователя.
 
         Args:
-            user_id: ID пользователя
-            file_id: ID файла, для которого делается запрос
+            context: Контекст чата с лимитами подписки и счетчиком сообщений
 
         Returns:
-            Tuple из (can_use_gpt, message, session_id):
+            Tuple из (can_use_gpt, message):
             - can_use_gpt: True если пользователь может использовать GPT, False в противном случае
             - message: Сообщение с причиной, если GPT недоступен
-            - session_id: ID сессии чата, если существует
         """
-        # Получаем активную подписку пользователя
-        active_product = await self.user_products_repository.get_user_subscriptions(
-            user_id, is_active=True
-        )
-
-        if not active_product:
+        if not context.has_subscription:
             return (
                 False,
                 "У вас нет активной подписки для использования GPT-ассистента",
-                None,
             )
 
-        # Получаем информацию о продукте
-        product_info = await self.product_repository.get_by_id(
-            active_product[0].product_id
-        )
-
-        if not product_info:
-            return False, "Не удалось найти информацию о вашей подписке", None
-
         # Проверяем, включен ли GPT в подписку
-        if product_info.gpt_request_limit_one_file is None:
-            return False, "GPT-ассистент не включен в вашу подписку", None
+        limit = context.gpt_request_limit_one_file
+        if limit is None:
+            return False, "GPT-ассистент не включен в вашу подписку"
 
         # Если лимит равен 0, значит неограниченное количество запросов
-        if product_info.gpt_request_limit_one_file == 0:
-            # Получаем ID сессии, если она существует
-            message_count, session_id = (
-                await self.chat_repository.get_user_message_count(file_id)
-            )
-            return True, "", session_id
-
-        # Получаем количество сообщений и ID сессии одним запросом
-        message_count, session_id = await self.chat_repository.get_user_message_count(
-            file_id
-        )
-
-        if message_count >= product_info.gpt_request_limit_one_file:
+        if limit != 0 and context.user_message_count >= limit:
             return (
                 False,
-                f"Вы достигли лимита запросов ({product_info.gpt_request_limit_one_file}) к GPT-ассистенту для этого файла",
-                session_id,
+                f"Вы достигли лимита запросов ({limit}) к GPT-ассистенту для этого файла",
             )
 
-        return True, "", session_id
+        return True, ""
 
     async def process_message(
-        self, file_id: int, message_content: str, user_id: int, model_type: GPTModelType
+        self, context: ChatContext, message_content: str, model_type: GPTModelType
     ) -> Dict:
         """Process a user message, get an assistant response, and save both to the database."""
-        # Get user file
-        user_file = await self.get_user_file(file_id)
-        if not user_file:
-            raise ValueError(f"User file with ID {file_id} not found.")
-
-        # Проверяем лимиты GPT и получаем ID существующей сессии, если она есть
-        can_use_gpt, limit_message, existing_session_id = await self.check_gpt_limits(
-            user_id, file_id
-        )
+        can_use_gpt, limit_message = self.check_gpt_limits(context)
         if not can_use_gpt:
             return {"message": limit_message, "error": True, "limit_exceeded": True}
 
-        # Получаем или создаем сессию чата
-        session = None
-        if existing_session_id:
-            # Используем существующую сессию или создаем новую, если потребуется
-            # Начало - получаем саму сессию целиком, а не только ID
-            session = await self.get_or_create_chat_session(file_id)
-        else:
-            # Создаем новую сессию, так как существующей нет
-            session = await self.chat_repository.create_chat_session(file_id)
-
-        # Save user message
-        await self.save_user_message(session.id, message_content)
-
         # Create context with transcription if available
         system_message = "You are a helpful assistant analyzing audio files. "
-        if user_file.transcription:
+        transcription_text = context.transcription_text or ""
+        if not transcription_text and context.transcription_compact is not None:
+            transcription_text = FileService.json_to_plain_text(
+                FileService.decode_transcript(context.transcription_compact)
+            )
+        elif not transcription_text and context.transcription:
             transcription_text = self._extract_transcription_text(
-                user_file.transcription
+                context.transcription
+            )
+        if context.file_summary:
+            system_message += f"Summary of the audio file: {context.file_summary} "
+        if context.chapters:
+            outline = "; ".join(
+                f"{FileService.format_timestamp(chapter['start'], use_comma=False)[:8]} {chapter['title']}"
+                for chapter in context.chapters
             )
+            system_message += f"Chapters of the audio file: {outline} "
+        if transcription_text:
             system_message += (
                 f"Here is the transcription of the audio file: {transcription_text}"
             )
 
-        # Get previous messages
-        previous_messages = await self.chat_repository.get_chat_messages(session.id)
-
-        # Format messages for OpenAI
+        # Format messages for OpenAI: system, summary of earlier turns,
+        # last messages and the new user message
         openai_messages = [{"role": "system", "content": system_message}]
-
-        # Add previous messages (limit to last 10 for context)
-        for prev_msg in previous_messages[-10:]:
+        if context.summary:
+            openai_messages.append(
+                {
+                    "role": "system",
+                    "content": f"Summary of the earlier conversation: {context.summary}",
+                }
+            )
+        for prev_msg in context.messages:
             role = (
-                "user" if prev_msg.sender == ChatSenderType.USER.value else "assistant"
+                "user"
+                if prev_msg["sender"] == ChatSenderType.USER.value
+                else "assistant"
+            )
+            openai_messages.append({"role": role, "content": prev_msg["content"]})
+        openai_messages.append({"role": "user", "content": message_content})
+
+        openai_model = GPT_MODEL_NAME_TO_OPENAI_MODEL[model_type]
+
+        # Ответ на первый вопрос зависит только от системного промпта файла и вопроса,
+        # поэтому его можно взять из кэша
+        is_cacheable = not context.messages and not context.summary
+        assistant_response = None
+        if is_cacheable:
+            assistant_response = await self.answer_cache.get_answer(
+                context.file_id, system_message, openai_model, message_content
             )
-            openai_messages.append({"role": role, "content": prev_msg.content})
 
         # Get response from OpenAI
-        assistant_response = await self.openai_client.get_chat_response(openai_messages, openai_model=GPT_MODEL_NAME_TO_OPENAI_MODEL[model_type])
+        if assistant_response is None:
+            assistant_response = await self.openai_client.get_chat_response(openai_messages, openai_model=openai_model)
+            if is_cacheable:
+                await self.answer_cache.set_answer(
+                    context.file_id,
+                    system_message,
+                    openai_model,
+                    message_content,
+                    assistant_response,
+                )
+
+        # Save user message and assistant response in one transaction
+        session_id = await self.chat_repository.save_chat_exchange(
+            user_file_id=context.file_id,
+            user_id=context.user_id,
+            session_id=context.session_id,
+            user_content=message_content,
+            assistant_content=assistant_response,
+        )
 
-        # Save assistant response
-        await self.save_assistant_message(session.id, assistant_response)
+        history = context.messages + [
+            {"sender": ChatSenderType.USER.value, "content": message_content},
+            {"sender": ChatSenderType.ASSISTANT.value, "content": assistant_response},
+        ]
+        self._schedule_summary_if_needed(session_id, history)
 
         return {"message": assistant_response, "error": False, "limit_exceeded": False}
 
-    async def get_chat_history(self, file_id: int) -> Optional[ChatSession]:
-        """Get chat history for a file, including all messages."""
-        # Get user file
-        user_file = await self.get_user_file(file_id)
-        if not user_file:
-            raise ValueError(f"User file with ID {file_id} not found.")
+    def _schedule_summary_if_needed(self, session_id: int, history: list[dict]) -> None:
+        """
+        Ставит задачу сжатия переписки, если несжатая история превысила порог токенов
+        или перестает помещаться в окно контекста.
+        """
+        tokens = sum(self._estimate_tokens(msg["content"]) for msg in history)
+        if (
+            tokens < settings.CHAT_SUMMARY_TOKEN_THRESHOLD
+            and len(history) < CHAT_HISTORY_LIMIT
+        ):
+            return
+
+        from src.celery.tasks import summarize_chat_session
+
+        try:
+            summarize_chat_session.delay(session_id=session_id)
+        except Exception as e:
+            # Summary не критичен для ответа пользователю
+            logging.error(f"Failed to start chat summary task: {str(e)}")
+
+    async def summarize_session(self, session_id: int) -> bool:
+        """
+        Сворачивает старые сообщения сессии в summary, оставляя последние
+        CHAT_SUMMARY_KEEP_MESSAGES сообщений как есть. За один запуск сворачиваются самые старые
+        сообщения на CHAT_SUMMARY_BATCH_TOKENS токенов, за остальными ставится следующий запуск.
 
-        # Get or create chat session
-        session = await self.get_or_create_chat_session(file_id)
+        Returns:
+            True, если summary обновлен
+        """
+        session = await self.chat_repository.get_chat_session_by_id(session_id)
+        if not session:
+            return False
+
+        messages = await self.chat_repository.get_chat_messages_after(
+            session_id, session.summarized_until_message_id
+        )
+        keep = settings.CHAT_SUMMARY_KEEP_MESSAGES
+        to_summarize = messages[:-keep] if keep else messages
+        if not to_summarize:
+            return False
+        batch = self._take_summary_batch(to_summarize, settings.CHAT_SUMMARY_BATCH_TOKENS)
+
+        # Одно сообщение больше бюджета целиком не отправляется
+        max_chars = settings.CHAT_SUMMARY_BATCH_TOKENS * 4
+        dialog = "\n".join(f"{msg.sender}: {msg.content[:max_chars]}" for msg in batch)
+        summary = await self.openai_client.get_chat_response(
+            [
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {
+                    "role": "user",
+                    "content": (
+                        f"Previous summary:\n{session.summary or '-'}\n\n"
+                        f"New messages:\n{dialog}"
+                    ),
+                },
+            ],
+            openai_model=settings.OPENAI_SUMMARY_MODEL,
+        )
+
+        updated = await self.chat_repository.update_chat_summary(
+            session_id=session_id,
+            summary=summary,
+            summarized_until_message_id=batch[-1].id,
+            previous_until_message_id=session.summarized_until_message_id,
+        )
+        if updated and len(batch) < len(to_summarize):
+            from src.celery.tasks import summarize_chat_session
+
+            try:
+                summarize_chat_session.delay(session_id=session_id)
+            except Exception as e:
+                # Оставшиеся сообщения свернет запуск после следующего ответа
+                logging.error(f"Failed to continue chat summary task: {str(e)}")
+        return updated
+
+    def _take_summary_batch(self, messages: list[ChatMessage], max_tokens: int) -> list[ChatMessage]:
+        """Самые старые сообщения, помещающиеся в max_tokens, но хотя бы одно"""
+        tokens = 0
+        for count, msg in enumerate(messages):
+            tokens += self._estimate_tokens(msg.content)
+            if tokens > max_tokens and count:
+                return messages[:count]
+        return messages
+
+    async def get_chat_history(self, user_file: UserFile) -> ChatSession:
+        """Get chat history for a file, including all messages."""
+        session = await self.get_or_create_chat_session(user_file.id, user_file.user_id)
 
         # Make sure we fetch all messages
         session.messages = await self.chat_repository.get_chat_messages(session.id)
 
         return session
 
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Грубая оценка числа токенов: ~4 символа на токен."""
+        return len(text) // 4 + 1
+
     def _extract_transcription_text(self, transcription: dict) -> str:
         """Extract text from transcription object."""
         if not transcription:
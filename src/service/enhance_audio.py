@@ -163,5 +163,6 @@ async def enhance_audio_async(file_id: int, user_id: int, file_url: str, preset:
         raise
 
     finally:
+        await file_service.metadata_cache.redis.aclose()
         shutil.rmtree(tmp_dir, ignore_errors=True)
         logging.info(f"[CLEANUP] Removed temp dir: {tmp_dir}")
@@ -0,0 +1,156 @@
+import logging
+from dataclasses import dataclass
+
+import orjson
+
+from src.client.openai_client import OpenAIClient
+from src.models.enums import FileInsightsStatus
+from src.service.file_service import FileService
+from src.service.user_file_service import UserFileService
+from src.settings import settings
+
+# Не больше стольких блоков с таймкодами отправляем в модель
+MAX_TIMELINE_BLOCKS = 120
+MIN_BLOCK_SECONDS = 30.0
+
+INSIGHTS_SYSTEM_PROMPT = (
+    "You analyze transcripts of audio files. The transcript is given as lines "
+    "'[HH:MM:SS] text'. Reply with a JSON object only: "
+    '{"summary": "<concise summary of the whole recording>", '
+    '"chapters": [{"start": "<HH:MM:SS of the first line of the chapter>", '
+    '"title": "<short chapter title>"}]}. '
+    "Chapters must follow the order of the recording and cover it completely. "
+    "Write in the language of the transcript."
+)
+
+
+@dataclass
+class FileInsightsService:
+    """Однократная генерация summary, глав и plain text по готовой транскрипции."""
+
+    openai_client: OpenAIClient
+    user_file_service: UserFileService
+
+    async def generate_insights(self, file_id: int) -> bool:
+        """
+        Генерирует и сохраняет summary, главы с таймкодами и plain text файла.
+
+        Returns:
+            True, если артефакты сохранены
+        """
+        user_file = await self.user_file_service.get_user_file_by_id(file_id)
+        transcription = FileService.get_transcription(user_file) if user_file else None
+        if not isinstance(transcription, dict):
+            return False
+
+        segments = transcription.get("segments") or []
+        transcription_text = FileService.json_to_plain_text(transcription)
+        if not segments or not transcription_text:
+            return False
+
+        await self.user_file_service.update_insights_status(
+            file_id, FileInsightsStatus.PROCESSING
+        )
+        try:
+            response = await self.openai_client.get_chat_response(
+                [
+                    {"role": "system", "content": INSIGHTS_SYSTEM_PROMPT},
+                    {"role": "user", "content": self._build_timeline(segments)},
+                ],
+                openai_model=settings.OPENAI_SUMMARY_MODEL,
+            )
+            summary, chapters = self._parse_response(response, segments)
+            await self.user_file_service.save_file_insights(
+                file_id=file_id,
+                summary=summary,
+                chapters=chapters,
+                transcription_text=transcription_text,
+            )
+        except Exception:
+            await self.user_file_service.update_insights_status(
+                file_id, FileInsightsStatus.FAILED
+            )
+            raise
+        return True
+
+    @staticmethod
+    def _build_timeline(segments: list[dict]) -> str:
+        """
+        Склеивает сегменты в блоки с таймкодами, чтобы длинная запись
+        помещалась в контекст модели.
+        """
+        total_duration = float(segments[-1].get("end", 0.0))
+        block_seconds = max(MIN_BLOCK_SECONDS, total_duration / MAX_TIMELINE_BLOCKS)
+        max_block_chars = settings.FILE_INSIGHTS_MAX_CHARS // MAX_TIMELINE_BLOCKS
+
+        lines = []
+        block_start = None
+        block_texts: list[str] = []
+        for seg in segments:
+            start = float(seg.get("start", 0.0))
+            if block_start is not None and start - block_start >= block_seconds:
+                lines.append(FileInsightsService._timeline_line(block_start, block_texts, max_block_chars))
+                block_start, block_texts = None, []
+            if block_start is None:
+                block_start = start
+            block_texts.append(seg.get("text", "").strip())
+        if block_start is not None:
+            lines.append(FileInsightsService._timeline_line(block_start, block_texts, max_block_chars))
+        return "\n".join(lines)
+
+    @staticmethod
+    def _timeline_line(start: float, texts: list[str], max_chars: int) -> str:
+        timestamp = FileService.format_timestamp(start, use_comma=False)[:8]
+        return f"[{timestamp}] {' '.join(texts)[:max_chars]}"
+
+    @staticmethod
+    def _parse_timestamp(value) -> float:
+        if isinstance(value, (int, float)):
+            return float(value)
+        seconds = 0.0
+        for part in str(value).split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds
+
+    def _parse_response(
+        self, response: str, segments: list[dict]
+    ) -> tuple[str, list[dict]]:
+        """Разбирает JSON-ответ модели в summary и отсортированные главы с концом каждой главы."""
+        content = response.strip()
+        # Модель иногда оборачивает JSON в markdown-блок
+        if content.startswith("```"):
+            content = content.strip("`")
+            content = content[content.find("{"):]
+        try:
+            data = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            logging.warning("Insights response is not a JSON, saving it as summary")
+            return response, []
+        if not isinstance(data, dict):
+            logging.warning("Insights response is not a JSON object, saving it as summary")
+            return response, []
+
+        total_duration = float(segments[-1].get("end", 0.0))
+        starts = []
+        chapters = data.get("chapters")
+        for chapter in chapters if isinstance(chapters, list) else []:
+            if not isinstance(chapter, dict):
+                continue
+            try:
+                start = self._parse_timestamp(chapter.get("start", 0))
+            except (TypeError, ValueError):
+                continue
+            title = str(chapter.get("title", "")).strip()
+            if title and 0 <= start <= total_duration:
+                starts.append((start, title))
+        starts.sort(key=lambda item: item[0])
+
+        chapters = [
+            {
+                "start": start,
+                "end": starts[idx + 1][0] if idx + 1 < len(starts) else total_duration,
+                "title": title,
+            }
+            for idx, (start, title) in enumerate(starts)
+        ]
+        return str(data.get("summary", "")).strip(), chapters
@@ -1,14 +1,136 @@
+import asyncio
+import io
+import re
+import shutil
+import struct
+import textwrap
+import zlib
+from array import array
+from collections.abc import Sequence
 from dataclasses import dataclass
-from datetime import timedelta
 from typing import BinaryIO
 
+import numpy as np
+import orjson
 
 from src.client.s3_client import S3Client
+from src.models import UserFile
+from src.service.object_metadata_cache import ObjectMetadata, ObjectMetadataCache
+
+_DIGITS = np.frombuffer(b"0123456789", dtype=np.uint8)
+
+# Компактная транскрипция: MAGIC + zlib(заголовок, meta JSON, колонки таймкодов, смещения, UTF-8 текст).
+# JAT1 хранил таймкоды в float32 и терял поля сегментов кроме start/end/text, он только читается
+TRANSCRIPT_MAGIC = b"JAT2"
+_TRANSCRIPT_TIME_DTYPES = {b"JAT1": "<f4", TRANSCRIPT_MAGIC: "<f8"}
+# Поля, которые хранятся в колонках; остальные поля сегментов и слов уходят в meta
+_SEGMENT_COLUMNS = ("start", "end", "text", "words")
+_WORD_COLUMNS = ("start", "end", "word")
+_TRANSCRIPT_HEADER = struct.Struct("<III")
+_WORD_RE = re.compile(r"\w+")
+
+
+class TranscriptEncoder:
+    """
+    Пошаговая сборка компактной транскрипции: сегменты добавляются по одному,
+    в памяти держатся только колонки таймкодов и текст, без дерева verbose_json.
+    """
+
+    def __init__(self):
+        self.segment_times = array("d")
+        self.segment_lengths = array("I")
+        self.segment_words = array("I")
+        self.segment_text = io.BytesIO()
+        self.word_times = array("d")
+        self.word_lengths = array("I")
+        self.word_text = io.BytesIO()
+        self.top_level_words = False
+        # Прочие поля (seek, tokens, avg_logprob, probability, ...) по номеру сегмента или слова
+        self.segment_extra: dict[str, dict] = {}
+        self.word_extra: dict[str, dict] = {}
+
+    @property
+    def segments_count(self) -> int:
+        return len(self.segment_lengths)
+
+    @property
+    def words_count(self) -> int:
+        return len(self.word_lengths)
+
+    def _add_word(self, word: dict) -> None:
+        extra = {key: value for key, value in word.items() if key not in _WORD_COLUMNS}
+        if extra:
+            self.word_extra[str(self.words_count)] = extra
+        self.word_times.extend((word["start"], word["end"]))
+        self.word_lengths.append(self.word_text.write((word.get("word") or "").encode()))
+
+    def add_segment(self, segment: dict) -> None:
+        extra = {key: value for key, value in segment.items() if key not in _SEGMENT_COLUMNS}
+        # id совпадает с порядковым номером почти всегда, тогда его хранить не нужно
+        if extra.get("id") == self.segments_count:
+            del extra["id"]
+        if "words" in segment and not segment["words"]:
+            extra["words"] = segment["words"]
+        if extra:
+            self.segment_extra[str(self.segments_count)] = extra
+        self.segment_times.extend((segment["start"], segment["end"]))
+        self.segment_lengths.append(self.segment_text.write(segment["text"].encode()))
+        words = segment.get("words") or []
+        for word in words:
+            self._add_word(word)
+        self.segment_words.append(len(words))
+
+    def add_word(self, word: dict) -> None:
+        """Слово из верхнеуровневого списка words (таймкоды слов без привязки к сегментам)."""
+        self.top_level_words = True
+        self._add_word(word)
+
+    def finish(self, meta: dict) -> bytes:
+        if self.top_level_words:
+            meta = {**meta, "_top_level_words": True}
+        if self.segment_extra:
+            meta = {**meta, "_segment_extra": self.segment_extra}
+        if self.word_extra:
+            meta = {**meta, "_word_extra": self.word_extra}
+        meta_bytes = orjson.dumps(meta)
+        segment_times = np.frombuffer(self.segment_times, dtype=np.float64).reshape(-1, 2)
+        word_times = np.frombuffer(self.word_times, dtype=np.float64).reshape(-1, 2)
+        text_ends = np.cumsum(
+            np.concatenate(
+                (
+                    np.frombuffer(self.segment_lengths, dtype=np.uint32),
+                    np.frombuffer(self.word_lengths, dtype=np.uint32),
+                )
+            ),
+            dtype=np.uint32,
+        )
+        word_ends = np.cumsum(np.frombuffer(self.segment_words, dtype=np.uint32), dtype=np.uint32)
+
+        compressor = zlib.compressobj(6)
+        parts = [
+            _TRANSCRIPT_HEADER.pack(self.segments_count, self.words_count, len(meta_bytes)),
+            meta_bytes,
+            segment_times[:, 0].astype("<f8").tobytes(),
+            segment_times[:, 1].astype("<f8").tobytes(),
+            word_times[:, 0].astype("<f8").tobytes(),
+            word_times[:, 1].astype("<f8").tobytes(),
+            text_ends.astype("<u4").tobytes(),
+            word_ends.astype("<u4").tobytes(),
+            self.segment_text.getbuffer(),
+            self.word_text.getbuffer(),
+        ]
+        return TRANSCRIPT_MAGIC + b"".join(compressor.compress(part) for part in parts) + compressor.flush()
 
 
 @dataclass
 class FileService:
     s3_client: S3Client
+    # Кэш stat_object для /user-files/download; сбрасывается при каждой записи и удалении объекта
+    metadata_cache: ObjectMetadataCache | None = None
+
+    async def _invalidate_metadata(self, *file_keys: str) -> None:
+        if self.metadata_cache is not None:
+            await self.metadata_cache.invalidate(self.s3_client.bucket_name, *file_keys)
 
     async def upload_file_to_s3(
         self, file_obj: BinaryIO, user_id: int, filename: str
@@ -18,14 +140,45 @@ class FileService:
         """
         file_key = f"{user_id}/{filename}"
         self.s3_client.upload_file(file_obj, file_key)
+        await self._invalidate_metadata(file_key)
+        return file_key
+
+    async def upload_object(self, file_obj: BinaryIO, file_key: str) -> str:
+        """
+        Upload a file under the exact key, e.g. next to an already uploaded file
+        """
+        self.s3_client.upload_file(file_obj, file_key)
+        await self._invalidate_metadata(file_key)
         return file_key
 
+    async def delete_prefix_from_s3(self, prefix: str) -> None:
+        """
+        Delete every object under the prefix
+        """
+        await self._invalidate_metadata(*self.s3_client.delete_prefix(prefix))
+
     def get_public_bucket(self) -> set:
         return {"public-file"}
 
     def get_object_size(self, bucket_name: str, file_key: str) -> int:
         return self.s3_client.get_object_size(bucket_name=bucket_name, object_name=file_key)
 
+    async def get_object_metadata(self, bucket_name: str, file_key: str) -> ObjectMetadata | None:
+        """
+        Size, etag, content type and last modified time of an object, None if it doesn't exist
+        """
+        if self.metadata_cache is not None:
+            return await self.metadata_cache.get(bucket_name, file_key)
+        info = await asyncio.to_thread(self.s3_client.stat_object, bucket_name, file_key)
+        if info is None:
+            return None
+        return ObjectMetadata(
+            size=info.size,
+            etag=info.etag,
+            content_type=info.content_type or "application/octet-stream",
+            last_modified=info.last_modified.timestamp() if info.last_modified else 0.0,
+        )
+
     def get_file_from_bucket(
         self,
         bucket_name: str,
@@ -35,12 +188,45 @@ class FileService:
     ):
         return self.s3_client.get_file(bucket_name, file_key, offset, length)
 
+    async def iter_file_from_bucket(
+        self,
+        bucket_name: str,
+        file_key: str,
+        offset: int | None = None,
+        length: int | None = None,
+        chunk_size: int = 64 * 1024,
+    ):
+        """
+        Read an object (or its range) chunk by chunk; blocking MinIO reads run in a thread,
+        so the event loop keeps serving other requests
+        """
+        response = await asyncio.to_thread(self.s3_client.get_file, bucket_name, file_key, offset, length)
+        try:
+            while chunk := await asyncio.to_thread(response.read, chunk_size):
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+
+    def download_file_from_bucket(self, bucket_name: str, file_key: str, path: str) -> None:
+        """
+        Save an object to a local file block by block, without reading it into memory
+        """
+        response = self.s3_client.get_file(bucket_name, file_key)
+        try:
+            with open(path, "wb") as f:
+                shutil.copyfileobj(response, f, 1024 * 1024)
+        finally:
+            response.close()
+            response.release_conn()
+
     async def delete_file_from_s3(self, user_id: str, filename: str) -> None:
         """
         Delete a file from S3
         """
         file_key = f"{user_id}/{filename}"
         self.s3_client.delete_file(file_key)
+        await self._invalidate_metadata(file_key)
 
     @staticmethod
     def format_timestamp(seconds: float, use_comma: bool = True) -> str:
@@ -50,13 +236,239 @@ class FileService:
         VTT: HH:MM:SS.mmm
         """
         total_ms = int(round(seconds * 1000))
-        td = timedelta(milliseconds=total_ms)
-        hours, remainder = divmod(td.seconds, 3600)
-        minutes, secs = divmod(remainder, 60)
-        ms = total_ms % 1000
+        secs, ms = divmod(total_ms, 1000)
+        minutes, secs = divmod(secs, 60)
+        hours, minutes = divmod(minutes, 60)
         sep = ',' if use_comma else '.'
         return f"{hours:02}:{minutes:02}:{secs:02}{sep}{ms:03}"
 
+    @staticmethod
+    def format_timestamps(seconds: Sequence[float], use_comma: bool = True) -> list[str]:
+        """
+        Векторный вариант format_timestamp для всех таймкодов транскрипции сразу:
+        цифры раскладываются в байтовый буфер фиксированной ширины без форматирования строк в цикле.
+        """
+        if not len(seconds):
+            return []
+        total_ms = np.rint(np.asarray(seconds, dtype=np.float64) * 1000).astype(np.int64)
+        hours = total_ms // 3_600_000
+        fields = [
+            (hours, max(2, len(str(int(hours.max()))))),
+            (total_ms // 60_000 % 60, 2),
+            (total_ms // 1000 % 60, 2),
+            (total_ms % 1000, 3),
+        ]
+        separators = [b":", b":", b"," if use_comma else b"."]
+        width = sum(digits for _, digits in fields) + len(separators)
+
+        buffer = np.empty((len(total_ms), width), dtype=np.uint8)
+        column = 0
+        for idx, (values, digits) in enumerate(fields):
+            for power in range(digits - 1, -1, -1):
+                buffer[:, column] = _DIGITS[values // 10 ** power % 10]
+                column += 1
+            if idx < len(separators):
+                buffer[:, column] = ord(separators[idx])
+                column += 1
+        return buffer.view(f"S{width}").ravel().astype(f"U{width}").tolist()
+
+    @staticmethod
+    def reflow_segments(
+        segments: list[dict],
+        max_line_length: int | None = None,
+        max_cps: float | None = None,
+        max_lines: int = 2,
+    ) -> list[dict]:
+        """
+        Перестраивает сегменты в субтитры: длинный сегмент разбивается на реплики
+        не длиннее max_lines строк по max_line_length символов, время делится пропорционально тексту.
+        При max_cps реплика растягивается до следующей, чтобы скорость чтения не превышала лимит.
+        """
+        cues = []
+        for seg in segments:
+            text = seg["text"].strip()
+            if not text:
+                continue
+            if not max_line_length:
+                cues.append({"start": seg["start"], "end": seg["end"], "text": text})
+                continue
+
+            lines = textwrap.wrap(text, max_line_length, break_long_words=False) or [text]
+            groups = ["\n".join(lines[i:i + max_lines]) for i in range(0, len(lines), max_lines)]
+            total_chars = sum(len(group) for group in groups)
+            start, duration = seg["start"], seg["end"] - seg["start"]
+            for group in groups:
+                end = start + duration * len(group) / total_chars
+                cues.append({"start": start, "end": end, "text": group})
+                start = end
+
+        if max_cps:
+            for idx, cue in enumerate(cues):
+                required = len(cue["text"].replace("\n", "")) / max_cps
+                if cue["end"] - cue["start"] >= required:
+                    continue
+                limit = cues[idx + 1]["start"] if idx + 1 < len(cues) else cue["start"] + required
+                cue["end"] = max(cue["end"], min(cue["start"] + required, limit))
+        return cues
+
+    @staticmethod
+    def encode_transcript(data: dict, verify: bool = False) -> bytes:
+        """
+        Упаковывает verbose_json в компактный бинарный вид: таймкоды сегментов и слов — массивы float64,
+        тексты — один UTF-8 блоб со смещениями uint32, все вместе сжато zlib.
+        Верхнеуровневые поля кроме segments/words и остальные поля сегментов и слов сохраняются как есть в meta.
+
+        Args:
+            verify: раскодировать результат и сравнить с data, прежде чем вернуть
+
+        Raises:
+            ValueError: с verify — результат раскодируется не в data
+        """
+        encoder = TranscriptEncoder()
+        segments = data.get("segments") or []
+        for segment in segments:
+            encoder.add_segment(segment)
+        if not encoder.words_count:
+            for word in data.get("words") or []:
+                encoder.add_word(word)
+        meta = {key: value for key, value in data.items() if key not in ("segments", "words", "text")}
+        # Текст обычно склеен из сегментов и восстанавливается при раскодировании
+        if "text" in data and data["text"] != "".join(segment["text"] for segment in segments).strip():
+            meta["text"] = data["text"]
+        blob = encoder.finish(meta)
+        if verify and FileService.decode_transcript(blob) != data:
+            raise ValueError("Transcript does not survive the compact round-trip")
+        return blob
+
+    @staticmethod
+    def decode_transcript(blob: bytes) -> dict:
+        """
+        Обратное преобразование encode_transcript в verbose_json.
+        В старом формате JAT1 таймкоды округляются до миллисекунд, id сегментов — порядковые номера.
+        """
+        time_dtype = _TRANSCRIPT_TIME_DTYPES.get(bytes(blob[: len(TRANSCRIPT_MAGIC)]))
+        if time_dtype is None:
+            raise ValueError("Unknown transcript format")
+        payload = zlib.decompress(blob[len(TRANSCRIPT_MAGIC):])
+        segments_count, words_count, meta_length = _TRANSCRIPT_HEADER.unpack_from(payload)
+        position = _TRANSCRIPT_HEADER.size
+        meta = orjson.loads(payload[position: position + meta_length])
+        position += meta_length
+
+        def column(dtype: str, count: int) -> np.ndarray:
+            nonlocal position
+            values = np.frombuffer(payload, dtype=dtype, count=count, offset=position)
+            position += values.nbytes
+            return values
+
+        def times(count: int) -> list[float]:
+            if time_dtype == "<f4":
+                return np.round(column(time_dtype, count).astype(np.float64), 3).tolist()
+            return column(time_dtype, count).tolist()
+
+        seg_starts, seg_ends = times(segments_count), times(segments_count)
+        word_starts, word_ends = times(words_count), times(words_count)
+        text_ends = column("<u4", segments_count + words_count).tolist()
+        words_per_segment = column("<u4", segments_count).tolist()
+        text = memoryview(payload)[position:]
+        text_starts = [0, *text_ends[:-1]]
+        texts = [bytes(text[start:end]).decode() for start, end in zip(text_starts, text_ends)]
+
+        top_level_words = meta.pop("_top_level_words", False)
+        segment_extra = meta.pop("_segment_extra", {})
+        word_extra = meta.pop("_word_extra", {})
+        words = [
+            {"word": word, "start": start, "end": end, **word_extra.get(str(idx), {})}
+            for idx, (word, start, end) in enumerate(zip(texts[segments_count:], word_starts, word_ends))
+        ]
+        segments = []
+        word_start = 0
+        for idx, (seg_text, start, end, word_end) in enumerate(
+            zip(texts[:segments_count], seg_starts, seg_ends, words_per_segment)
+        ):
+            segment = {"id": idx, "start": start, "end": end, "text": seg_text, **segment_extra.get(str(idx), {})}
+            if word_end > word_start:
+                segment["words"] = words[word_start:word_end]
+            word_start = word_end
+            segments.append(segment)
+
+        result = {"text": "".join(texts[:segments_count]).strip(), **meta, "segments": segments}
+        if top_level_words:
+            result["words"] = words
+        return result
+
+    @classmethod
+    def get_transcription(cls, user_file: UserFile) -> dict | str | None:
+        """
+        Транскрипция файла в виде verbose_json: из компактного столбца
+        или из JSONB, если файл еще не переведен в компактный вид.
+        """
+        if user_file.transcription_compact is not None:
+            transcription = cls.decode_transcript(user_file.transcription_compact)
+        else:
+            transcription = user_file.transcription
+        if user_file.transcription_edits and isinstance(transcription, dict):
+            transcription = cls.apply_segment_edits(transcription, user_file.transcription_edits)
+        return transcription
+
+    @classmethod
+    def get_transcription_json(cls, user_file: UserFile, transcription_json: str | None) -> bytes:
+        """
+        get_transcription сразу в JSON для ответа. JSONB без правок отдается текстом
+        из Postgres (transcription_json) как есть, без разбора в объекты Python.
+        """
+        if user_file.transcription_compact is None and not user_file.transcription_edits:
+            return transcription_json.encode() if transcription_json is not None else b"null"
+        if user_file.transcription_compact is not None:
+            transcription = cls.decode_transcript(user_file.transcription_compact)
+        else:
+            transcription = orjson.loads(transcription_json) if transcription_json is not None else None
+        if user_file.transcription_edits and isinstance(transcription, dict):
+            transcription = cls.apply_segment_edits(transcription, user_file.transcription_edits)
+        return orjson.dumps(transcription)
+
+    @staticmethod
+    def apply_segment_edits(transcription: dict, edits: list[dict]) -> dict:
+        """
+        Накладывает правки сегментов ({index, start?, end?, text?}) по порядку.
+        Исходный dict не меняется: копируются только затронутые сегменты.
+        У сегмента с исправленным текстом таймкоды слов больше не соответствуют тексту и удаляются.
+        """
+        segments = list(transcription.get("segments") or [])
+        for edit in edits:
+            index = edit["index"]
+            if not 0 <= index < len(segments):
+                continue
+            segment = dict(segments[index])
+            for field in ("start", "end", "text"):
+                if field in edit:
+                    segment[field] = edit[field]
+            if "text" in edit:
+                segment.pop("words", None)
+            segments[index] = segment
+        result = {**transcription, "segments": segments}
+        if "text" in transcription:
+            result["text"] = " ".join(segment["text"].strip() for segment in segments)
+        return result
+
+    @staticmethod
+    def find_segments(transcription: dict, lexemes: list[str], limit: int) -> list[dict]:
+        """
+        Сегменты, в которых есть слово, начинающееся с одной из лексем запроса.
+        Лексемы — основы слов после стемминга Postgres, поэтому сравнение идет по префиксу.
+        """
+        prefixes = tuple(lexeme.lower() for lexeme in lexemes)
+        if not prefixes:
+            return []
+        found = []
+        for segment in transcription.get("segments") or []:
+            words = _WORD_RE.findall(segment["text"].lower())
+            if any(word.startswith(prefixes) for word in words):
+                found.append({"start": segment["start"], "end": segment["end"], "text": segment["text"].strip()})
+                if len(found) >= limit:
+                    break
+        return found
+
     @staticmethod
     def json_to_plain_text(data: dict) -> str:
         """
@@ -64,29 +476,35 @@ class FileService:
         """
         return " ".join(seg["text"].strip() for seg in data.get("segments", []))
 
-    def json_to_srt(self, data: dict) -> str:
+    def json_to_srt(
+        self, data: dict, max_line_length: int | None = None, max_cps: float | None = None
+    ) -> str:
         """
         Генерирует контент для SRT-файла.
         """
+        cues = self.reflow_segments(data.get("segments", []), max_line_length, max_cps)
+        starts = self.format_timestamps([cue["start"] for cue in cues], use_comma=True)
+        ends = self.format_timestamps([cue["end"] for cue in cues], use_comma=True)
         lines = []
-        for idx, seg in enumerate(data.get("segments", []), start=1):
-            start_ts = self.format_timestamp(seg["start"], use_comma=True)
-            end_ts = self.format_timestamp(seg["end"], use_comma=True)
+        for idx, (cue, start_ts, end_ts) in enumerate(zip(cues, starts, ends), start=1):
             lines.append(str(idx))
             lines.append(f"{start_ts} --> {end_ts}")
-            lines.append(seg["text"].strip())
+            lines.append(cue["text"])
             lines.append("")  # пустая строка-разделитель
         return "\n".join(lines)
 
-    def json_to_vtt(self, data: dict) -> str:
+    def json_to_vtt(
+        self, data: dict, max_line_length: int | None = None, max_cps: float | None = None
+    ) -> str:
         """
         Генерирует контент для VTT (WebVTT)-файла.
         """
+        cues = self.reflow_segments(data.get("segments", []), max_line_length, max_cps)
+        starts = self.format_timestamps([cue["start"] for cue in cues], use_comma=False)
+        ends = self.format_timestamps([cue["end"] for cue in cues], use_comma=False)
         lines = ["WEBVTT", ""]  # заголовок и пустая строка
-        for seg in data.get("segments", []):
-            start_ts = self.format_timestamp(seg["start"], use_comma=False)
-            end_ts = self.format_timestamp(seg["end"], use_comma=False)
+        for cue, start_ts, end_ts in zip(cues, starts, ends):
             lines.append(f"{start_ts} --> {end_ts}")
-            lines.append(seg["text"].strip())
+            lines.append(cue["text"])
             lines.append("")  # разделитель
         return "\n".join(lines)
@@ -0,0 +1,110 @@
+import os
+import subprocess
+from dataclasses import dataclass
+
+# Кодек сегментов -> (энкодер ffmpeg, строка CODECS для master playlist)
+HLS_CODECS = {
+    "aac": ("aac", "mp4a.40.2"),
+    "opus": ("libopus", "opus"),
+}
+MEDIA_PLAYLIST = "index.m3u8"
+INIT_SEGMENT = "init.mp4"
+SEGMENT_TEMPLATE = "seg_%05d.m4s"
+# Низкие битрейты кодируются в моно: это превью для медленной сети
+MONO_MAX_BITRATE_KBPS = 64
+
+
+@dataclass
+class HlsRendition:
+    name: str
+    bitrate_kbps: int
+    # Пиковый битрейт по фактическим сегментам, для BANDWIDTH в master playlist
+    bandwidth: int
+    codecs: str
+    path: str
+
+
+def _rendition_args(codec: str, bitrate_kbps: int, segment_seconds: int, output_dir: str) -> list[str]:
+    encoder, _ = HLS_CODECS[codec]
+    args = ["-map", "0:a:0", "-vn", "-c:a", encoder, "-b:a", f"{bitrate_kbps}k"]
+    if bitrate_kbps <= MONO_MAX_BITRATE_KBPS:
+        args += ["-ac", "1"]
+    if codec == "opus":
+        args += ["-ar", "48000"]
+    return args + [
+        "-f", "hls",
+        "-hls_time", str(segment_seconds),
+        "-hls_playlist_type", "vod",
+        "-hls_segment_type", "fmp4",
+        "-hls_fmp4_init_filename", INIT_SEGMENT,
+        "-hls_segment_filename", os.path.join(output_dir, SEGMENT_TEMPLATE),
+        os.path.join(output_dir, MEDIA_PLAYLIST),
+    ]
+
+
+def _peak_bandwidth(rendition_dir: str) -> int:
+    """Максимальный битрейт сегмента по длительностям из media playlist и размерам файлов."""
+    peak = 0.0
+    duration = None
+    with open(os.path.join(rendition_dir, MEDIA_PLAYLIST)) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:"):].split(",")[0])
+            elif line and not line.startswith("#") and duration:
+                peak = max(peak, os.path.getsize(os.path.join(rendition_dir, line)) * 8 / duration)
+                duration = None
+    return int(peak)
+
+
+def package_hls(
+    input_path: str,
+    output_dir: str,
+    bitrates_kbps: list[int],
+    codec: str = "aac",
+    segment_seconds: int = 4,
+) -> list[HlsRendition]:
+    """
+    Нарезает аудио на HLS-сегменты fMP4 в нескольких битрейтах за один проход ffmpeg
+    (файл декодируется один раз, каждый битрейт — отдельный выход).
+
+    Returns:
+        Варианты по возрастанию битрейта, каждый в своей папке output_dir/<битрейт>k
+    """
+    if codec not in HLS_CODECS:
+        raise ValueError(f"Unsupported HLS codec: {codec}")
+    renditions = []
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", input_path]
+    for bitrate_kbps in sorted(bitrates_kbps):
+        name = f"{bitrate_kbps}k"
+        rendition_dir = os.path.join(output_dir, name)
+        os.makedirs(rendition_dir, exist_ok=True)
+        cmd += _rendition_args(codec, bitrate_kbps, segment_seconds, rendition_dir)
+        renditions.append((name, bitrate_kbps, rendition_dir))
+
+    process = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg HLS packaging failed: {process.stderr.decode()}")
+
+    return [
+        HlsRendition(
+            name=name,
+            bitrate_kbps=bitrate_kbps,
+            bandwidth=_peak_bandwidth(rendition_dir) or bitrate_kbps * 1000,
+            codecs=HLS_CODECS[codec][1],
+            path=rendition_dir,
+        )
+        for name, bitrate_kbps, rendition_dir in renditions
+    ]
+
+
+def build_master_playlist(package_id: str, renditions: list[dict]) -> str:
+    """
+    Master playlist со ссылками относительно себя: <package_id>/<вариант>/index.m3u8.
+    Самый легкий вариант идет первым — с него плеер начинает воспроизведение.
+    """
+    lines = ["#EXTM3U", "#EXT-X-VERSION:7", "#EXT-X-INDEPENDENT-SEGMENTS"]
+    for rendition in renditions:
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={rendition["bandwidth"]},CODECS="{rendition["codecs"]}"')
+        lines.append(f'{package_id}/{rendition["name"]}/{MEDIA_PLAYLIST}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import os
+import re
+import tempfile
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+from src.models.enums import AudioSource
+from src.service.file_service import FileService
+from src.service.hls_packaging import package_hls, build_master_playlist
+from src.service.user_file_service import UserFileService, audio_source_url
+from src.settings import settings
+
+# Файлы, которые можно запросить внутри нарезки
+HLS_FILE_RE = re.compile(r"^(index\.m3u8|init\.mp4|seg_\d{5}\.m4s)$")
+HLS_MEDIA_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".mp4": "audio/mp4",
+    ".m4s": "audio/mp4",
+}
+
+
+@dataclass
+class HlsService:
+    """
+    HLS-нарезка исходного и обработанных аудио. Нарезка лежит в MinIO под
+    <аудио>.hls/<package_id>/, поэтому ее файлы не меняются и кэшируются навсегда;
+    при повторной нарезке меняется только master playlist.
+    """
+
+    file_service: FileService
+    user_file_service: UserFileService
+
+    @staticmethod
+    def package_prefix(audio_url: str, package_id: str) -> str:
+        return f"{audio_url}.hls/{package_id}/"
+
+    async def package(self, file_id: int, source: AudioSource) -> dict | None:
+        """
+        Returns:
+            Метаданные сохраненной нарезки или None, если у файла нет аудио этого источника
+        """
+        user_file = await self.user_file_service.get_user_file_by_id(file_id)
+        audio_url = audio_source_url(user_file, source) if user_file else None
+        if not audio_url:
+            return None
+
+        package_id = uuid.uuid4().hex
+        prefix = self.package_prefix(audio_url, package_id)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_path = os.path.join(tmp_dir, Path(audio_url).name)
+            self.file_service.download_file_from_bucket("public-file", audio_url, input_path)
+            output_dir = os.path.join(tmp_dir, "hls")
+            renditions = await asyncio.to_thread(
+                package_hls,
+                input_path,
+                output_dir,
+                settings.HLS_BITRATES_KBPS,
+                settings.HLS_CODEC,
+                settings.HLS_SEGMENT_SECONDS,
+            )
+            for rendition in renditions:
+                for name in sorted(os.listdir(rendition.path)):
+                    with open(os.path.join(rendition.path, name), "rb") as f:
+                        await self.file_service.upload_object(f, f"{prefix}{rendition.name}/{name}")
+
+        package = {
+            "audio_url": audio_url,
+            "package_id": package_id,
+            "renditions": [
+                {"name": rendition.name, "bandwidth": rendition.bandwidth, "codecs": rendition.codecs}
+                for rendition in renditions
+            ],
+        }
+        await self._save_package(file_id, source, package)
+        return package
+
+    async def record_failure(self, file_id: int, source: AudioSource) -> None:
+        """
+        Нарезка не удалась после всех попыток: отметка для аудио источника, чтобы исходное аудио
+        не ждало ее бесконечно. Новое аудио источника (обработка запускалась заново) нарезается снова
+        """
+        user_file = await self.user_file_service.get_user_file_by_id(file_id)
+        audio_url = audio_source_url(user_file, source) if user_file else None
+        if audio_url:
+            await self._save_package(file_id, source, {"audio_url": audio_url, "failed": True})
+
+    async def _save_package(self, file_id: int, source: AudioSource, package: dict) -> None:
+        replaced = await self.user_file_service.update_hls_package(file_id, source, package)
+        if replaced and not replaced.get("failed"):
+            try:
+                await self.file_service.delete_prefix_from_s3(
+                    self.package_prefix(replaced["audio_url"], replaced["package_id"])
+                )
+            except Exception as e:
+                logging.warning(f"Old HLS package of file {file_id} is not deleted: {str(e)}")
+        if source == AudioSource.ORIGINAL:
+            # Исходное аудио ждало этой производной, если транскрипция уже сохранена
+            await self.user_file_service.release_original_audio(file_id, self.file_service)
+
+    async def _get_package(self, user_id: int, file_id: int, source: AudioSource) -> tuple[str, dict] | None:
+        media = await self.user_file_service.get_file_media(user_id, file_id)
+        if media is None:
+            return None
+        package = (media.hls_packages or {}).get(source.value)
+        audio_url = audio_source_url(media, source)
+        # Нарезка прежнего аудио источника (обработка запускалась заново) не отдается
+        if not package or package.get("failed") or package["audio_url"] != audio_url:
+            return None
+        return audio_url, package
+
+    async def master_playlist(self, user_id: int, file_id: int, source: AudioSource) -> str | None:
+        found = await self._get_package(user_id, file_id, source)
+        if found is None:
+            return None
+        _, package = found
+        return build_master_playlist(package["package_id"], package["renditions"])
+
+    async def get_object_key(
+        self, user_id: int, file_id: int, source: AudioSource, package_id: str, rendition: str, filename: str
+    ) -> str | None:
+        """
+        Returns:
+            Ключ файла нарезки в MinIO или None, если такого файла нет у пользователя
+        """
+        if not HLS_FILE_RE.match(filename):
+            return None
+        found = await self._get_package(user_id, file_id, source)
+        if found is None:
+            return None
+        audio_url, package = found
+        if package["package_id"] != package_id or rendition not in {r["name"] for r in package["renditions"]}:
+            return None
+        return f"{self.package_prefix(audio_url, package_id)}{rendition}/{filename}"
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+import orjson
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.client.s3_client import S3Client
+
+
+@dataclass(frozen=True)
+class ObjectMetadata:
+    size: int
+    etag: str
+    content_type: str
+    # Unix time, секунды
+    last_modified: float
+
+
+# Метаданные в памяти процесса: ключ кэша -> (момент устаревания по time.monotonic(), метаданные).
+# Срок короткий: удаление ключа в Redis при перезаписи объекта не сбрасывает копии в других процессах
+_local_cache: OrderedDict[str, tuple[float, ObjectMetadata]] = OrderedDict()
+
+
+@dataclass
+class ObjectMetadataCache:
+    """
+    Кэш stat_object объектов MinIO: память процесса, затем Redis, затем сам MinIO.
+    Плеер при перемотке шлет много Range-запросов к одному объекту, и каждый
+    раньше стоил лишнего обращения к MinIO только ради размера файла.
+    """
+
+    redis: Redis
+    s3_client: S3Client
+    ttl_seconds: int
+    local_ttl_seconds: int
+    local_size: int
+
+    @staticmethod
+    def _cache_key(bucket_name: str, file_key: str) -> str:
+        return f"s3:meta:{bucket_name}:{file_key}"
+
+    def _remember(self, cache_key: str, metadata: ObjectMetadata) -> None:
+        _local_cache[cache_key] = (time.monotonic() + self.local_ttl_seconds, metadata)
+        _local_cache.move_to_end(cache_key)
+        while len(_local_cache) > self.local_size:
+            _local_cache.popitem(last=False)
+
+    async def get(self, bucket_name: str, file_key: str) -> ObjectMetadata | None:
+        """
+        Returns:
+            Метаданные объекта или None, если объекта нет (отсутствие не кэшируется)
+        """
+        cache_key = self._cache_key(bucket_name, file_key)
+        local = _local_cache.get(cache_key)
+        if local and local[0] > time.monotonic():
+            _local_cache.move_to_end(cache_key)
+            return local[1]
+
+        try:
+            cached = await self.redis.get(cache_key)
+        except RedisError as e:
+            logging.warning(f"Object metadata cache is unavailable: {str(e)}")
+            cached = None
+        if cached is not None:
+            metadata = ObjectMetadata(**orjson.loads(cached))
+        else:
+            info = await asyncio.to_thread(self.s3_client.stat_object, bucket_name, file_key)
+            if info is None:
+                return None
+            metadata = ObjectMetadata(
+                size=info.size,
+                etag=info.etag,
+                content_type=info.content_type or "application/octet-stream",
+                last_modified=info.last_modified.timestamp() if info.last_modified else 0.0,
+            )
+            try:
+                await self.redis.set(cache_key, orjson.dumps(asdict(metadata)), ex=self.ttl_seconds)
+            except RedisError as e:
+                logging.warning(f"Failed to cache object metadata: {str(e)}")
+        self._remember(cache_key, metadata)
+        return metadata
+
+    async def invalidate(self, bucket_name: str, *file_keys: str) -> None:
+        if not file_keys:
+            return
+        cache_keys = [self._cache_key(bucket_name, file_key) for file_key in file_keys]
+        for cache_key in cache_keys:
+            _local_cache.pop(cache_key, None)
+        try:
+            await self.redis.delete(*cache_keys)
+        except RedisError as e:
+            logging.warning(f"Failed to invalidate object metadata: {str(e)}")
@@ -0,0 +1,155 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from uuid import UUID, uuid4
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy.exc import NoResultFound
+
+from src.repository.payment.payment_webhook_repository import PaymentWebhookRepository
+from src.repository.payment.user_payment_repository import UserPaymentRepository
+from src.repository.products_repository import ProductsRepository
+from src.schemas.payment import CloudPaymentsCallback
+from src.service.user_products_service import UserProductsService
+from src.settings import settings
+
+CLOUDPAYMENTS_PROVIDER = "cloudpayments"
+# Сколько зависших уведомлений переставляется за один проход сверки
+PAYMENT_WEBHOOK_RECONCILE_BATCH = 500
+
+
+class PaymentWebhookRejected(Exception):
+    """Уведомление нельзя зачислить и повтор не поможет: неизвестный продукт, интервал и т.п."""
+
+
+@dataclass
+class PaymentWebhookService:
+    """
+    Уведомления об оплате: endpoint только сохраняет уведомление в payment_webhook_inbox,
+    зачисление минут и запись транзакции делает воркер одной транзакцией.
+    Все репозитории работают в одной сессии
+    """
+
+    payment_webhook_repository: PaymentWebhookRepository
+    user_payment_repository: UserPaymentRepository
+    user_products_service: UserProductsService
+    products_repository: ProductsRepository
+
+    async def accept_cloudpayments(self, callback: CloudPaymentsCallback) -> int | None:
+        """
+        Returns:
+            id записи для воркера или None, если это повтор уже принятого уведомления
+        """
+        return await self.payment_webhook_repository.add(
+            provider=CLOUDPAYMENTS_PROVIDER,
+            external_id=str(callback.TransactionId),
+            payload=callback.model_dump(mode="json"),
+        )
+
+    async def process(self, inbox_id: int) -> bool:
+        """
+        Зачисляет оплату по уведомлению. Повторный вызов для того же уведомления ничего не делает.
+
+        Returns:
+            True, если оплата зачислена этим вызовом
+        Raises:
+            PaymentWebhookRejected: уведомление помечено failed, повторять не нужно
+        """
+        db = self.payment_webhook_repository.db
+        try:
+            inbox = await self.payment_webhook_repository.lock_received(inbox_id)
+            if inbox is None:
+                # Обработано или прямо сейчас обрабатывается другим воркером
+                await db.rollback()
+                return False
+
+            callback = CloudPaymentsCallback.model_validate(inbox.payload)
+            external_id = str(callback.TransactionId)
+            # Транзакция могла быть записана до появления inbox
+            if await self.user_payment_repository.get_transaction_by_ext_id(external_id=external_id):
+                await self.payment_webhook_repository.mark_processed(inbox)
+                return False
+
+            await self.payment_webhook_repository.lock_user(callback.AccountId)
+            await self._credit(callback)
+            await self.payment_webhook_repository.mark_processed(inbox)
+        except Exception as e:
+            await db.rollback()
+            final = await self.payment_webhook_repository.record_failure(
+                inbox_id,
+                error=str(e),
+                final=isinstance(e, PaymentWebhookRejected),
+                max_attempts=settings.PAYMENT_WEBHOOK_MAX_ATTEMPTS,
+            )
+            if final and not isinstance(e, PaymentWebhookRejected):
+                logging.error(f"Payment webhook {inbox_id} failed after retries: {str(e)}")
+                raise PaymentWebhookRejected(str(e)) from e
+            raise
+        # После commit: план пользователя в кэше должен показать новый продукт
+        await self.user_products_service.invalidate_user_plan(callback.AccountId)
+        return True
+
+    async def get_stalled_ids(self) -> list[int]:
+        return await self.payment_webhook_repository.get_stalled_ids(
+            older_than_seconds=settings.PAYMENT_WEBHOOK_STALLED_SECONDS,
+            # Повтор через PAYMENT_WEBHOOK_RETRY_SECONDS плюс запас на очередь
+            retry_window_seconds=settings.PAYMENT_WEBHOOK_RETRY_SECONDS + settings.PAYMENT_WEBHOOK_STALLED_SECONDS,
+            max_attempts=settings.PAYMENT_WEBHOOK_MAX_ATTEMPTS,
+            limit=PAYMENT_WEBHOOK_RECONCILE_BATCH,
+        )
+
+    async def _credit(self, callback: CloudPaymentsCallback) -> None:
+        """Продукт пользователя и транзакция без commit: транзакцию завершает process"""
+        data = callback.Data or {}
+        try:
+            product_id = UUID(data["productId"])
+            minute_count = float(data["minuteCount"])
+            product = await self.products_repository.get_by_id(product_id)
+            recurrent = data["CloudPayments"]["recurrent"] if product.is_subs else None
+        except (KeyError, ValueError, TypeError) as e:
+            raise PaymentWebhookRejected(f"Неверный формат поля Data: {str(e)}")
+        except NoResultFound:
+            raise PaymentWebhookRejected(f"Product {product_id} not found")
+
+        user_id = callback.AccountId
+        if recurrent is not None:
+            interval = recurrent["interval"]
+            if interval == "Month":
+                expires_at = datetime.now() + relativedelta(months=1)
+            else:
+                raise PaymentWebhookRejected(f"Не корректный интервал {interval}")
+
+            user_products = await self.user_products_service.create_subscription(
+                user_id=user_id,
+                product_id=product.uuid,
+                subscription_id=callback.SubscriptionId,
+                amount=int(recurrent["amount"]) or callback.Amount,
+                expires_at=expires_at,
+                interval=interval,
+                minute_count=product.minute_count,
+                commit=False,
+            )
+        else:
+            user_products = await self.user_products_service.create_user_product(
+                user_id=user_id,
+                minute_count=product.minute_count,
+                amount=callback.Amount,
+                product_id=product_id,
+                commit=False,
+            )
+
+        await self.user_payment_repository.create_transaction(
+            uuid=uuid4(),
+            product_id=product_id,
+            user_id=user_id,
+            price=callback.Amount,
+            user_product_id=user_products.uuid,
+            external_transaction_id=str(callback.TransactionId),
+            status=callback.Status,
+            metainfo={
+                "transaction_id": callback.TransactionId,
+                "minute_count": minute_count,
+                "payment_status": callback.Status,
+            },
+            commit=False,
+        )
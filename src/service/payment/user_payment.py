@@ -102,3 +102,4 @@ class UserPaymentService:
                 user_subs_id=exist_subs.uuid,
                 minute_count=exist_subs.minute_count + product.minute_count,
             )
+            await self.user_products_service.invalidate_user_plan(exist_subs.user_id)
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Awaitable, Callable, Mapping
+from uuid import UUID
+
+import orjson
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.schemas.products import ProductResponse
+
+PRODUCT_CATALOG_KEY = "products:catalog"
+PRODUCT_CATALOG_GENERATION_KEY = "products:catalog:generation"
+PRODUCT_CATALOG_CHANNEL = "products:catalog:changed"
+# Пауза перед переподпиской, если соединение с Redis оборвалось
+LISTENER_RETRY_SECONDS = 5
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Каталог целиком: объекты общие для всех запросов процесса и не должны изменяться"""
+
+    generation: int
+    products: tuple[ProductResponse, ...]
+    by_id: Mapping[UUID, ProductResponse]
+    # Готовое тело ответа GET /products/active
+    list_body: bytes
+    # Момент устаревания по time.monotonic()
+    expires_at: float
+
+    @classmethod
+    def build(cls, generation: int, payload: list[dict], products: list[ProductResponse], ttl: int):
+        return cls(
+            generation=generation,
+            products=tuple(products),
+            by_id=MappingProxyType({product.uuid: product for product in products}),
+            list_body=orjson.dumps(payload),
+            expires_at=time.monotonic() + ttl,
+        )
+
+
+# Снимок каталога в памяти процесса; сбрасывается по сообщению в PRODUCT_CATALOG_CHANNEL
+_snapshot: CatalogSnapshot | None = None
+_reload_lock: asyncio.Lock | None = None
+# Последнее поколение из канала: снимок, собранный перезагрузкой, начатой до изменения, не принимается
+_latest_generation = 0
+
+
+def _current_snapshot() -> CatalogSnapshot | None:
+    snapshot = _snapshot
+    if snapshot and snapshot.generation >= _latest_generation and snapshot.expires_at > time.monotonic():
+        return snapshot
+    return None
+
+
+def drop_local_snapshot(generation: int | None = None) -> None:
+    global _snapshot, _latest_generation
+    _snapshot = None
+    if generation is not None:
+        _latest_generation = max(_latest_generation, generation)
+
+
+@dataclass
+class ProductCatalogCache:
+    """
+    Каталог продуктов: снимок в памяти процесса, затем Redis, затем база.
+    Ключ в Redis зависит от поколения каталога: после invalidate() перезагрузка,
+    начатая до изменения, пишет данные под старым поколением, и их уже никто не читает.
+    """
+
+    redis: Redis
+    ttl_seconds: int
+    local_ttl_seconds: int
+
+    async def get(self, load: Callable[[], Awaitable[list[ProductResponse]]]) -> CatalogSnapshot:
+        global _reload_lock
+        snapshot = _current_snapshot()
+        if snapshot:
+            return snapshot
+        # Один запрос перезагружает каталог, остальные ждут его результата
+        if _reload_lock is None:
+            _reload_lock = asyncio.Lock()
+        async with _reload_lock:
+            snapshot = _current_snapshot()
+            if snapshot:
+                return snapshot
+            return await self._reload(load)
+
+    async def _reload(self, load: Callable[[], Awaitable[list[ProductResponse]]]) -> CatalogSnapshot:
+        global _snapshot
+        generation = None
+        cached = None
+        try:
+            generation = int(await self.redis.get(PRODUCT_CATALOG_GENERATION_KEY) or 0)
+            cached = await self.redis.get(f"{PRODUCT_CATALOG_KEY}:{generation}")
+        except RedisError as e:
+            logging.warning(f"Product catalog cache is unavailable: {str(e)}")
+
+        if cached is not None:
+            payload = orjson.loads(cached)
+            products = [ProductResponse.model_validate(item) for item in payload]
+        else:
+            products = await load()
+            payload = [product.model_dump(mode="json") for product in products]
+            if generation is not None:
+                try:
+                    await self.redis.set(
+                        f"{PRODUCT_CATALOG_KEY}:{generation}", orjson.dumps(payload), ex=self.ttl_seconds
+                    )
+                except RedisError as e:
+                    logging.warning(f"Failed to cache product catalog: {str(e)}")
+
+        if generation is None:
+            generation = _latest_generation
+        _snapshot = CatalogSnapshot.build(generation, payload, products, self.local_ttl_seconds)
+        return _snapshot
+
+    async def invalidate(self) -> None:
+        """Вызывается после изменения продуктов: все процессы перечитают каталог при следующем запросе"""
+        generation = await self.redis.incr(PRODUCT_CATALOG_GENERATION_KEY)
+        drop_local_snapshot(generation)
+        await self.redis.publish(PRODUCT_CATALOG_CHANNEL, generation)
+
+
+async def listen_catalog_changes(redis: Redis) -> None:
+    """
+    Фоновая задача API-процесса: сбрасывает снимок каталога по сообщению об изменении.
+    Пока подписки нет, снимок все равно устаревает через local_ttl_seconds
+    """
+    while True:
+        try:
+            async with redis.pubsub() as pubsub:
+                await pubsub.subscribe(PRODUCT_CATALOG_CHANNEL)
+                # Изменения, пропущенные без подписки, не должны оставить старый снимок
+                drop_local_snapshot()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        drop_local_snapshot(int(message["data"]))
+        except RedisError as e:
+            logging.warning(f"Product catalog subscription failed: {str(e)}")
+            await asyncio.sleep(LISTENER_RETRY_SECONDS)
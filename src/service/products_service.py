@@ -2,20 +2,41 @@ from dataclasses import dataclass
 from uuid import UUID
 import json
 
+import orjson
+
 from src.models import Products
 from src.repository.products_repository import ProductsRepository
 from src.schemas.products import ProductResponse
+from src.service.product_catalog_cache import ProductCatalogCache
 
 
 @dataclass
 class ProductsService:
     products_repository: ProductsRepository
+    catalog_cache: ProductCatalogCache | None = None
 
-    async def get_all(self) -> list[ProductResponse]:
+    async def _load_catalog(self) -> list[ProductResponse]:
         products = await self.products_repository.get_all_products()
         return [self._prepare_product_response(product) for product in products]
 
-    async def get_by_id(self, product_id: UUID) -> Products:
+    async def get_all(self) -> list[ProductResponse]:
+        if self.catalog_cache is None:
+            return await self._load_catalog()
+        return list((await self.catalog_cache.get(self._load_catalog)).products)
+
+    async def get_all_json(self) -> bytes:
+        """Тело ответа со списком продуктов; из кэша — без сериализации на запрос"""
+        if self.catalog_cache is None:
+            products = await self._load_catalog()
+            return orjson.dumps([product.model_dump(mode="json") for product in products])
+        return (await self.catalog_cache.get(self._load_catalog)).list_body
+
+    async def get_by_id(self, product_id: UUID) -> ProductResponse:
+        if self.catalog_cache is not None:
+            product = (await self.catalog_cache.get(self._load_catalog)).by_id.get(product_id)
+            if product:
+                return product
+        # Продукта нет в снимке — возможно, он добавлен после загрузки каталога
         product = await self.products_repository.get_by_id(product_id)
         return self._prepare_product_response(product) if product else None
 
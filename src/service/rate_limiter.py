@@ -0,0 +1,90 @@
+import logging
+from dataclasses import dataclass
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+RATE_LIMIT_KEY = "ratelimit"
+
+# Token bucket одним вызовом: сначала глубина очереди Celery (при перегрузке токен не тратится),
+# затем пополнение ведра по времени сервера Redis и списание токена.
+# KEYS[1] — ведро, KEYS[2] — очередь; ARGV: емкость, токенов в секунду, порог очереди (0 — без проверки).
+# Возвращает {1, 0} — пропустить, {0, секунд до токена} — лимит, {-1, глубина очереди} — перегрузка
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local max_depth = tonumber(ARGV[3])
+
+if max_depth > 0 then
+    local depth = redis.call('LLEN', KEYS[2])
+    if depth >= max_depth then
+        return {-1, depth}
+    end
+end
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = math.ceil((1 - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, retry_after}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    # Через сколько секунд повторить запрос, для заголовка Retry-After
+    retry_after: int = 0
+    # Запрос отклонен из-за глубины очереди, а не лимита пользователя
+    shed: bool = False
+
+
+@dataclass
+class RateLimiter:
+    """
+    Лимиты на дорогие запросы: token bucket на пользователя и группу маршрутов в Redis,
+    емкость и скорость пополнения зависят от тарифа. Для групп, которые ставят задачи в Celery,
+    новые запросы не принимаются, пока очередь глубже max_queue_depth
+    """
+
+    redis: Redis
+    # группа -> тариф -> [емкость ведра, запросов в минуту]
+    limits: dict[str, dict[str, list[float]]]
+    # группа -> очередь Celery, в которую она ставит задачи
+    queues: dict[str, str]
+    max_queue_depth: int
+    shed_retry_seconds: int
+
+    async def acquire(self, group: str, user_id: int, tier: str) -> RateLimitResult:
+        group_limits = self.limits.get(group)
+        if not group_limits:
+            return RateLimitResult(allowed=True)
+        capacity, per_minute = group_limits.get(tier) or group_limits["default"]
+        queue = self.queues.get(group)
+        try:
+            status, value = await self.redis.register_script(_TOKEN_BUCKET_SCRIPT)(
+                keys=[f"{RATE_LIMIT_KEY}:{group}:{user_id}", queue or f"{RATE_LIMIT_KEY}:no-queue"],
+                args=[capacity, per_minute / 60.0, self.max_queue_depth if queue else 0],
+            )
+        except RedisError as e:
+            # Без Redis запросы пропускаются: лимитер не должен останавливать сервис
+            logging.warning(f"Rate limiter is unavailable: {str(e)}")
+            return RateLimitResult(allowed=True)
+
+        if status == -1:
+            logging.warning(f"Queue {queue} depth {value} exceeds {self.max_queue_depth}, shedding {group}")
+            return RateLimitResult(allowed=False, retry_after=self.shed_retry_seconds, shed=True)
+        return RateLimitResult(allowed=bool(status), retry_after=max(int(value), 1) if not status else 0)
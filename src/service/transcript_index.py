@@ -0,0 +1,148 @@
+import io
+import re
+import struct
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+
+# Индекс транскрипции: MAGIC + zlib(заголовок, таймкоды сегментов, тексты сегментов, словарь, постинги)
+INDEX_MAGIC = b"JAI1"
+_INDEX_HEADER = struct.Struct("<III")
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_words(text: str) -> list[str]:
+    """Слова для индекса и запроса: нижний регистр, ё -> е, без пунктуации."""
+    return _WORD_RE.findall(text.lower().replace("ё", "е"))
+
+
+class TranscriptIndexBuilder:
+    """
+    Пошаговая сборка индекса: сегменты добавляются по порядку времени,
+    для каждого слова запоминаются номера сегментов, где оно встречается.
+    """
+
+    def __init__(self):
+        self.times = array("f")
+        self.text_lengths = array("I")
+        self.text = io.BytesIO()
+        self.postings: dict[str, array] = defaultdict(lambda: array("I"))
+
+    def add_segment(self, start: float, end: float, text: str) -> None:
+        segment_index = len(self.text_lengths)
+        self.times.extend((start, end))
+        self.text_lengths.append(self.text.write(text.strip().encode()))
+        for word in set(normalize_words(text)):
+            self.postings[word].append(segment_index)
+
+    def add_transcription(self, transcription: dict) -> "TranscriptIndexBuilder":
+        for segment in transcription.get("segments") or []:
+            self.add_segment(segment["start"], segment["end"], segment["text"])
+        return self
+
+    def finish(self) -> bytes:
+        terms = sorted(self.postings)
+        encoded_terms = [term.encode() for term in terms]
+        postings = [self.postings[term] for term in terms]
+        times = np.frombuffer(self.times, dtype=np.float32).reshape(-1, 2)
+
+        compressor = zlib.compressobj(6)
+        parts = [
+            _INDEX_HEADER.pack(len(self.text_lengths), len(terms), sum(len(items) for items in postings)),
+            times[:, 0].astype("<f4").tobytes(),
+            times[:, 1].astype("<f4").tobytes(),
+            np.cumsum(np.frombuffer(self.text_lengths, dtype=np.uint32), dtype=np.uint32).astype("<u4").tobytes(),
+            np.cumsum([len(term) for term in encoded_terms], dtype=np.uint32).astype("<u4").tobytes(),
+            np.cumsum([len(items) for items in postings], dtype=np.uint32).astype("<u4").tobytes(),
+            *(np.frombuffer(items, dtype=np.uint32).astype("<u4").tobytes() for items in postings),
+            self.text.getbuffer(),
+            *encoded_terms,
+        ]
+        return INDEX_MAGIC + b"".join(compressor.compress(part) for part in parts) + compressor.flush()
+
+
+class TranscriptIndex:
+    """
+    Разобранный индекс: массивы читаются из буфера без копирования,
+    тексты сегментов декодируются только для возвращаемого среза.
+    """
+
+    def __init__(self, blob: bytes):
+        if blob[: len(INDEX_MAGIC)] != INDEX_MAGIC:
+            raise ValueError("Unknown transcript index format")
+        payload = zlib.decompress(blob[len(INDEX_MAGIC):])
+        segments_count, terms_count, postings_count = _INDEX_HEADER.unpack_from(payload)
+        position = _INDEX_HEADER.size
+
+        def column(dtype: str, count: int) -> np.ndarray:
+            nonlocal position
+            values = np.frombuffer(payload, dtype=dtype, count=count, offset=position)
+            position += values.nbytes
+            return values
+
+        self.starts = column("<f4", segments_count)
+        self.ends = column("<f4", segments_count)
+        self.text_ends = column("<u4", segments_count)
+        term_ends = column("<u4", terms_count).tolist()
+        self.posting_ends = column("<u4", terms_count)
+        self.postings = column("<u4", postings_count)
+        text_size = int(self.text_ends[-1]) if segments_count else 0
+        self.text = memoryview(payload)[position: position + text_size]
+        terms = payload[position + text_size:]
+        term_starts = [0, *term_ends[:-1]]
+        self.terms = [terms[start:end].decode() for start, end in zip(term_starts, term_ends)]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def segment(self, index: int) -> dict:
+        start = int(self.text_ends[index - 1]) if index else 0
+        return {
+            "index": index,
+            "start": round(float(self.starts[index]), 3),
+            "end": round(float(self.ends[index]), 3),
+            "text": bytes(self.text[start: int(self.text_ends[index])]).decode(),
+        }
+
+    def segment_at(self, t: float) -> int:
+        """Номер сегмента, который идет в момент t (последний начавшийся к этому времени)."""
+        return max(int(np.searchsorted(self.starts, t, side="right")) - 1, 0)
+
+    def _postings(self, word: str) -> np.ndarray:
+        idx = bisect_left(self.terms, word)
+        if idx == len(self.terms) or self.terms[idx] != word:
+            return self.postings[:0]
+        start = int(self.posting_ends[idx - 1]) if idx else 0
+        return self.postings[start: int(self.posting_ends[idx])]
+
+    def find(self, query: str, limit: int) -> list[dict]:
+        """
+        Сегменты, где сказана фраза: пересечение постингов всех слов запроса
+        и проверка порядка слов в тексте. Фраза на стыке двух сегментов
+        находится по первому из них.
+        """
+        words = normalize_words(query)
+        if not words or not len(self):
+            return []
+        phrase = f" {' '.join(words)} "
+        # Кандидаты: сегменты с первым словом; остальные слова — в нем или в следующем сегменте
+        candidates = self._postings(words[0])
+        for word in words[1:]:
+            postings = self._postings(word)
+            candidates = candidates[
+                np.isin(candidates, postings) | np.isin(candidates + 1, postings)
+            ]
+        found = []
+        for index in candidates.tolist():
+            segment = self.segment(index)
+            text = f" {' '.join(normalize_words(segment['text']))} "
+            if phrase not in text and index + 1 < len(self):
+                text = f"{text}{' '.join(normalize_words(self.segment(index + 1)['text']))} "
+            if phrase in text:
+                found.append(segment)
+                if len(found) >= limit:
+                    break
+        return found
@@ -0,0 +1,87 @@
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from src.service.file_service import FileService
+from src.service.transcript_index import TranscriptIndex
+from src.service.user_file_service import UserFileService
+from src.settings import settings
+
+# Разобранные индексы в памяти процесса: file_id -> (версия транскрипции, индекс).
+# Плеер запрашивает seek часто, поэтому индекс не читается из базы на каждый запрос
+_index_cache: OrderedDict[int, tuple[int, TranscriptIndex]] = OrderedDict()
+
+
+@dataclass
+class TranscriptIndexService:
+    """Поиск сегмента по времени и фразы внутри одного файла по индексу транскрипции."""
+
+    user_file_service: UserFileService
+
+    async def get_index(self, user_id: int, file_id: int) -> TranscriptIndex | None:
+        """
+        Returns:
+            Индекс или None, если файла нет или он еще не расшифрован
+        """
+        cached = _index_cache.get(file_id)
+        row = await self.user_file_service.get_transcription_index(
+            user_id, file_id, cached[0] if cached else None
+        )
+        if row is None:
+            return None
+        if cached and cached[0] == row.version:
+            _index_cache.move_to_end(file_id)
+            return cached[1]
+
+        blob = row.transcription_index
+        if blob is None or row.has_edits:
+            if not row.has_transcription:
+                return None
+            # Пока правки сегментов не применены, индекс строится в памяти с учетом правок
+            blob = await self._build_missing_index(user_id, file_id, row.version, persist=not row.has_edits)
+            if blob is None:
+                return None
+
+        index = await asyncio.to_thread(TranscriptIndex, blob)
+        _index_cache[file_id] = (row.version, index)
+        _index_cache.move_to_end(file_id)
+        while len(_index_cache) > settings.TRANSCRIPT_INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+        return index
+
+    async def _build_missing_index(
+        self, user_id: int, file_id: int, version: int, persist: bool = True
+    ) -> bytes | None:
+        """Индекс для файлов, расшифрованных до появления индекса: строится один раз и сохраняется."""
+        user_files = await self.user_file_service.get_user_file(user_id, [file_id])
+        if not user_files:
+            return None
+        transcription = FileService.get_transcription(user_files[0])
+        if not isinstance(transcription, dict):
+            return None
+        blob = self.user_file_service.build_transcription_index(transcription)
+        if blob is not None and persist:
+            await self.user_file_service.update_transcription_index(file_id, version, blob)
+        return blob
+
+    async def segments_at(self, user_id: int, file_id: int, t: float, context: int = 0) -> dict | None:
+        """
+        Сегмент, который звучит в момент t, и по context сегментов до и после него.
+        """
+        index = await self.get_index(user_id, file_id)
+        if index is None:
+            return None
+        if not len(index):
+            return {"segment_index": None, "segments": []}
+        current = index.segment_at(t)
+        segments = [
+            index.segment(idx)
+            for idx in range(max(current - context, 0), min(current + context + 1, len(index)))
+        ]
+        return {"segment_index": current, "segments": segments}
+
+    async def find_phrase(self, user_id: int, file_id: int, query: str, limit: int) -> list[dict] | None:
+        index = await self.get_index(user_id, file_id)
+        if index is None:
+            return None
+        return index.find(query, limit)
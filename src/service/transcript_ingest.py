@@ -0,0 +1,143 @@
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import BinaryIO
+
+import ijson
+from ijson.common import ObjectBuilder
+
+from src.service.file_service import TranscriptEncoder
+from src.service.transcript_index import TranscriptIndexBuilder
+
+# Поля verbose_json, которые сохраняются; tokens, logprob и т.п. пропускаются еще при разборе
+META_FIELDS = {"task", "language", "duration"}
+KEPT_FIELDS = {
+    "segments.item": {"id", "start", "end", "text", "words"},
+    "segments.item.words.item": {"word", "start", "end"},
+    "words.item": {"word", "start", "end"},
+}
+SCALAR_EVENTS = {"string", "number", "boolean", "null"}
+
+
+@dataclass
+class StreamedTranscript:
+    transcription_compact: bytes | None
+    transcription_text: str | None
+    transcription_index: bytes | None = None
+    language: str | None = None
+    # Ответ провайдера строкой вместо verbose_json — сообщение об ошибке
+    error: str | None = None
+
+
+def parse_transcription_stream(
+    body: BinaryIO,
+    on_segment: Callable[[dict], None],
+    on_word: Callable[[dict], None],
+) -> tuple[dict, str | None]:
+    """
+    Потоковый разбор verbose_json: сегменты и верхнеуровневые слова отдаются в колбэки по одному,
+    в памяти одновременно находится только текущий сегмент.
+
+    Returns:
+        (meta — task/language/duration, строка ошибки, если провайдер прислал строку вместо объекта)
+
+    Raises:
+        ValueError: тело не является корректным JSON
+    """
+    try:
+        return _parse_transcription_events(ijson.parse(body, use_float=True), on_segment, on_word)
+    except ijson.JSONError as e:
+        raise ValueError(f"Invalid transcription JSON: {str(e)}") from e
+
+
+def _parse_transcription_events(events, on_segment, on_word) -> tuple[dict, str | None]:
+    meta: dict = {}
+    builder: ObjectBuilder | None = None
+    item_prefix = ""
+    depth = 0
+    skipped_prefix: str | None = None
+    for prefix, event, value in events:
+        if builder is None:
+            if event == "start_map" and prefix in ("segments.item", "words.item"):
+                builder, item_prefix, depth = ObjectBuilder(), prefix, 1
+                builder.event(event, value)
+            elif prefix in META_FIELDS and event in SCALAR_EVENTS:
+                meta[prefix] = value
+            elif prefix == "" and event == "string":
+                return meta, value
+            continue
+
+        if skipped_prefix is not None:
+            if prefix == skipped_prefix or prefix.startswith(skipped_prefix + "."):
+                continue
+            skipped_prefix = None
+        if event == "map_key" and prefix in KEPT_FIELDS and value not in KEPT_FIELDS[prefix]:
+            skipped_prefix = f"{prefix}.{value}"
+            continue
+
+        builder.event(event, value)
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+        if depth == 0:
+            (on_segment if item_prefix == "segments.item" else on_word)(builder.value)
+            builder = None
+    return meta, None
+
+
+def read_transcription_result(body: BinaryIO) -> dict | str:
+    """
+    verbose_json только с сохраняемыми полями. Для кусков длинной записи: результат куска
+    нужен целиком для склейки, но он ограничен длиной куска.
+    """
+    segments: list[dict] = []
+    words: list[dict] = []
+    meta, error = parse_transcription_stream(body, segments.append, words.append)
+    if error is not None:
+        return error
+    result = {**meta, "segments": segments}
+    if words:
+        result["words"] = words
+    return result
+
+
+def encode_transcription_stream(
+    body: BinaryIO,
+    remap: Callable[[dict], dict] | None = None,
+    duration: float | None = None,
+) -> StreamedTranscript:
+    """
+    Разбирает callback провайдера и сразу пишет сегменты в компактный вид,
+    не собирая дерево verbose_json целиком.
+
+    Args:
+        remap: перевод таймкодов из обрезанного аудио во время исходного файла
+        duration: длительность исходного файла вместо длительности обрезанного аудио
+    """
+    encoder = TranscriptEncoder()
+    index_builder = TranscriptIndexBuilder()
+    texts: list[str] = []
+
+    def on_segment(segment: dict) -> None:
+        if remap:
+            remap(segment)
+        encoder.add_segment(segment)
+        index_builder.add_segment(segment["start"], segment["end"], segment["text"])
+        texts.append(segment["text"].strip())
+
+    def on_word(word: dict) -> None:
+        # Как в encode_transcript: верхнеуровневые слова, только если у сегментов своих нет
+        if encoder.words_count == 0 or encoder.top_level_words:
+            encoder.add_word(remap(word) if remap else word)
+
+    meta, error = parse_transcription_stream(body, on_segment, on_word)
+    if error is not None:
+        return StreamedTranscript(transcription_compact=None, transcription_text=None, error=error)
+    if remap and duration:
+        meta["duration"] = duration
+    return StreamedTranscript(
+        transcription_compact=encoder.finish(meta),
+        transcription_text=" ".join(texts),
+        transcription_index=index_builder.finish(),
+        language=meta.get("language"),
+    )
@@ -0,0 +1,97 @@
+import logging
+from dataclasses import dataclass
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.models import UserFile
+from src.models.enums import TranscriptFormat
+from src.service.file_service import FileService
+
+
+@dataclass
+class TranscriptRenderService:
+    """
+    Генерация текста и субтитров из сегментов транскрипции по запросу.
+
+    Результат кэшируется в Redis по (файл, формат, версия транскрипции, параметры разбивки),
+    поэтому после изменения транскрипции старые ключи просто перестают читаться.
+    """
+
+    redis: Redis
+    file_service: FileService
+    ttl_seconds: int
+
+    @staticmethod
+    def _cache_key(
+        user_file: UserFile,
+        transcript_format: TranscriptFormat,
+        max_line_length: int | None,
+        max_cps: float | None,
+    ) -> str:
+        return (
+            f"transcript:render:{user_file.id}:{user_file.transcription_version}:"
+            f"{transcript_format.value}:{max_line_length or 0}:{max_cps or 0}"
+        )
+
+    @staticmethod
+    def _stored_override(user_file: UserFile, transcript_format: TranscriptFormat) -> str | None:
+        """Текст, сохраненный пользователем вручную (или посчитанный до генерации по запросу)."""
+        if transcript_format == TranscriptFormat.TEXT and user_file.transcription_edits:
+            # Сохраненный текст еще не включает правки сегментов
+            return None
+        return {
+            TranscriptFormat.TEXT: user_file.transcription_text,
+            TranscriptFormat.SRT: user_file.transcription_srt,
+            TranscriptFormat.VTT: user_file.transcription_vtt,
+        }[transcript_format]
+
+    def _render(
+        self,
+        transcription: dict,
+        transcript_format: TranscriptFormat,
+        max_line_length: int | None,
+        max_cps: float | None,
+    ) -> str:
+        if transcript_format == TranscriptFormat.SRT:
+            return self.file_service.json_to_srt(transcription, max_line_length, max_cps)
+        if transcript_format == TranscriptFormat.VTT:
+            return self.file_service.json_to_vtt(transcription, max_line_length, max_cps)
+        return self.file_service.json_to_plain_text(transcription)
+
+    async def render(
+        self,
+        user_file: UserFile,
+        transcript_format: TranscriptFormat,
+        max_line_length: int | None = None,
+        max_cps: float | None = None,
+    ) -> str | None:
+        """
+        Returns:
+            Транскрипция в нужном формате или None, если транскрипции еще нет
+        """
+        reflow = bool(max_line_length or max_cps)
+        override = self._stored_override(user_file, transcript_format)
+        if override is not None and not reflow:
+            return override
+        if user_file.transcription is None and user_file.transcription_compact is None:
+            return override
+
+        key = self._cache_key(user_file, transcript_format, max_line_length, max_cps)
+        try:
+            cached = await self.redis.get(key)
+        except RedisError as e:
+            logging.warning(f"Transcript render cache is unavailable: {str(e)}")
+            cached = None
+        if cached is not None:
+            return cached.decode()
+
+        transcription = self.file_service.get_transcription(user_file)
+        if not isinstance(transcription, dict):
+            return override
+        rendered = self._render(transcription, transcript_format, max_line_length, max_cps)
+        try:
+            await self.redis.set(key, rendered, ex=self.ttl_seconds)
+        except RedisError as e:
+            logging.warning(f"Failed to cache rendered transcript: {str(e)}")
+        return rendered
@@ -0,0 +1,89 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Protocol
+
+from src.client.local_whisper_client import LocalWhisperClient
+from src.client.whisper_ai_client import WhisperAIClient
+from src.models import UserFile
+from src.settings import settings
+
+
+class TranscriptionBackend(Protocol):
+    """
+    Способ расшифровки файла. submit только запускает расшифровку,
+    результат сохраняется через AudioConvertService.complete_transcription.
+    """
+
+    async def submit(
+        self,
+        user_file: UserFile,
+        audio_file_key: str,
+        response_format: str,
+        language: str | None,
+        chunk_index: int | None = None,
+    ) -> None: ...
+
+    async def aclose(self) -> None: ...
+
+
+@dataclass
+class RemoteTranscriptionBackend:
+    """Внешний провайдер: скачивает файл по публичной ссылке и присылает результат в callback."""
+
+    audio_ai_client: WhisperAIClient
+
+    async def submit(
+        self,
+        user_file: UserFile,
+        audio_file_key: str,
+        response_format: str,
+        language: str | None,
+        chunk_index: int | None = None,
+    ) -> None:
+        audio_file_url = f"{settings.BASE_URL}/audio/convert/file/download/public-file/{audio_file_key}"
+        # Callback всегда адресуется исходным файлом
+        callback_url = f"{settings.whisper_ai_callback_url}/{user_file.file_url}"
+        if chunk_index is not None:
+            callback_url = f"{callback_url}?chunk={chunk_index}"
+        await self.audio_ai_client.convert_audio_to_text(
+            audio_file_url,
+            response_format,
+            language,
+            callback_url,
+            user_id=user_file.user_id,
+        )
+
+    async def aclose(self) -> None:
+        await self.audio_ai_client.aclose()
+
+
+@dataclass
+class LocalTranscriptionBackend:
+    """Локальная модель: файл ставится в очередь CPU-воркера, который читает его прямо из S3."""
+
+    whisper_client: LocalWhisperClient
+
+    async def submit(
+        self,
+        user_file: UserFile,
+        audio_file_key: str,
+        response_format: str,
+        language: str | None,
+        chunk_index: int | None = None,
+    ) -> None:
+        from src.celery.celery_app import TRANSCRIPTION_LOCAL_QUEUE
+        from src.celery.tasks import transcribe_locally
+
+        # Воркер всегда отдает verbose_json, остальные форматы строятся из него
+        transcribe_locally.apply_async(
+            args=[user_file.id, language, audio_file_key, chunk_index],
+            queue=TRANSCRIPTION_LOCAL_QUEUE,
+        )
+
+    async def transcribe(self, audio_path: str, language: str | None) -> dict:
+        return await asyncio.to_thread(
+            self.whisper_client.transcribe, audio_path, language
+        )
+
+    async def aclose(self) -> None:
+        pass
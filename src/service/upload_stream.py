@@ -0,0 +1,122 @@
+from dataclasses import dataclass
+from typing import Awaitable, AsyncIterator, Callable
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+
+class UploadStreamError(ValueError):
+    pass
+
+
+@dataclass
+class ReceivedUpload:
+    filename: str
+    path: str
+    size: int
+
+
+async def receive_upload(
+    content_type: str,
+    stream: AsyncIterator[bytes],
+    field_name: str,
+    on_filename: Callable[[str], str],
+    on_head: Callable[[str], Awaitable[None]],
+    head_bytes: int,
+) -> ReceivedUpload:
+    """
+    Потоково разбирает multipart-тело и пишет файл поля field_name на диск, не дожидаясь конца тела.
+    on_filename вызывается, как только пришли заголовки части с файлом, и возвращает путь для записи;
+    on_head — один раз, когда записаны первые head_bytes файла (или файл кончился раньше).
+    Исключение из обоих прерывает чтение: остаток тела не принимается.
+    """
+    _, params = parse_options_header(content_type)
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise UploadStreamError("Missing boundary in multipart body")
+
+    part_headers: dict[bytes, bytes] = {}
+    header_name = bytearray()
+    header_value = bytearray()
+    # Данные и события парсера: колбэки синхронные, обработка идет после каждого блока
+    events: list[tuple[str, bytes]] = []
+    state = {"in_file": False}
+
+    def on_part_begin() -> None:
+        part_headers.clear()
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header_name.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header_value.extend(data[start:end])
+
+    def on_header_end() -> None:
+        part_headers[bytes(header_name).lower()] = bytes(header_value)
+        header_name.clear()
+        header_value.clear()
+
+    def on_headers_finished() -> None:
+        _, options = parse_options_header(part_headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        state["in_file"] = name == field_name and b"filename" in options
+        if state["in_file"]:
+            events.append(("start", options[b"filename"]))
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if state["in_file"]:
+            events.append(("data", data[start:end]))
+
+    def on_part_end() -> None:
+        if state["in_file"]:
+            events.append(("end", b""))
+            state["in_file"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    filename = None
+    path = None
+    f = None
+    size = 0
+    head_checked = False
+    finished = False
+    try:
+        async for chunk in stream:
+            try:
+                parser.write(chunk)
+            except Exception as e:
+                raise UploadStreamError(f"Malformed multipart body: {str(e)}")
+            for event, data in events:
+                if finished:
+                    break
+                if event == "start":
+                    filename = data.decode("utf-8", "replace")
+                    path = on_filename(filename)
+                    f = open(path, "wb")
+                elif event == "data":
+                    f.write(data)
+                    size += len(data)
+                    if not head_checked and size >= head_bytes:
+                        f.flush()
+                        head_checked = True
+                        await on_head(path)
+                else:
+                    finished = True
+            events.clear()
+    finally:
+        if f is not None:
+            f.close()
+    if filename is None:
+        raise UploadStreamError(f'Multipart body has no file field "{field_name}"')
+    if not finished:
+        raise UploadStreamError("Multipart body ended before the file")
+    if not head_checked:
+        await on_head(path)
+    return ReceivedUpload(filename=filename, path=path, size=size)
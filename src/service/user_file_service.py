@@ -1,9 +1,48 @@
+import base64
+import logging
 from dataclasses import dataclass
 
-from src.models import UserFile
+from src.exceptions import TranscriptVersionConflictExceptions
+from src.models import UserFile, TranscriptionChunk
 from src.models.enums import FileProcessingStatus, FileRemoveMelodyStatus, FileRemoveNoiseStatus, FileRemoveVocalStatus, \
-    FileTranscriptionStatus, FileImproveAudioStatus
+    FileTranscriptionStatus, FileImproveAudioStatus, FileInsightsStatus, AudioSource
 from src.repository.user_file_repository import UserFileRepository
+from src.service.file_service import FileService
+from src.service.transcript_index import TranscriptIndexBuilder
+from src.settings import settings
+
+# Язык из ответа Whisper (код или название) -> встроенная конфигурация полнотекстового поиска Postgres
+TEXT_SEARCH_CONFIGS = {
+    "ar": "arabic", "hy": "armenian", "eu": "basque", "ca": "catalan", "da": "danish", "nl": "dutch",
+    "en": "english", "fi": "finnish", "fr": "french", "de": "german", "el": "greek", "hi": "hindi",
+    "hu": "hungarian", "id": "indonesian", "ga": "irish", "it": "italian", "lt": "lithuanian", "ne": "nepali",
+    "no": "norwegian", "nn": "norwegian", "pt": "portuguese", "ro": "romanian", "ru": "russian", "sr": "serbian",
+    "es": "spanish", "sv": "swedish", "ta": "tamil", "tr": "turkish", "yi": "yiddish",
+}
+
+
+# Столбец UserFile со ссылкой на аудио каждого источника
+AUDIO_SOURCE_URL_FIELDS = {
+    AudioSource.ORIGINAL: "file_url",
+    AudioSource.NOISE_REMOVED: "removed_noise_file_url",
+    AudioSource.VOCALS_REMOVED: "removed_vocals_file_url",
+    AudioSource.MELODY_REMOVED: "removed_melody_file_url",
+    AudioSource.ENHANCED: "improved_audio_file_url",
+}
+
+
+def audio_source_url(user_file, source: AudioSource) -> str | None:
+    """Ключ аудио источника в MinIO; user_file — UserFile или строка get_file_media."""
+    return getattr(user_file, AUDIO_SOURCE_URL_FIELDS[source])
+
+
+def text_search_config(language: str | None) -> str:
+    if not language:
+        return "simple"
+    language = language.lower()
+    if language in TEXT_SEARCH_CONFIGS.values():
+        return language
+    return TEXT_SEARCH_CONFIGS.get(language, "simple")
 
 
 @dataclass
@@ -13,19 +52,137 @@ class UserFileService:
     async def make_user_file_completed(
         self, 
         file_url: str, 
-        transcription_result: dict | str,
+        transcription_result: dict | str | None,
         transcription_text: str | None = None,
-        transcription_vtt: str | None = None,
-        transcription_srt: str | None = None
+        transcription_compact: bytes | None = None,
+        transcription_index: bytes | None = None,
+        transcription_language: str | None = None,
     ) -> None:
+        """
+        transcription_compact и transcription_index передаются, если результат уже упакован
+        (потоковый разбор callback)
+        """
+        if isinstance(transcription_result, dict):
+            transcription_language = transcription_result.get("language")
+            transcription_index = self.build_transcription_index(transcription_result)
+        if transcription_compact is None:
+            transcription, transcription_compact = self._pack_transcription(transcription_result)
+        elif settings.TRANSCRIPT_COMPACT_STORAGE:
+            transcription = None
+        else:
+            transcription, transcription_compact = FileService.decode_transcript(transcription_compact), None
         await self.user_file_repository.make_user_file_completed(
             file_url=file_url,
             status=FileProcessingStatus.COMPLETED.value,
-            transcription=transcription_result,
+            transcription=transcription,
             transcription_text=transcription_text,
-            transcription_vtt=transcription_vtt,
-            transcription_srt=transcription_srt,
+            transcription_compact=transcription_compact,
+            transcription_index=transcription_index,
+            search_config=text_search_config(transcription_language),
+        )
+
+    @staticmethod
+    def build_transcription_index(transcription: dict) -> bytes | None:
+        try:
+            return TranscriptIndexBuilder().add_transcription(transcription).finish()
+        except (KeyError, TypeError, AttributeError) as e:
+            logging.warning(f"Transcription index is not built: {str(e)}")
+            return None
+
+    @staticmethod
+    def _pack_transcription(transcription: dict | str) -> tuple[dict | str | None, bytes | None]:
+        """
+        Пара (JSONB, компактный вид) для сохранения. Ошибки провайдера (строка),
+        JSON без таймкодов сегментов и JSON, не проходящий проверку раскодированием, остаются в JSONB.
+        """
+        if settings.TRANSCRIPT_COMPACT_STORAGE and isinstance(transcription, dict):
+            try:
+                return None, FileService.encode_transcript(transcription, verify=True)
+            except (KeyError, TypeError, ValueError) as e:
+                logging.warning(f"Transcription is stored as JSONB: {str(e)}")
+        return transcription, None
+
+    async def compact_transcriptions(self, batch_size: int) -> int:
+        """
+        Переводит транскрипции из JSONB в компактный вид пачками по batch_size.
+
+        Returns:
+            Количество переведенных файлов
+        """
+        converted = 0
+        after_id = 0
+        while True:
+            rows = await self.user_file_repository.get_json_transcriptions(after_id, batch_size)
+            if not rows:
+                return converted
+            for file_id, transcription in rows:
+                after_id = file_id
+                try:
+                    # JSONB заменяется, только если компактный вид раскодируется обратно в то же самое
+                    blob = FileService.encode_transcript(transcription, verify=True)
+                except (KeyError, TypeError, ValueError) as e:
+                    logging.warning(f"Transcription of file {file_id} can't be compacted: {str(e)}")
+                    continue
+                converted += await self.user_file_repository.store_compact_transcription(
+                    file_id, blob, self.build_transcription_index(transcription)
+                )
+
+    @staticmethod
+    def _encode_search_cursor(rank: float, file_id: int) -> str:
+        return base64.urlsafe_b64encode(f"{rank!r}:{file_id}".encode()).decode()
+
+    @staticmethod
+    def _decode_search_cursor(cursor: str) -> tuple[float, int]:
+        try:
+            rank, file_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+            return float(rank), int(file_id)
+        except ValueError as e:
+            raise ValueError("Invalid cursor") from e
+
+    async def search_transcriptions(
+        self, user_id: int, query: str, limit: int, cursor: str | None = None
+    ) -> tuple[list[dict], str | None]:
+        """
+        Полнотекстовый поиск по транскрипциям пользователя: файлы по убыванию релевантности,
+        с подсвеченными фрагментами и таймкодами сегментов, где встречаются слова запроса.
+
+        Returns:
+            (найденные файлы, курсор следующей страницы или None)
+        """
+        rows = await self.user_file_repository.search_transcriptions(
+            user_id=user_id,
+            query=query,
+            configs=settings.TRANSCRIPT_SEARCH_CONFIGS,
+            headline_options=settings.TRANSCRIPT_SEARCH_HEADLINE_OPTIONS,
+            limit=limit + 1,
+            after=self._decode_search_cursor(cursor) if cursor else None,
         )
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self._encode_search_cursor(rows[-1].rank, rows[-1].id)
+
+        hits = []
+        for row in rows:
+            if row.transcription_compact is not None:
+                transcription = FileService.decode_transcript(row.transcription_compact)
+            else:
+                transcription = row.transcription
+            segments = []
+            if isinstance(transcription, dict):
+                segments = FileService.find_segments(
+                    transcription, row.lexemes or [], settings.TRANSCRIPT_SEARCH_SEGMENTS_PER_HIT
+                )
+            hits.append(
+                {
+                    "file_id": row.id,
+                    "display_name": row.display_name,
+                    "rank": row.rank,
+                    "snippet": row.snippet,
+                    "segments": segments,
+                }
+            )
+        return hits, next_cursor
 
     async def update_file_duration(self, file_id: int, duration: float) -> None:
         """
@@ -49,6 +206,87 @@ class UserFileService:
             status=status.value,
         )
 
+    async def request_transcription(self, file_ids: list[int]) -> list[int]:
+        """
+        Mark files as waiting for transcription and return ids that need to be submitted
+        """
+        return await self.user_file_repository.request_transcription(
+            file_ids=file_ids,
+            processing_status=FileProcessingStatus.PROCESSING.value,
+            transcription_status=FileTranscriptionStatus.PROCESSING.value,
+        )
+
+    async def claim_transcription_submission(self, file_id: int) -> UserFile | None:
+        return await self.user_file_repository.claim_transcription_submission(
+            file_id=file_id,
+            transcription_status=FileTranscriptionStatus.PROCESSING.value,
+            callback_timeout_seconds=settings.TRANSCRIPTION_CALLBACK_TIMEOUT_SECONDS,
+            timeout_per_audio_second=settings.TRANSCRIPTION_CALLBACK_TIMEOUT_PER_AUDIO_SECOND,
+        )
+
+    async def update_prepared_audio(
+        self, file_id: int, prepared_audio_url: str, offset_map: list[list[float]]
+    ) -> None:
+        await self.user_file_repository.update_prepared_audio(
+            file_id=file_id,
+            prepared_audio_url=prepared_audio_url,
+            offset_map=offset_map,
+        )
+
+    async def create_transcription_chunks(self, file_id: int, chunks: list[dict]) -> None:
+        await self.user_file_repository.create_transcription_chunks(file_id, chunks)
+
+    async def get_transcription_chunks(self, file_id: int) -> list[TranscriptionChunk]:
+        return await self.user_file_repository.get_transcription_chunks(file_id)
+
+    async def get_transcription_chunk(self, file_id: int, index: int) -> TranscriptionChunk | None:
+        return await self.user_file_repository.get_transcription_chunk(file_id, index)
+
+    async def complete_transcription_chunk(
+        self, file_id: int, index: int, result: dict
+    ) -> tuple[bool, int, int]:
+        return await self.user_file_repository.complete_transcription_chunk(
+            file_id=file_id,
+            index=index,
+            result=result,
+            completed_status=FileTranscriptionStatus.COMPLETED.value,
+        )
+
+    async def fail_transcription_chunk(self, file_id: int, index: int) -> bool:
+        """
+        Returns:
+            True, если кусок исчерпал TRANSCRIPTION_MAX_ATTEMPTS попыток
+        """
+        return await self.user_file_repository.fail_transcription_chunk(
+            file_id,
+            index,
+            completed_status=FileTranscriptionStatus.COMPLETED.value,
+            max_attempts=settings.TRANSCRIPTION_MAX_ATTEMPTS,
+        )
+
+    async def delete_transcription_chunks(self, file_id: int) -> None:
+        await self.user_file_repository.delete_transcription_chunks(file_id)
+
+    async def release_transcription_submission(self, file_id: int) -> None:
+        await self.user_file_repository.release_transcription_submission(file_id)
+
+    async def fail_exhausted_transcriptions(self) -> list[int]:
+        return await self.user_file_repository.fail_exhausted_transcriptions(
+            transcription_status=FileTranscriptionStatus.PROCESSING.value,
+            failed_status=FileTranscriptionStatus.FAILED.value,
+            max_attempts=settings.TRANSCRIPTION_MAX_ATTEMPTS,
+            callback_timeout_seconds=settings.TRANSCRIPTION_CALLBACK_TIMEOUT_SECONDS,
+            timeout_per_audio_second=settings.TRANSCRIPTION_CALLBACK_TIMEOUT_PER_AUDIO_SECOND,
+        )
+
+    async def get_stalled_transcription_ids(self) -> list[int]:
+        return await self.user_file_repository.get_stalled_transcription_ids(
+            transcription_status=FileTranscriptionStatus.PROCESSING.value,
+            submit_grace_seconds=settings.TRANSCRIPTION_SUBMIT_GRACE_SECONDS,
+            callback_timeout_seconds=settings.TRANSCRIPTION_CALLBACK_TIMEOUT_SECONDS,
+            timeout_per_audio_second=settings.TRANSCRIPTION_CALLBACK_TIMEOUT_PER_AUDIO_SECOND,
+        )
+
     async def create_user_file(
         self,
         user_id: int,
@@ -70,6 +308,13 @@ class UserFileService:
     async def get_user_file(self, user_id: int, file_ids: list[int]) -> list[UserFile]:
         return await self.user_file_repository.get_user_file(user_id, file_ids)
 
+    async def get_user_files_with_transcription_json(
+        self, user_id: int, file_ids: list[int] | None = None, status: FileProcessingStatus | None = None
+    ) -> list[tuple[UserFile, str | None]]:
+        return await self.user_file_repository.get_user_files_with_transcription_json(
+            user_id, file_ids, status.value if status else None
+        )
+
     async def get_user_files(self, user_id: int, status: FileProcessingStatus = None):
         status_value = status.value if status else None
         return await self.user_file_repository.get_user_files(user_id, status_value)
@@ -86,6 +331,34 @@ class UserFileService:
         """
         return await self.user_file_repository.get_user_file_by_url(file_url)
 
+    async def get_user_file_by_id(self, file_id: int) -> UserFile | None:
+        return await self.user_file_repository.get_user_file_by_id(file_id)
+
+    async def update_insights_status(
+        self, file_id: int, status: FileInsightsStatus
+    ) -> None:
+        await self.user_file_repository.update_insights_status(
+            file_id=file_id, status=status.value
+        )
+
+    async def save_file_insights(
+        self,
+        file_id: int,
+        summary: str,
+        chapters: list[dict],
+        transcription_text: str,
+    ) -> None:
+        """
+        Save precomputed summary, chapters and plain text and mark insights as completed
+        """
+        await self.user_file_repository.update_file_insights(
+            file_id=file_id,
+            summary=summary,
+            chapters=chapters,
+            transcription_text=transcription_text,
+            status=FileInsightsStatus.COMPLETED.value,
+        )
+
     async def update_noise_removed_url(
         self, file_id: int, removed_noise_url: str
     ) -> None:
@@ -149,7 +422,144 @@ class UserFileService:
         """
         Update the JSON transcription data for a file
         """
-        await self.user_file_repository.update_transcription_json(file_id, transcription_data)
+        transcription, transcription_compact = self._pack_transcription(transcription_data)
+        transcription_index = None
+        if isinstance(transcription_data, dict):
+            transcription_index = self.build_transcription_index(transcription_data)
+        await self.user_file_repository.update_transcription_json(
+            file_id, transcription, transcription_compact, transcription_index
+        )
+
+    async def patch_transcription_segments(
+        self, user_file: UserFile, edits: list[dict], expected_version: int | None = None
+    ) -> tuple[int, list[dict], bool]:
+        """
+        Правка отдельных сегментов по номеру. Правки дописываются к файлу, а сохраненная
+        транскрипция, текст и индекс пересобираются позже одним apply_transcription_edits.
+
+        Returns:
+            (новая версия транскрипции, сегменты после правки, изменился ли текст)
+
+        Raises:
+            ValueError: у файла нет сегментов, номер сегмента вне диапазона или start > end
+            TranscriptVersionConflictExceptions: версия транскрипции не равна expected_version
+        """
+        transcription = FileService.get_transcription(user_file)
+        if not isinstance(transcription, dict) or not transcription.get("segments"):
+            raise ValueError("Transcription has no segments")
+        segments_count = len(transcription["segments"])
+        for edit in edits:
+            if edit["index"] >= segments_count:
+                raise ValueError(f"Segment index {edit['index']} is out of range (0..{segments_count - 1})")
+
+        patched = FileService.apply_segment_edits(transcription, edits)["segments"]
+        touched = sorted({edit["index"] for edit in edits})
+        for index in touched:
+            if patched[index]["start"] > patched[index]["end"]:
+                raise ValueError(f"Segment {index} starts after it ends")
+
+        version = await self.user_file_repository.append_transcription_edits(
+            user_file.user_id,
+            user_file.id,
+            edits,
+            expected_version=expected_version,
+            clear_subtitles=True,
+        )
+        if version is None:
+            raise TranscriptVersionConflictExceptions()
+        segments = [
+            {"index": index, "start": patched[index]["start"], "end": patched[index]["end"],
+             "text": patched[index]["text"]}
+            for index in touched
+        ]
+        return version, segments, any("text" in edit for edit in edits)
+
+    async def apply_transcription_edits(self, file_id: int) -> bool:
+        """
+        Переносит накопленные правки в сохраненную транскрипцию: компактный вид и индекс
+        пересобираются один раз на пачку правок, plain text (и tsvector поиска) — только
+        если правился текст. Таймкоды не влияют на текст, поэтому его столбец не переписывается.
+
+        Returns:
+            True, если правки применены; False, если их нет или пришли новые (их применит следующий запуск)
+        """
+        user_file = await self.user_file_repository.get_user_file_by_id(file_id)
+        if user_file is None or not user_file.transcription_edits:
+            return False
+        transcription = FileService.get_transcription(user_file)
+        if not isinstance(transcription, dict):
+            return False
+        text_changed = any("text" in edit for edit in user_file.transcription_edits)
+        stored, transcription_compact = self._pack_transcription(transcription)
+        return await self.user_file_repository.apply_transcription_edits(
+            file_id,
+            user_file.transcription_version,
+            stored,
+            transcription_compact,
+            self.build_transcription_index(transcription),
+            FileService.json_to_plain_text(transcription) if text_changed else None,
+        )
+
+    async def get_transcription_index(self, user_id: int, file_id: int, known_version: int | None = None):
+        return await self.user_file_repository.get_transcription_index(user_id, file_id, known_version)
+
+    async def update_transcription_index(self, file_id: int, version: int, transcription_index: bytes) -> None:
+        await self.user_file_repository.update_transcription_index(file_id, version, transcription_index)
+
+    async def get_file_media(self, user_id: int, file_id: int):
+        return await self.user_file_repository.get_file_media(user_id, file_id)
+
+    async def update_hls_package(self, file_id: int, source: AudioSource, package: dict) -> dict | None:
+        return await self.user_file_repository.update_hls_package(file_id, source.value, package)
+
+    async def update_waveform_peaks(self, file_id: int, source: AudioSource, peaks: dict) -> None:
+        await self.user_file_repository.update_waveform_peaks(file_id, source.value, peaks)
+
+    async def release_original_audio(self, file_id: int, file_service: FileService, force: bool = False) -> bool:
+        """
+        Удаляет исходное аудио из MinIO, когда оно больше не нужно: транскрипция сохранена,
+        а включенные пики волны и HLS-нарезка уже посчитаны по нему или не удались после всех попыток.
+        Вызывается после сохранения транскрипции и после каждой производной — удаляет тот, кто закончил последним.
+        Состояние читается после своего commit, поэтому хотя бы один из них увидит все готовым
+
+        Args:
+            force: не ждать производных (исходное аудио хранится дольше ORIGINAL_AUDIO_RETENTION_HOURS)
+
+        Returns:
+            True, если аудио удалено
+        """
+        state = await self.user_file_repository.get_original_audio_state(file_id, AudioSource.ORIGINAL.value)
+        if state is None or not state.file_url or state.original_audio_deleted_at is not None:
+            return False
+        if state.transcription_status != FileTranscriptionStatus.COMPLETED.value:
+            return False
+        if not force:
+            if settings.WAVEFORM_PEAKS_ENABLED and state.peaks_audio_url != state.file_url:
+                return False
+            if settings.HLS_ENABLED and state.hls_audio_url != state.file_url:
+                return False
+
+        user_id, file_name = state.file_url.split("/", 1)
+        try:
+            await file_service.delete_file_from_s3(user_id, file_name)
+        except Exception as e:
+            logging.error(f"Error deleting original audio of file {file_id} from S3: {str(e)}")
+            return False
+        await self.user_file_repository.mark_original_audio_deleted(file_id)
+        return True
+
+    async def release_retained_original_audio(self, file_service: FileService, batch_size: int) -> list[int]:
+        """
+        Удаляет исходное аудио расшифрованных файлов старше ORIGINAL_AUDIO_RETENTION_HOURS, не дожидаясь
+        производных: задача производной потерялась или производная включена уже после загрузки файла.
+
+        Returns:
+            id файлов, исходное аудио которых удалено
+        """
+        file_ids = await self.user_file_repository.get_retained_original_audio_ids(
+            FileTranscriptionStatus.COMPLETED.value, settings.ORIGINAL_AUDIO_RETENTION_HOURS, batch_size
+        )
+        return [file_id for file_id in file_ids if await self.release_original_audio(file_id, file_service, force=True)]
 
     async def update_transcription_text(self, file_id: int, text: str) -> None:
         """
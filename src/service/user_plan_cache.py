@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+USER_PLAN_KEY = "users:plan"
+USER_PLAN_CHANNEL = "users:plan:changed"
+# Тело ответа для пользователя без подписки: отсутствие плана тоже кэшируется
+NO_PLAN = b"null"
+# Пауза перед переподпиской, если соединение с Redis оборвалось
+LISTENER_RETRY_SECONDS = 5
+
+# Записывает план, только если версия не менялась с момента чтения: план, прочитанный
+# из базы до оплаты, не должен попасть в кэш после invalidate()
+_STORE_IF_VERSION_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+# Планы в памяти процесса: user_id -> (момент устаревания по time.monotonic(), версия, тело ответа)
+_local_cache: OrderedDict[int, tuple[float, int, bytes]] = OrderedDict()
+# Последние версии из канала: копия, прочитанная до изменения, не принимается
+_latest_versions: OrderedDict[int, int] = OrderedDict()
+
+
+def drop_local_plan(user_id: int, version: int, local_size: int) -> None:
+    _local_cache.pop(user_id, None)
+    _latest_versions[user_id] = max(_latest_versions.get(user_id, 0), version)
+    _latest_versions.move_to_end(user_id)
+    while len(_latest_versions) > local_size:
+        _latest_versions.popitem(last=False)
+
+
+@dataclass
+class UserPlanCache:
+    """
+    План пользователя (GET /products/user-plan) готовым телом ответа: память процесса, затем Redis, затем база.
+    Версия плана в Redis растет при каждом invalidate(): после оплаты, продления и списания минут
+    """
+
+    redis: Redis
+    ttl_seconds: int
+    local_ttl_seconds: int
+    local_size: int
+
+    @staticmethod
+    def _keys(user_id: int) -> tuple[str, str]:
+        return f"{USER_PLAN_KEY}:{user_id}", f"{USER_PLAN_KEY}:{user_id}:version"
+
+    def _remember(self, user_id: int, version: int, body: bytes) -> None:
+        if version < _latest_versions.get(user_id, 0):
+            return
+        _local_cache[user_id] = (time.monotonic() + self.local_ttl_seconds, version, body)
+        _local_cache.move_to_end(user_id)
+        while len(_local_cache) > self.local_size:
+            _local_cache.popitem(last=False)
+
+    async def get(self, user_id: int, load: Callable[[], Awaitable[bytes]]) -> bytes:
+        """
+        Returns:
+            Тело ответа с планом или NO_PLAN
+        """
+        local = _local_cache.get(user_id)
+        if local and local[0] > time.monotonic() and local[1] >= _latest_versions.get(user_id, 0):
+            _local_cache.move_to_end(user_id)
+            return local[2]
+
+        key, version_key = self._keys(user_id)
+        version = None
+        cached = None
+        try:
+            cached, version = await self.redis.mget(key, version_key)
+            version = int(version or 0)
+        except RedisError as e:
+            logging.warning(f"User plan cache is unavailable: {str(e)}")
+
+        if cached is not None:
+            body = cached
+        else:
+            body = await load()
+            if version is not None:
+                try:
+                    stored = await self.redis.register_script(_STORE_IF_VERSION_SCRIPT)(
+                        keys=[key, version_key], args=[version, body, self.ttl_seconds]
+                    )
+                except RedisError as e:
+                    logging.warning(f"Failed to cache user plan: {str(e)}")
+                    stored = 0
+                if not stored:
+                    return body
+
+        if version is not None:
+            self._remember(user_id, version, body)
+        return body
+
+    async def invalidate(self, user_id: int) -> None:
+        """Вызывается после изменения продуктов пользователя: все процессы перечитают план"""
+        key, version_key = self._keys(user_id)
+        _local_cache.pop(user_id, None)
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.incr(version_key)
+                pipe.delete(key)
+                version, _ = await pipe.execute()
+            drop_local_plan(user_id, version, self.local_size)
+            await self.redis.publish(USER_PLAN_CHANNEL, f"{user_id}:{version}")
+        except RedisError as e:
+            # Копии в других процессах устареют через local_ttl_seconds, в Redis — через ttl_seconds
+            logging.warning(f"Failed to invalidate user plan {user_id}: {str(e)}")
+
+
+async def listen_plan_changes(redis: Redis, local_size: int) -> None:
+    """
+    Фоновая задача API-процесса: сбрасывает план пользователя из памяти по сообщению об изменении.
+    Пока подписки нет, копии все равно устаревают через local_ttl_seconds
+    """
+    while True:
+        try:
+            async with redis.pubsub() as pubsub:
+                await pubsub.subscribe(USER_PLAN_CHANNEL)
+                # Изменения, пропущенные без подписки, не должны оставить старые планы
+                _local_cache.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        user_id, version = message["data"].split(b":")
+                        drop_local_plan(int(user_id), int(version), local_size)
+        except RedisError as e:
+            logging.warning(f"User plan subscription failed: {str(e)}")
+            await asyncio.sleep(LISTENER_RETRY_SECONDS)
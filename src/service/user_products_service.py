@@ -1,19 +1,27 @@
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime, timedelta
 import logging
 from uuid import UUID
 
+import orjson
 from fastapi import HTTPException
 from starlette import status
 
-from src.models import UserProducts
+from src.models import UserProducts, UsageDailyRollup
+from src.models.enums import UsageEventType
 from src.repository.user_products_repository import UserProductsRepository
 from src.schemas.products import UserProductPlanResponse
+from src.service.user_plan_cache import NO_PLAN, UserPlanCache
+from src.settings import settings
+
+PLAN_TIER_DEFAULT = "default"
+PLAN_TIER_SUBSCRIPTION = "subscription"
 
 
 @dataclass
 class UserProductsService:
     user_products_repository: UserProductsRepository
+    plan_cache: UserPlanCache | None = None
 
     async def create_user_product(
         self,
@@ -21,9 +29,11 @@ class UserProductsService:
         product_id: UUID,
         minute_count: float,
         amount: float,
+        commit: bool = True,
     ) -> UserProducts:
         """
-        Create a new user product record after successful payment
+        Create a new user product record after successful payment.
+        commit=False keeps the changes in the caller's transaction
         """
         exist_user_product = await self.user_products_repository.get_user_product(
             user_id
@@ -34,30 +44,66 @@ class UserProductsService:
                 minute_count=minute_count,
                 amount=amount,
                 product_id=product_id,
+                commit=commit,
             )
         return await self.user_products_repository.update_user_product(
             user_id=user_id,
             user_product_id=exist_user_product.uuid,
             minute_count=minute_count + exist_user_product.minute_count,
             product_id=product_id,
+            commit=commit,
         )
 
-    async def deduct_minutes(self, user_id: int, seconds_used: float) -> UserProducts:
+    async def deduct_minutes(
+        self,
+        user_id: int,
+        seconds_used: float,
+        event_type: UsageEventType = UsageEventType.UPLOAD,
+        user_file_id: int | None = None,
+    ) -> UserProducts | None:
         """
-        Deduct minutes from user's balance after file transcription
-        Convert seconds to minutes (rounded up) for deduction
+        Deduct minutes from user's balance and record the event in the usage ledger.
+        Minutes are seconds / 60 scaled by USAGE_MINUTE_MULTIPLIERS of the event type;
+        events with a zero multiplier are only recorded
         """
-        # Calculate minutes with ceiling to round up any partial minute
-        minutes_to_deduct = seconds_used / 60.0  # Round up to minute
+        multiplier = settings.USAGE_MINUTE_MULTIPLIERS.get(event_type.value, 1.0)
+        minutes_to_deduct = seconds_used / 60.0 * multiplier
+        if not minutes_to_deduct:
+            await self.user_products_repository.record_usage(
+                user_id=user_id,
+                seconds=seconds_used,
+                event_type=event_type,
+                user_file_id=user_file_id,
+            )
+            return None
 
         try:
-            return await self.user_products_repository.deduct_minutes(
+            user_product = await self.user_products_repository.deduct_minutes(
                 user_id=user_id,
                 minutes_to_deduct=minutes_to_deduct,
+                seconds=seconds_used,
+                event_type=event_type,
+                user_file_id=user_file_id,
             )
         except ValueError as e:
             # Handle the case where user has no minutes
             raise ValueError(f"Failed to deduct minutes: {str(e)}")
+        # minute_count_used входит в план пользователя
+        await self.invalidate_user_plan(user_id)
+        return user_product
+
+    async def get_remaining_upload_seconds(self, user_id: int) -> float:
+        """Сколько секунд аудио пользователь еще может загрузить: остаток по всем действующим продуктам"""
+        remaining_minutes = await self.user_products_repository.get_remaining_minutes(user_id)
+        multiplier = settings.USAGE_MINUTE_MULTIPLIERS.get(UsageEventType.UPLOAD.value, 1.0)
+        return remaining_minutes * 60.0 / multiplier if multiplier else float("inf")
+
+    async def rollup_usage(self) -> int:
+        return await self.user_products_repository.rollup_usage(settings.USAGE_ROLLUP_DAYS)
+
+    async def get_usage_by_day(self, user_id: int, days: int) -> list[UsageDailyRollup]:
+        since = date.today() - timedelta(days=days - 1)
+        return await self.user_products_repository.get_usage_by_day(user_id, since)
 
     async def get_user_subscriptions(self, user_id: int) -> list[UserProducts]:
         """Получить все активные подписки пользователя"""
@@ -83,6 +129,7 @@ class UserProductsService:
         amount: float,
         interval: str,
         minute_count: float,
+        commit: bool = True,
     ) -> UserProducts:
         """Создать новую подписку"""
         return await self.user_products_repository.create_subscription_product(
@@ -93,6 +140,7 @@ class UserProductsService:
             subscription_id=subscription_id,
             interval=interval,
             expires_at=expires_at,
+            commit=commit,
         )
 
     async def update_subscription(
@@ -106,13 +154,12 @@ class UserProductsService:
 
     async def get_user_product_plan(
         self, user_id: int
-    ) -> UserProductPlanResponse:
+    ) -> UserProductPlanResponse | None:
         logging.debug(f"Getting product plan for user: {user_id}")
-        user_products = await self.user_products_repository.get_user_subscriptions(user_id, True)
-        if not user_products:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-        user_product = user_products[0]
-        product = await self.user_products_repository.get_product_by_id(user_product.product_id)
+        row = await self.user_products_repository.get_user_plan(user_id)
+        if not row or row.UserProducts is None:
+            return None
+        user_product, product = row.UserProducts, row.Products
         return UserProductPlanResponse(
             product_id=user_product.product_id,
             minute_count_limit=product.minute_count,
@@ -130,3 +177,34 @@ class UserProductsService:
             is_subscription=product.is_subs,
             is_can_use_gpt=product.is_can_use_gpt
         )
+
+    async def _load_user_plan_json(self, user_id: int) -> bytes:
+        plan = await self.get_user_product_plan(user_id)
+        return plan.__pydantic_serializer__.to_json(plan) if plan else NO_PLAN
+
+    async def _get_user_plan_json(self, user_id: int) -> bytes:
+        if self.plan_cache:
+            return await self.plan_cache.get(user_id, lambda: self._load_user_plan_json(user_id))
+        return await self._load_user_plan_json(user_id)
+
+    async def get_user_product_plan_json(self, user_id: int) -> bytes:
+        """План пользователя готовым телом ответа; без активной подписки — 404"""
+        body = await self._get_user_plan_json(user_id)
+        if body == NO_PLAN:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        return body
+
+    async def get_plan_tier(self, user_id: int) -> str:
+        """
+        Тариф для лимитов запросов (RATE_LIMITS) по закэшированному плану пользователя:
+        subscription — только если продукт плана подписочный, иначе default
+        """
+        body = await self._get_user_plan_json(user_id)
+        if body == NO_PLAN:
+            return PLAN_TIER_DEFAULT
+        return PLAN_TIER_SUBSCRIPTION if orjson.loads(body).get("is_subscription") else PLAN_TIER_DEFAULT
+
+    async def invalidate_user_plan(self, user_id: int) -> None:
+        """Вызывается после оплаты, продления и списания минут"""
+        if self.plan_cache:
+            await self.plan_cache.invalidate(user_id)
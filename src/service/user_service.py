@@ -11,8 +11,7 @@ class UserService:
     user_products_repository: UserProductsRepository
 
     async def get_user_by_id(self, user_id: int) -> UserResponse:
-        user_data = await self.user_repository.get_user_by_id_or_none(user_id)
-        user_products_data = await self.user_products_repository.get_user_product(
+        user_data, user_products_data = await self.user_products_repository.get_user_with_product(
             user_id
         )
         return UserResponse(
@@ -0,0 +1,86 @@
+import struct
+
+import numpy as np
+
+from src.service.audio_preprocessing import SAMPLE_RATE, _decode_pcm_process, _iter_pcm_blocks
+
+# Заголовок формата audiowaveform .dat (версия 1): version, flags (1 — 8 бит), sample_rate,
+# samples_per_pixel, length; дальше пары min/max. Формат читает peaks.js без преобразований
+PEAKS_VERSION = 1
+PEAKS_FLAG_8BIT = 1
+_PEAKS_HEADER = struct.Struct("<iIiiI")
+
+
+class PeaksBuilder:
+    """
+    Пики самого подробного уровня по потоку блоков PCM: каждый блок сворачивается в min/max
+    целиком в NumPy, между блоками переносится только неполный хвост.
+    """
+
+    def __init__(self, samples_per_peak: int):
+        self.samples_per_peak = samples_per_peak
+        self.tail = np.empty(0, dtype=np.int16)
+        self.mins: list[np.ndarray] = []
+        self.maxs: list[np.ndarray] = []
+
+    def add_block(self, samples: np.ndarray) -> None:
+        if len(self.tail):
+            samples = np.concatenate((self.tail, samples))
+        usable = len(samples) - len(samples) % self.samples_per_peak
+        frames = samples[:usable].reshape(-1, self.samples_per_peak)
+        self.mins.append(frames.min(axis=1))
+        self.maxs.append(frames.max(axis=1))
+        self.tail = samples[usable:].copy()
+
+    def finish(self) -> tuple[np.ndarray, np.ndarray]:
+        if len(self.tail):
+            self.mins.append(self.tail.min(keepdims=True))
+            self.maxs.append(self.tail.max(keepdims=True))
+            self.tail = self.tail[:0]
+        if not self.mins:
+            return np.empty(0, dtype=np.int16), np.empty(0, dtype=np.int16)
+        return np.concatenate(self.mins), np.concatenate(self.maxs)
+
+
+def downsample_peaks(mins: np.ndarray, maxs: np.ndarray, factor: int) -> tuple[np.ndarray, np.ndarray]:
+    """Следующий уровень: min/max по группам из factor пиков, последняя группа может быть неполной."""
+    if not len(mins):
+        return mins, maxs
+    starts = np.arange(0, len(mins), factor)
+    return np.minimum.reduceat(mins, starts), np.maximum.reduceat(maxs, starts)
+
+
+def encode_peaks(mins: np.ndarray, maxs: np.ndarray, samples_per_peak: int, bits: int) -> bytes:
+    """Уровень в формате audiowaveform .dat; для 8 бит отбрасываются младшие 8 бит отсчета."""
+    if bits == 8:
+        dtype, flags = "i1", PEAKS_FLAG_8BIT
+        mins, maxs = mins >> 8, maxs >> 8
+    elif bits == 16:
+        dtype, flags = "<i2", 0
+    else:
+        raise ValueError(f"Unsupported peaks resolution: {bits} bits")
+    pairs = np.empty((len(mins), 2), dtype=dtype)
+    pairs[:, 0] = mins
+    pairs[:, 1] = maxs
+    return _PEAKS_HEADER.pack(PEAKS_VERSION, flags, SAMPLE_RATE, samples_per_peak, len(mins)) + pairs.tobytes()
+
+
+def compute_peaks(input_path: str, samples_per_peak: int, levels: int, factor: int, bits: int) -> list[bytes]:
+    """
+    Пики файла на нескольких уровнях масштаба: уровень 0 — samples_per_peak отсчетов 16 kHz на пик,
+    каждый следующий в factor раз грубее.
+
+    Returns:
+        Уровни в формате audiowaveform .dat, от подробного к грубому
+    """
+    builder = PeaksBuilder(samples_per_peak)
+    for block in _iter_pcm_blocks(_decode_pcm_process(input_path)):
+        builder.add_block(block)
+    mins, maxs = builder.finish()
+
+    encoded = []
+    for level in range(levels):
+        if level:
+            mins, maxs = downsample_peaks(mins, maxs, factor)
+        encoded.append(encode_peaks(mins, maxs, samples_per_peak * factor ** level, bits))
+    return encoded
@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+from src.models import UserFile
+from src.models.enums import AudioSource
+from src.service.file_service import FileService
+from src.service.user_file_service import UserFileService, audio_source_url
+from src.service.waveform_peaks import compute_peaks
+from src.settings import settings
+
+
+@dataclass
+class WaveformService:
+    """
+    Пики волны для плеера: считаются воркером после загрузки или обработки аудио
+    и лежат в MinIO рядом с ним, по объекту на уровень масштаба.
+    """
+
+    file_service: FileService
+    user_file_service: UserFileService
+
+    @staticmethod
+    def peaks_key(audio_url: str, level: int) -> str:
+        return f"{audio_url}.peaks/{level}.dat"
+
+    async def compute_peaks(self, file_id: int, source: AudioSource) -> dict | None:
+        """
+        Returns:
+            Сохраненные метаданные пиков или None, если у файла нет аудио этого источника
+        """
+        user_file = await self.user_file_service.get_user_file_by_id(file_id)
+        audio_url = audio_source_url(user_file, source) if user_file else None
+        if not audio_url:
+            return None
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_path = os.path.join(tmp_dir, Path(audio_url).name)
+            self.file_service.download_file_from_bucket("public-file", audio_url, input_path)
+            levels = await asyncio.to_thread(
+                compute_peaks,
+                input_path,
+                settings.WAVEFORM_PEAKS_SAMPLES_PER_PEAK,
+                settings.WAVEFORM_PEAKS_LEVELS,
+                settings.WAVEFORM_PEAKS_LEVEL_FACTOR,
+                settings.WAVEFORM_PEAKS_BITS,
+            )
+
+        levels_info = []
+        for level, data in enumerate(levels):
+            await self.file_service.upload_object(io.BytesIO(data), self.peaks_key(audio_url, level))
+            levels_info.append({
+                "samples_per_peak": settings.WAVEFORM_PEAKS_SAMPLES_PER_PEAK
+                * settings.WAVEFORM_PEAKS_LEVEL_FACTOR ** level,
+                "size": len(data),
+                "etag": hashlib.blake2b(data, digest_size=12).hexdigest(),
+            })
+        peaks = {"audio_url": audio_url, "bits": settings.WAVEFORM_PEAKS_BITS, "levels": levels_info}
+        await self.user_file_service.update_waveform_peaks(file_id, source, peaks)
+        if source == AudioSource.ORIGINAL:
+            # Исходное аудио ждало этой производной, если транскрипция уже сохранена
+            await self.user_file_service.release_original_audio(file_id, self.file_service)
+        return peaks
+
+    async def record_failure(self, file_id: int, source: AudioSource) -> None:
+        """
+        Пики не удалось посчитать после всех попыток: отметка для аудио источника, чтобы исходное аудио
+        не ждало их бесконечно. Новое аудио источника (обработка запускалась заново) считается снова
+        """
+        user_file = await self.user_file_service.get_user_file_by_id(file_id)
+        audio_url = audio_source_url(user_file, source) if user_file else None
+        if not audio_url:
+            return
+        await self.user_file_service.update_waveform_peaks(file_id, source, {"audio_url": audio_url, "failed": True})
+        if source == AudioSource.ORIGINAL:
+            await self.user_file_service.release_original_audio(file_id, self.file_service)
+
+    def get_level(self, user_file: UserFile, source: AudioSource, level: int) -> tuple[str, str] | None:
+        """
+        Returns:
+            (etag, ключ в MinIO) или None, если пики не готовы. Пики, посчитанные
+            для прежнего аудио источника (обработка запускалась заново), не отдаются
+        """
+        peaks = (user_file.waveform_peaks or {}).get(source.value)
+        audio_url = audio_source_url(user_file, source)
+        if not peaks or peaks.get("failed") or peaks["audio_url"] != audio_url or level >= len(peaks["levels"]):
+            return None
+        return peaks["levels"][level]["etag"], self.peaks_key(audio_url, level)
+
+    def read_level(self, key: str) -> bytes:
+        response = self.file_service.get_file_from_bucket("public-file", key)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
@@ -15,10 +15,69 @@ class Settings(BaseSettings):
         validation_alias="WISPER_AI_AUTH_TOKEN",
         default="x9YLlWxzSFQVMkmiYSzcur7T4Bf84zoT",
     )
+    # Ограничения запросов к провайдеру транскрипции. Действуют на процесс: клиент один на процесс
+    # воркера transcription (src.celery.worker_loop), задачи его пула потоков идут в общем event loop,
+    # поэтому при нескольких репликах воркера лимиты провайдера делятся между ними
+    WISPER_AI_MAX_CONCURRENCY: int = 8
+    WISPER_AI_MAX_CONCURRENCY_PER_USER: int = 2
+    WISPER_AI_RATE_LIMIT_PER_SECOND: float = 5.0
+    WISPER_AI_CONNECT_TIMEOUT: float = 10.0
+    WISPER_AI_READ_TIMEOUT: float = 60.0
+    WISPER_AI_MAX_RETRIES: int = 5
+    WISPER_AI_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    WISPER_AI_CIRCUIT_RESET_SECONDS: float = 30.0
+    # remote — внешний провайдер с callback, local — модель Whisper на CPU-воркере
+    TRANSCRIPTION_BACKEND: str = "remote"
+    LOCAL_WHISPER_MODEL_SIZE: str = "small"
+    LOCAL_WHISPER_COMPUTE_TYPE: str = "int8"
+    LOCAL_WHISPER_CPU_THREADS: int = 4
+    LOCAL_WHISPER_BEAM_SIZE: int = 1
+    LOCAL_WHISPER_MODELS_DIR: str = "src/ai_models/whisper"
+    # Вырезание пауз перед расшифровкой
+    TRANSCRIPTION_VAD_ENABLED: bool = True
+    TRANSCRIPTION_VAD_THRESHOLD_DB: float = -45.0
+    TRANSCRIPTION_VAD_MIN_SILENCE_SECONDS: float = 1.0
+    TRANSCRIPTION_VAD_PADDING_SECONDS: float = 0.25
+    TRANSCRIPTION_OPUS_BITRATE: str = "24k"
+    # Длинные записи расшифровываются параллельно кусками по ~10 минут
+    TRANSCRIPTION_CHUNK_SECONDS: int = 600
+    TRANSCRIPTION_CHUNK_MIN_DURATION_SECONDS: int = 1200
+    TRANSCRIPTION_CHUNK_OVERLAP_SECONDS: float = 1.0
+    # Пауза перед повторной отправкой куска, расшифровка которого не удалась
+    TRANSCRIPTION_CHUNK_RETRY_SECONDS: int = 60
+    # Очередь отправки файлов на расшифровку
+    TRANSCRIPTION_SUBMIT_RATE_LIMIT: str = "5/s"
+    TRANSCRIPTION_SUBMIT_GRACE_SECONDS: int = 600
+    TRANSCRIPTION_CALLBACK_TIMEOUT_SECONDS: int = 1800
+    TRANSCRIPTION_CALLBACK_TIMEOUT_PER_AUDIO_SECOND: float = 1.0
+    TRANSCRIPTION_MAX_ATTEMPTS: int = 3
+    # Тело callback провайдера больше этого размера буферизуется на диске
+    TRANSCRIPTION_CALLBACK_SPOOL_BYTES: int = 1024 * 1024
+    TRANSCRIPTION_RECONCILE_INTERVAL_SECONDS: int = 300
+    # Списание минут: множитель к длительности по типу события (UsageEventType),
+    # события с нулевым множителем только пишутся в журнал
+    USAGE_MINUTE_MULTIPLIERS: dict[str, float] = {"upload": 1.0, "separation": 0.0, "enhance": 0.0}
+    # Допуск загрузки до приема файла: по Content-Length (при максимальном битрейте загрузки
+    # файл не может быть короче) и по длительности из первых байт файла
+    UPLOAD_ADMISSION_ENABLED: bool = True
+    UPLOAD_ADMISSION_MAX_BITRATE_KBPS: int = 100_000
+    UPLOAD_ADMISSION_PROBE_BYTES: int = 4 * 1024 * 1024
+    # Пересчет дневных сумм журнала списаний: за сколько последних дней и как часто
+    USAGE_ROLLUP_DAYS: int = 2
+    USAGE_ROLLUP_INTERVAL_SECONDS: int = 600
+    # Уведомления об оплате: зачисление воркером с повторами, сверка зависших записей inbox
+    PAYMENT_WEBHOOK_MAX_ATTEMPTS: int = 8
+    PAYMENT_WEBHOOK_RETRY_SECONDS: int = 30
+    PAYMENT_WEBHOOK_STALLED_SECONDS: int = 120
+    PAYMENT_WEBHOOK_RECONCILE_INTERVAL_SECONDS: int = 60
     PROXY_URL: str = Field(
         validation_alias="PROXY_URL",
         default="url"
     )
+    REDIS_URL: str = Field(
+        validation_alias="REDIS_URL",
+        default="redis://localhost:6379/0",
+    )
     BASE_URL: str = Field(
         validation_alias="BASE_URL",
         default="https://c928-46-226-166-83.ngrok-free.app",
@@ -40,6 +99,85 @@ class Settings(BaseSettings):
         validation_alias="OPENAI_MODEL",
         default="gpt-3.5-turbo",
     )
+    OPENAI_SUMMARY_MODEL: str = "gpt-4o-mini"
+    # Сжатие длинной переписки в чате
+    CHAT_SUMMARY_TOKEN_THRESHOLD: int = 3000
+    CHAT_SUMMARY_KEEP_MESSAGES: int = 4
+    # Сколько токенов старых сообщений сворачивается за один запуск; остальное — следующими запусками
+    CHAT_SUMMARY_BATCH_TOKENS: int = 4 * 3000
+    CHAT_ANSWER_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    TRANSCRIPT_RENDER_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    # Новые транскрипции сохраняются в компактном бинарном виде вместо JSONB
+    TRANSCRIPT_COMPACT_STORAGE: bool = True
+    TRANSCRIPT_COMPACT_BATCH_SIZE: int = 200
+    # Конфигурации, которыми разбирается поисковый запрос (язык запроса заранее неизвестен)
+    TRANSCRIPT_SEARCH_CONFIGS: list[str] = ["simple", "english", "russian"]
+    TRANSCRIPT_SEARCH_HEADLINE_OPTIONS: str = (
+        "StartSel=<mark>, StopSel=</mark>, MaxWords=20, MinWords=8, MaxFragments=2, FragmentDelimiter= … "
+    )
+    TRANSCRIPT_SEARCH_SEGMENTS_PER_HIT: int = 3
+    # Сколько разобранных индексов транскрипций держать в памяти процесса API
+    TRANSCRIPT_INDEX_CACHE_SIZE: int = 64
+    # Правки сегментов применяются к сохраненной транскрипции с задержкой, пачкой
+    TRANSCRIPT_EDITS_APPLY_DELAY_SECONDS: int = 30
+    TRANSCRIPT_EDITS_MAX_SEGMENTS: int = 500
+    # Пики волны для плеера: уровень 0 — WAVEFORM_PEAKS_SAMPLES_PER_PEAK отсчетов 16 kHz на пик,
+    # каждый следующий уровень в WAVEFORM_PEAKS_LEVEL_FACTOR раз грубее
+    WAVEFORM_PEAKS_ENABLED: bool = True
+    WAVEFORM_PEAKS_SAMPLES_PER_PEAK: int = 256
+    WAVEFORM_PEAKS_LEVELS: int = 4
+    WAVEFORM_PEAKS_LEVEL_FACTOR: int = 4
+    WAVEFORM_PEAKS_BITS: int = 8
+    # Для запросов с v=etag: такой URL указывает на неизменные данные
+    WAVEFORM_PEAKS_CACHE_MAX_AGE_SECONDS: int = 365 * 24 * 60 * 60
+    # HLS для плеера: fMP4-сегменты в нескольких битрейтах, "aac" или "opus"
+    HLS_ENABLED: bool = True
+    HLS_CODEC: str = "aac"
+    HLS_BITRATES_KBPS: list[int] = [48, 128]
+    HLS_SEGMENT_SECONDS: int = 4
+    HLS_SEGMENT_CACHE_MAX_AGE_SECONDS: int = 365 * 24 * 60 * 60
+    # Пики и нарезка повторяются при ошибке, после последней попытки производная считается неудавшейся
+    DERIVATIVE_MAX_RETRIES: int = 3
+    DERIVATIVE_RETRY_SECONDS: int = 60
+    # Исходное аудио, которое все еще хранится через столько часов после загрузки, удаляется задачей
+    # release_original_audio, даже если производной нет (например, она включена после загрузки)
+    ORIGINAL_AUDIO_RETENTION_HOURS: int = 24
+    ORIGINAL_AUDIO_RELEASE_INTERVAL_SECONDS: int = 3600
+    ORIGINAL_AUDIO_RELEASE_BATCH_SIZE: int = 500
+    # Метаданные объектов MinIO для /user-files/download: Redis и короткая копия в памяти процесса
+    OBJECT_METADATA_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    OBJECT_METADATA_LOCAL_TTL_SECONDS: int = 30
+    OBJECT_METADATA_LOCAL_CACHE_SIZE: int = 4096
+    DOWNLOAD_MAX_RANGES: int = 16
+    DOWNLOAD_CHUNK_BYTES: int = 64 * 1024
+    # Каталог продуктов: Redis и снимок в памяти процесса (сбрасывается по pub/sub при изменении)
+    PRODUCT_CATALOG_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    PRODUCT_CATALOG_LOCAL_TTL_SECONDS: int = 300
+    # План пользователя (/products/user-plan): Redis и копия в памяти процесса,
+    # сбрасываются после оплаты, продления и списания минут
+    USER_PLAN_CACHE_TTL_SECONDS: int = 60 * 60
+    USER_PLAN_LOCAL_TTL_SECONDS: int = 60
+    USER_PLAN_LOCAL_CACHE_SIZE: int = 10000
+    # Лимиты дорогих запросов: группа маршрутов -> тариф (default, subscription) ->
+    # [емкость ведра, запросов в минуту]; 429 с Retry-After при превышении
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMITS: dict[str, dict[str, list[float]]] = {
+        "separation": {"default": [3, 1], "subscription": [10, 4]},
+        "enhance": {"default": [3, 1], "subscription": [10, 4]},
+        "transcription": {"default": [5, 2], "subscription": [20, 10]},
+        "chat": {"default": [5, 6], "subscription": [20, 30]},
+    }
+    # Очереди Celery групп: пока очередь глубже порога, новые задачи не принимаются (503)
+    RATE_LIMIT_QUEUES: dict[str, str] = {
+        "separation": "celery",
+        "enhance": "enhance",
+        "transcription": "transcription",
+    }
+    RATE_LIMIT_MAX_QUEUE_DEPTH: int = 500
+    RATE_LIMIT_SHED_RETRY_SECONDS: int = 30
+    # Summary и главы файла после завершения транскрипции
+    FILE_INSIGHTS_ENABLED: bool = True
+    FILE_INSIGHTS_MAX_CHARS: int = 60000
 
     @property
     def whisper_ai_callback_url(self) -> str: